@@ -3,10 +3,20 @@ from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from app.config import Config
 
-def create_app():
+def create_app(start_background=True):
+    # start_background=False leaves the scheduler thread to the caller, e.g.
+    # gunicorn.conf.py starts it in each worker after a preloaded fork
     app = Flask(__name__)
     app.config.from_object(Config)
 
+    # Uploads are stored once, so they must outlive the container
+    from app.utils.media import check_media_root
+    check_media_root()
+
+    # orjson-backed when installed; ISO dates and string Decimals either way
+    from app.utils.json_provider import FastJSONProvider
+    app.json = FastJSONProvider(app)
+
     # Initialize extensions with explicit CORS configuration
     # Use environment variable for allowed origins
     print(f"=== CORS CONFIGURATION ===")
@@ -16,7 +26,9 @@ def create_app():
     CORS(app,
          origins=Config.CORS_ORIGINS,
          supports_credentials=True,
-         allow_headers=['Content-Type', 'Authorization'],
+         # X-DB-Primary-Until: read-your-writes pin (app/utils/replicas.py)
+         allow_headers=['Content-Type', 'Authorization', 'X-DB-Primary-Until'],
+         expose_headers=['X-DB-Primary-Until'],
          methods=['GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'])
     jwt = JWTManager(app)
     
@@ -39,6 +51,9 @@ def create_app():
     from app.routes.event_management import event_bp
     # Website Admin
     from app.routes.admin_website import admin_website_bp
+    from app.routes.website import website_bp
+    from app.routes.media import media_bp
+    from app.routes.covers import covers_bp
 
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(admin_patrons_bp, url_prefix='/api/admin')
@@ -58,16 +73,35 @@ def create_app():
     app.register_blueprint(event_bp, url_prefix='/api/events')
     # Website Admin
     app.register_blueprint(admin_website_bp, url_prefix='/api/admin/website')
-    
+    app.register_blueprint(website_bp, url_prefix='/api/website')
+    app.register_blueprint(media_bp, url_prefix='/api/media')
+    app.register_blueprint(covers_bp, url_prefix='/api/covers')
+
+    # Prometheus metrics: per-route latency/status, pool, caches, inference
+    from app.utils.metrics import init_metrics
+    init_metrics(app)
+
+    # Sampled per-request SQL timings (Server-Timing header + log line)
+    from app.utils.sql_profiling import init_sql_profiling
+    init_sql_profiling(app)
+
+    # Read replicas: read-your-writes stickiness after a client writes
+    from app.utils.replicas import init_replicas
+    init_replicas(app)
+
+    # ETags/304s and gzip/brotli; registered last so its after_request hook
+    # runs first and the metrics/profiling hooks see the final status
+    from app.utils.http_cache import init_http_cache
+    init_http_cache(app)
+
+    # Background maintenance jobs (one leader across all processes)
+    if start_background:
+        from app.utils.scheduler import start_scheduler
+        start_scheduler()
+
     # Health check endpoint
     @app.route('/health')
     def health_check():
         return {"status": "healthy"}, 200
-    
-    # Temporary: Print all routes for debugging
-    print("=== REGISTERED ROUTES ===")
-    for rule in app.url_map.iter_rules():
-        print(f"{rule.methods} {rule.rule}")
-    print("========================")
 
     return app
@@ -0,0 +1,39 @@
+"""
+Heavy optional dependencies, kept out of the worker boot path.
+
+Nothing imported by ``create_app()`` imports these at module level; each is
+imported where it is first used. A pre-forking server can import them once
+in the master with ``preload_heavy_modules()`` so workers share the pages
+copy-on-write instead of each paying the import on its first request.
+
+benchmarks/startup_importtime.py fails if any of them creeps back into the
+boot path.
+"""
+import importlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# module -> what needs it
+HEAVY_MODULES = {
+    'sentence_transformers': 'semantic search embeddings (pulls in torch)',
+    'reportlab.platypus': 'invoice PDFs',
+    'pgvector.psycopg2': 'vector type registration (pulls in NumPy)',
+    'PIL.Image': 'media uploads and resized variants',
+}
+
+
+def preload_heavy_modules(modules=None):
+    """Import the heavy modules that are installed; returns {module: seconds}"""
+    timings = {}
+    for name in modules or HEAVY_MODULES:
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            continue
+        timings[name] = time.perf_counter() - started
+    if timings:
+        logger.info("Preloaded %s", ', '.join(f"{name} ({seconds:.2f}s)" for name, seconds in timings.items()))
+    return timings
@@ -4,6 +4,11 @@ from app.utils.auth import admin_required
 from app.utils.database import execute_query, get_db_cursor
 from app.utils.googlebooks import fetch_book_by_isbn as fetch_google_books
 from app.utils.openlibrary import fetch_book_by_isbn as fetch_open_library
+from app.utils.http_cache import bump_content_version
+from app.utils.media import MediaError, ingest, media_url
+from app.utils.cover_cache import localize_covers, schedule_prefetch
+from app.utils.replicas import read_only
+from app.utils.query_budget import QueryBudgetExceeded, budget_exceeded, limit_search_terms, query_budget
 from app.config import Config
 import json
 
@@ -12,6 +17,8 @@ admin_books_bp = Blueprint('admin_books', __name__)
 @admin_books_bp.route('/books', methods=['GET'])
 @jwt_required()
 @admin_required
+@query_budget(Config.SEARCH_QUERY_BUDGET)
+@read_only()
 def get_books():
     """Get all books with pagination and filters"""
     page = request.args.get('page', 1, type=int)
@@ -25,6 +32,7 @@ def get_books():
     # Build query
     where_clauses = ["b.is_active = TRUE"]
     params = []
+    ignored_terms = []
 
     if search:
         # Handle quoted phrases for exact tag matching and regular words
@@ -34,6 +42,7 @@ def get_books():
         # Remove quoted parts and split remaining into words
         remaining = re.sub(quoted_pattern, '', search)
         search_words = [word.strip() for word in remaining.split() if word.strip()]
+        quoted_terms, search_words, ignored_terms = limit_search_terms(quoted_terms, search_words)
 
         word_conditions = []
 
@@ -82,15 +91,7 @@ def get_books():
         params.append(language)
 
     where_sql = "WHERE " + " AND ".join(where_clauses)
-
-    # Get total count
-    count_query = f"""
-        SELECT COUNT(*) as total
-        FROM books b
-        {where_sql}
-    """
-    total_result = execute_query(count_query, tuple(params) if params else None, fetch_one=True)
-    total = total_result['total'] if total_result else 0
+    filter_params = tuple(params)
 
     # Get books with availability using the view
     query = f"""
@@ -123,15 +124,38 @@ def get_books():
     """
     params.extend([Config.ITEMS_PER_PAGE, offset])
 
-    books = execute_query(query, tuple(params), fetch_all=True)
+    books = execute_query(query, tuple(params), fetch_all=True) or []
 
-    return jsonify({
-        "books": [dict(b) for b in (books or [])],
+    # Counting every match costs more than one page of them; when it runs
+    # over the budget, serve the page with a lower bound for the total
+    partial = False
+    count_query = f"""
+        SELECT COUNT(*) as total
+        FROM books b
+        {where_sql}
+    """
+    try:
+        total_result = execute_query(count_query, filter_params or None, fetch_one=True)
+        total = total_result['total'] if total_result else 0
+    except QueryBudgetExceeded:
+        budget_exceeded('partial')
+        partial = True
+        total = offset + len(books) + (1 if len(books) == Config.ITEMS_PER_PAGE else 0)
+
+    response = {
+        "books": localize_covers([dict(b) for b in books]),
         "total": total,
         "page": page,
         "per_page": Config.ITEMS_PER_PAGE,
         "total_pages": (total + Config.ITEMS_PER_PAGE - 1) // Config.ITEMS_PER_PAGE
-    }), 200
+    }
+    if ignored_terms:
+        response["ignored_terms"] = ignored_terms
+    if partial:
+        response["partial"] = True
+        # Not for reuse: the next request may well get the full answer
+        return jsonify(response), 200, {'Cache-Control': 'no-store'}
+    return jsonify(response), 200
 
 @admin_books_bp.route('/books/<int:book_id>', methods=['GET'])
 @jwt_required()
@@ -466,6 +490,8 @@ def add_book():
 
         # Refresh materialized view
         cursor.execute("REFRESH MATERIALIZED VIEW mv_book_availability")
+        bump_content_version(cursor, 'catalogue')
+        schedule_prefetch(data.get('cover_image_url'))
 
         return jsonify({
             "message": "Book added successfully",
@@ -523,9 +549,44 @@ def update_book(book_id):
     """
 
     execute_query(query, tuple(params))
+    if data.get('cover_image_url'):
+        schedule_prefetch(data['cover_image_url'])
 
     return jsonify({"message": "Book updated successfully"}), 200
 
+@admin_books_bp.route('/books/<int:book_id>/cover', methods=['POST'])
+@jwt_required()
+@admin_required
+def upload_book_cover(book_id):
+    """Upload a cover image (multipart 'file'); thumbnails are generated from it"""
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({"error": "No file provided"}), 400
+
+    book = execute_query("SELECT book_id FROM books WHERE book_id = %s", (book_id,), fetch_one=True)
+    if not book:
+        return jsonify({"error": "Book not found"}), 404
+
+    try:
+        asset = ingest(upload.stream)
+    except MediaError as e:
+        return jsonify({"error": str(e)}), 400
+
+    cover_url = media_url(asset['sha256'])
+    thumbnail_url = media_url(asset['sha256'], 320, 'webp')
+    with get_db_cursor() as cursor:
+        cursor.execute(
+            "UPDATE books SET cover_image_url = %s, thumbnail_url = %s WHERE book_id = %s",
+            (cover_url, thumbnail_url, book_id)
+        )
+        bump_content_version(cursor, 'catalogue')
+
+    return jsonify({
+        "message": "Cover uploaded successfully",
+        "cover_image_url": cover_url,
+        "thumbnail_url": thumbnail_url
+    }), 200
+
 @admin_books_bp.route('/books/<int:book_id>/contributors', methods=['POST'])
 @jwt_required()
 @admin_required
@@ -1,8 +1,17 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify
 from flask_jwt_extended import jwt_required
 from datetime import datetime, timedelta
+import csv
+import io
 from app.utils.auth import admin_required
-from app.utils.database import execute_query, get_db_cursor
+from app.utils.database import execute_query, get_db_cursor, query_rows, stream_query
+from app.utils.recommendation_jobs import schedule_recompute
+from app.utils.popularity import record_checkouts
+from app.utils.circulation_stats import record_circulation
+from app.utils.circulation import checkout_item, checkout_items, checkout_error
+from app.utils.holds import allocate_items, place_hold, get_holds, cancel_hold
+from app.utils.replicas import read_only
+from app.utils.query_budget import query_budget
 from app.config import Config
 
 admin_borrowings_bp = Blueprint('admin_borrowings', __name__)
@@ -21,72 +30,29 @@ def issue_book():
         return jsonify({"error": "patron_id and item_id are required"}), 400
 
     with get_db_cursor() as cursor:
-        # Check if item is available
-        cursor.execute("""
-            SELECT i.item_id, i.circulation_status, i.barcode,
-                   b.title, b.book_id
-            FROM items i
-            JOIN books b ON i.book_id = b.book_id
-            WHERE i.item_id = %s
-        """, (item_id,))
-        item = cursor.fetchone()
-
-        if not item:
-            return jsonify({"error": "Item not found"}), 404
-
-        if item['circulation_status'] != 'available':
-            return jsonify({"error": f"Item is {item['circulation_status']}"}), 400
-
-        # Check if patron has active account and get borrowing limit
-        cursor.execute("""
-            SELECT u.status, mp.borrowing_limit
-            FROM patrons p
-            JOIN users u ON p.user_id = u.user_id
-            LEFT JOIN membership_plans mp ON p.membership_plan_id = mp.plan_id
-            WHERE p.patron_id = %s
-        """, (patron_id,))
-        patron = cursor.fetchone()
-
-        if not patron:
-            return jsonify({"error": "Patron not found"}), 404
-
-        if patron['status'] != 'active':
-            return jsonify({"error": f"Patron account is {patron['status']}"}), 400
-
-        # Check current active borrowings against limit
-        borrowing_limit = patron['borrowing_limit'] or 3  # Default to 3 if no plan
-        cursor.execute("""
-            SELECT COUNT(*) as active_count
-            FROM borrowings
-            WHERE patron_id = %s AND status = 'active'
-        """, (patron_id,))
-        active_count = cursor.fetchone()['active_count']
-
-        if active_count >= borrowing_limit:
-            return jsonify({"error": f"Borrowing limit reached. Maximum {borrowing_limit} books allowed."}), 400
-
-        # Create borrowing record
-        checkout_date = datetime.now().date()
-        due_date = checkout_date + timedelta(days=Config.CHECKOUT_DURATION_DAYS)
-
-        cursor.execute("""
-            INSERT INTO borrowings
-            (patron_id, item_id, checkout_date, due_date, status)
-            VALUES (%s, %s, %s, %s, 'active')
-            RETURNING borrowing_id
-        """, (patron_id, item_id, checkout_date, due_date))
-
-        borrowing_id = cursor.fetchone()['borrowing_id']
-
-        # Item status will be automatically updated by trigger
-
-        return jsonify({
-            "message": "Item issued successfully",
-            "borrowing_id": borrowing_id,
-            "due_date": due_date.isoformat(),
-            "barcode": item['barcode'],
-            "title": item['title']
-        }), 201
+        # Availability, patron status and limit are checked under row locks
+        result = checkout_item(cursor, patron_id, item_id)
+        error = checkout_error(result)
+        if error:
+            return jsonify({"error": error[0]}), error[1]
+
+        borrowing_id = result['borrowing_id']
+        due_date = result['due_date']
+
+        # Same transaction as the checkout: one upsert per popularity window
+        record_checkouts(cursor, [result['book_id']])
+        record_circulation(cursor, 'checkouts', [borrowing_id], day=result['checkout_date'])
+
+    # Refresh the patron's recommendations once the checkout is committed
+    schedule_recompute(patron_id)
+
+    return jsonify({
+        "message": "Item issued successfully",
+        "borrowing_id": borrowing_id,
+        "due_date": due_date.isoformat(),
+        "barcode": result['barcode'],
+        "title": result['title']
+    }), 201
 
 @admin_borrowings_bp.route('/borrowings/<int:borrowing_id>/renew', methods=['POST'])
 @jwt_required()
@@ -117,9 +83,12 @@ def renew_borrowing(borrowing_id):
         cursor.execute("""
             UPDATE borrowings
             SET renewal_count = renewal_count + 1,
-                due_date = %s
+                due_date = %s,
+                overdue_since = CASE WHEN %s >= CURRENT_DATE THEN NULL ELSE overdue_since END
             WHERE borrowing_id = %s
-        """, (new_due_date, borrowing_id))
+        """, (new_due_date, new_due_date, borrowing_id))
+
+        record_circulation(cursor, 'renewals', [borrowing_id])
 
         return jsonify({
             "message": "Item renewed successfully",
@@ -133,24 +102,198 @@ def renew_borrowing(borrowing_id):
 def return_book(borrowing_id):
     """Mark an item as returned"""
 
-    query = """
-        UPDATE borrowings
-        SET status = 'returned',
-            return_date = CURRENT_DATE
-        WHERE borrowing_id = %s AND status = 'active'
-    """
-    rows_affected = execute_query(query, (borrowing_id,))
+    with get_db_cursor() as cursor:
+        cursor.execute("""
+            UPDATE borrowings
+            SET status = 'returned',
+                return_date = CURRENT_DATE
+            WHERE borrowing_id = %s AND status = 'active'
+            RETURNING patron_id, item_id
+        """, (borrowing_id,))
+        returned = cursor.fetchone()
+
+        if not returned:
+            return jsonify({"error": "Borrowing not found or already returned"}), 404
 
-    if rows_affected == 0:
-        return jsonify({"error": "Borrowing not found or already returned"}), 404
+        # Item status will be automatically updated by trigger; then the next
+        # hold in the queue (if any) claims it before anyone can check it out
+        held = allocate_items(cursor, [returned['item_id']])
 
-    # Item status will be automatically updated by trigger
+        record_circulation(cursor, 'returns', [borrowing_id])
 
+    schedule_recompute(returned['patron_id'])
+
+    if held:
+        return jsonify({
+            "message": "Item returned successfully - place it on the hold shelf",
+            "hold": {"reservation_id": held[returned['item_id']][0],
+                     "patron_id": held[returned['item_id']][1]}
+        }), 200
     return jsonify({"message": "Item returned successfully"}), 200
 
+def _batch_barcodes(data):
+    """Validate the barcodes list of a batch request; returns (barcodes, error)"""
+    barcodes = data.get('barcodes')
+    if not isinstance(barcodes, list) or not barcodes:
+        return None, "barcodes must be a non-empty list"
+    if len(barcodes) > Config.CIRCULATION_BATCH_MAX_ITEMS:
+        return None, f"At most {Config.CIRCULATION_BATCH_MAX_ITEMS} barcodes per batch"
+    return [str(b).strip() for b in barcodes], None
+
+@admin_borrowings_bp.route('/borrowings/issue-batch', methods=['POST'])
+@jwt_required()
+@admin_required
+def issue_batch():
+    """Issue several items (by barcode) to a patron in one transaction"""
+    data = request.get_json() or {}
+
+    patron_id = data.get('patron_id')
+    if not patron_id:
+        return jsonify({"error": "patron_id is required"}), 400
+
+    barcodes, error = _batch_barcodes(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    checkout_date = datetime.now().date()
+    due_date = checkout_date + timedelta(days=Config.CHECKOUT_DURATION_DAYS)
+
+    with get_db_cursor() as cursor:
+        # Lock the patron row so concurrent batches can't both pass the limit check
+        cursor.execute("""
+            SELECT u.status
+            FROM patrons p
+            JOIN users u ON p.user_id = u.user_id
+            WHERE p.patron_id = %s
+            FOR UPDATE OF p
+        """, (patron_id,))
+        patron = cursor.fetchone()
+
+        if not patron:
+            return jsonify({"error": "Patron not found"}), 404
+
+        if patron['status'] != 'active':
+            return jsonify({"error": f"Patron account is {patron['status']}"}), 400
+
+        cursor.execute("SELECT i.item_id, i.barcode FROM items i WHERE i.barcode = ANY(%s)", (barcodes,))
+        items = {row['barcode']: row for row in cursor.fetchall()}
+
+        # One checkout_items() call for the whole batch: the rules of the
+        # single-item desk (availability, hold shelf, limit, holds fulfilled),
+        # under the same locks, in a fixed number of statements
+        item_ids = list(dict.fromkeys(items[b]['item_id'] for b in barcodes if b in items))
+        checkouts = {c['item_id']: c for c in checkout_items(cursor, patron_id, item_ids, checkout_date)} \
+            if item_ids else {}
+
+        results, issued, seen = [], {}, set()
+        for barcode in barcodes:
+            item = items.get(barcode)
+            result = {"barcode": barcode, "status": "failed"}
+            if barcode in seen:
+                result["error"] = "Duplicate barcode in batch"
+            elif not item:
+                result["error"] = "Item not found"
+            else:
+                checkout = checkouts[item['item_id']]
+                error = checkout_error(checkout)
+                if error:
+                    result["error"] = error[0]
+                else:
+                    result.update(status="issued", title=checkout['title'],
+                                  borrowing_id=checkout['borrowing_id'])
+                    issued[checkout['borrowing_id']] = checkout['book_id']
+            seen.add(barcode)
+            results.append(result)
+
+        if issued:
+            record_checkouts(cursor, list(issued.values()))
+            record_circulation(cursor, 'checkouts', list(issued), day=checkout_date)
+
+    if issued:
+        schedule_recompute(patron_id)
+
+    return jsonify({
+        "message": f"{len(issued)} of {len(barcodes)} items issued",
+        "patron_id": patron_id,
+        "due_date": due_date.isoformat(),
+        "issued": len(issued),
+        "failed": len(barcodes) - len(issued),
+        "results": results
+    }), 200
+
+@admin_borrowings_bp.route('/borrowings/return-batch', methods=['POST'])
+@jwt_required()
+@admin_required
+def return_batch():
+    """Return several items (by barcode) in one transaction"""
+    data = request.get_json() or {}
+
+    barcodes, error = _batch_barcodes(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    with get_db_cursor() as cursor:
+        cursor.execute("""
+            SELECT i.item_id, i.barcode, b.title
+            FROM items i
+            JOIN books b ON i.book_id = b.book_id
+            WHERE i.barcode = ANY(%s)
+        """, (barcodes,))
+        items = {row['barcode']: row for row in cursor.fetchall()}
+
+        # Returning flips status in one UPDATE; the row locks it takes keep a
+        # concurrent single return from double-processing the same borrowing
+        cursor.execute("""
+            UPDATE borrowings
+            SET status = 'returned',
+                return_date = CURRENT_DATE
+            WHERE item_id = ANY(%s::integer[]) AND status = 'active'
+            RETURNING borrowing_id, item_id, patron_id, due_date
+        """, ([i['item_id'] for i in items.values()],))
+        returned = {row['item_id']: row for row in cursor.fetchall()}
+
+        # Item status will be automatically updated by trigger
+
+        held = allocate_items(cursor, sorted(returned))
+        if returned:
+            record_circulation(cursor, 'returns', [r['borrowing_id'] for r in returned.values()])
+
+    results, seen = [], set()
+    today = datetime.now().date()
+    for barcode in barcodes:
+        item = items.get(barcode)
+        result = {"barcode": barcode}
+        if barcode in seen:
+            result.update(status='failed', error="Duplicate barcode in batch")
+        elif not item:
+            result.update(status='failed', error="Item not found")
+        elif item['item_id'] not in returned:
+            result.update(status='failed', error="Item is not checked out")
+        else:
+            borrowing = returned[item['item_id']]
+            result.update(status='returned', title=item['title'],
+                          borrowing_id=borrowing['borrowing_id'],
+                          patron_id=borrowing['patron_id'],
+                          overdue=borrowing['due_date'] < today)
+            if item['item_id'] in held:
+                result['hold_patron_id'] = held[item['item_id']][1]
+        seen.add(barcode)
+        results.append(result)
+
+    for patron_id in {r['patron_id'] for r in returned.values()}:
+        schedule_recompute(patron_id)
+
+    return jsonify({
+        "message": f"{len(returned)} of {len(barcodes)} items returned",
+        "returned": len(returned),
+        "failed": len(barcodes) - len(returned),
+        "results": results
+    }), 200
+
 @admin_borrowings_bp.route('/borrowings/search', methods=['GET'])
 @jwt_required()
 @admin_required
+@query_budget(Config.SEARCH_QUERY_BUDGET)
 def search_borrowings():
     """Search borrowings by patron or book/item"""
     search_type = request.args.get('type')  # 'patron' or 'book'
@@ -224,7 +367,7 @@ def get_overdue_borrowings():
         JOIN books b ON i.book_id = b.book_id
         JOIN patrons p ON br.patron_id = p.patron_id
         JOIN users u ON p.user_id = u.user_id
-        WHERE br.status = 'active' AND br.due_date < CURRENT_DATE
+        WHERE br.status = 'active' AND br.overdue_since IS NOT NULL
         ORDER BY br.due_date ASC
     """
     overdue = execute_query(query, fetch_all=True)
@@ -302,6 +445,7 @@ def search_items():
 @admin_borrowings_bp.route('/borrowings/all', methods=['GET'])
 @jwt_required()
 @admin_required
+@query_budget(Config.SEARCH_QUERY_BUDGET)
 def get_all_borrowings():
     """Get all active borrowings with optional filtering"""
     patron_filter = request.args.get('patron', '')
@@ -340,68 +484,157 @@ def get_all_borrowings():
     borrowings = execute_query(query, tuple(params) if params else None, fetch_all=True)
     return jsonify([dict(b) for b in (borrowings or [])]), 200
 
+_HISTORY_COLUMNS = """
+    br.borrowing_id, br.checkout_date, br.due_date, br.return_date, br.status,
+    br.renewal_count, br.overdue_since,
+    p.patron_id, p.first_name, p.last_name, u.email,
+    i.item_id, i.barcode, i.call_number,
+    b.book_id, b.title, b.isbn, b.cover_image_url
+"""
+
+_HISTORY_FROM = """
+    FROM borrowings br
+    JOIN items i ON br.item_id = i.item_id
+    JOIN books b ON i.book_id = b.book_id
+    JOIN patrons p ON br.patron_id = p.patron_id
+    JOIN users u ON p.user_id = u.user_id
+"""
+
+_HISTORY_FIELDS = [c.strip().split('.')[-1] for c in _HISTORY_COLUMNS.split(',')]
+
+def _history_filters(args):
+    """WHERE clauses shared by the history page and export; returns (clauses, params, error)"""
+    clauses, params = [], []
+
+    if args.get('patron_id'):
+        clauses.append("br.patron_id = %s")
+        params.append(args['patron_id'])
+    for key, column in (('item_id', 'br.item_id'), ('book_id', 'i.book_id')):
+        if args.get(key):
+            value = args.get(key, type=int)
+            if value is None:
+                return None, None, f"{key} must be an integer"
+            clauses.append(f"{column} = %s")
+            params.append(value)
+
+    try:
+        for key, op in (('start', '>='), ('end', '<=')):
+            if args.get(key):
+                clauses.append(f"br.checkout_date {op} %s")
+                params.append(datetime.strptime(args[key], '%Y-%m-%d').date())
+    except ValueError:
+        return None, None, "start and end must be YYYY-MM-DD"
+
+    if not clauses:
+        return None, None, "patron_id, item_id, book_id, or a start/end date range required"
+
+    if args.get('status'):
+        clauses.append("br.status = %s")
+        params.append(args['status'])
+
+    return clauses, params, None
+
 @admin_borrowings_bp.route('/borrowings/history', methods=['GET'])
 @jwt_required()
 @admin_required
+@query_budget(Config.REPORT_QUERY_BUDGET)
+@read_only()
 def get_borrowing_history():
-    """Get borrowing history for a patron or item"""
-    patron_id = request.args.get('patron_id')
-    item_id = request.args.get('item_id')
-    book_id = request.args.get('book_id')
-
-    if not patron_id and not item_id and not book_id:
-        return jsonify({"error": "patron_id, item_id, or book_id required"}), 400
-
-    if patron_id:
-        query = """
-            SELECT br.*,
-                   b.title, b.isbn, b.cover_image_url,
-                   i.barcode, i.call_number,
-                   p.first_name, p.last_name, u.email
-            FROM borrowings br
-            JOIN items i ON br.item_id = i.item_id
-            JOIN books b ON i.book_id = b.book_id
-            JOIN patrons p ON br.patron_id = p.patron_id
-            JOIN users u ON p.user_id = u.user_id
-            WHERE p.patron_id = %s
-            ORDER BY br.checkout_date DESC
-            LIMIT 50
-        """
-        history = execute_query(query, (patron_id,), fetch_all=True)
-    elif item_id:
-        query = """
-            SELECT br.*,
-                   p.patron_id, p.first_name, p.last_name, u.email,
-                   b.title, b.isbn,
-                   i.barcode
-            FROM borrowings br
-            JOIN items i ON br.item_id = i.item_id
-            JOIN books b ON i.book_id = b.book_id
-            JOIN patrons p ON br.patron_id = p.patron_id
-            JOIN users u ON p.user_id = u.user_id
-            WHERE br.item_id = %s
-            ORDER BY br.checkout_date DESC
-            LIMIT 50
-        """
-        history = execute_query(query, (item_id,), fetch_all=True)
-    else:  # book_id
-        query = """
-            SELECT br.*,
-                   p.patron_id, p.first_name, p.last_name, u.email,
-                   b.title, b.isbn,
-                   i.barcode, i.call_number
-            FROM borrowings br
-            JOIN items i ON br.item_id = i.item_id
-            JOIN books b ON i.book_id = b.book_id
-            JOIN patrons p ON br.patron_id = p.patron_id
-            JOIN users u ON p.user_id = u.user_id
-            WHERE b.book_id = %s
-            ORDER BY br.checkout_date DESC
-            LIMIT 50
-        """
-        history = execute_query(query, (book_id,), fetch_all=True)
-
-    return jsonify([dict(h) for h in (history or [])]), 200
+    """Get borrowing history for a patron, item, book or date range (keyset paginated)"""
+    clauses, params, error = _history_filters(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+
+    limit = max(1, min(request.args.get('limit', 50, type=int), Config.HISTORY_PAGE_MAX))
+
+    # Opaque cursor "<checkout_date>_<borrowing_id>" of the last row served;
+    # seeking past it costs the same on page 1000 as on page 1
+    cursor_token = request.args.get('cursor')
+    if cursor_token:
+        try:
+            last_date, last_id = cursor_token.split('_')
+            params.extend([datetime.strptime(last_date, '%Y-%m-%d').date(), int(last_id)])
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
+        clauses.append("(br.checkout_date, br.borrowing_id) < (%s, %s)")
+
+    query = f"""
+        SELECT {_HISTORY_COLUMNS}
+        {_HISTORY_FROM}
+        WHERE {' AND '.join(clauses)}
+        ORDER BY br.checkout_date DESC, br.borrowing_id DESC
+        LIMIT %s
+    """
+    # Up to HISTORY_PAGE_MAX rows: tuples, not a dict per row
+    history = query_rows(query, tuple(params) + (limit + 1,))
+
+    has_more = len(history) > limit
+    history.rows = history.rows[:limit]
+    next_cursor = None
+    if has_more:
+        last = dict(zip(history.columns, history.rows[-1]))
+        next_cursor = f"{last['checkout_date'].isoformat()}_{last['borrowing_id']}"
+
+    return jsonify({
+        "borrowings": history,
+        "next_cursor": next_cursor,
+        "limit": limit
+    }), 200
+
+@admin_borrowings_bp.route('/borrowings/history/export', methods=['GET'])
+@jwt_required()
+@admin_required
+@read_only()
+def export_borrowing_history():
+    """Stream borrowing history as CSV or NDJSON (oldest first)"""
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+
+    clauses, params, error = _history_filters(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+
+    query = f"""
+        SELECT {_HISTORY_COLUMNS}
+        {_HISTORY_FROM}
+        WHERE {' AND '.join(clauses)}
+        ORDER BY br.checkout_date, br.borrowing_id
+    """
+    rows = stream_query(query, tuple(params), chunk_size=Config.EXPORT_CHUNK_ROWS)
+    dumps = current_app.json.dumps  # the generators run after the app context is gone
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=_HISTORY_FIELDS)
+        writer.writeheader()
+        for n, row in enumerate(rows, start=1):
+            writer.writerow(row)
+            if n % 500 == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    def generate_ndjson():
+        lines = []
+        for row in rows:
+            lines.append(dumps(row))
+            if len(lines) == 500:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+
+    filename = f"borrowing-history-{datetime.now():%Y%m%d-%H%M%S}.{export_format}"
+    return Response(
+        generate_csv() if export_format == 'csv' else generate_ndjson(),
+        mimetype='text/csv' if export_format == 'csv' else 'application/x-ndjson',
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}',
+            'X-Accel-Buffering': 'no',  # let proxies pass chunks through as they come
+        }
+    )
 
 @admin_borrowings_bp.route('/borrowings/stats', methods=['GET'])
 @jwt_required()
@@ -411,7 +644,7 @@ def get_borrowing_stats():
     query = """
         SELECT
             COUNT(*) FILTER (WHERE status = 'active') as active_borrowings,
-            COUNT(*) FILTER (WHERE status = 'active' AND due_date < CURRENT_DATE) as overdue_borrowings,
+            COUNT(*) FILTER (WHERE status = 'active' AND overdue_since IS NOT NULL) as overdue_borrowings,
             COUNT(*) FILTER (WHERE status = 'returned') as total_returned,
             COUNT(*) FILTER (WHERE status = 'returned' AND return_date > due_date) as late_returns
         FROM borrowings
@@ -419,3 +652,57 @@ def get_borrowing_stats():
     stats = execute_query(query, fetch_one=True)
 
     return jsonify(dict(stats) if stats else {}), 200
+
+@admin_borrowings_bp.route('/holds', methods=['GET'])
+@jwt_required()
+@admin_required
+def list_holds():
+    """Get holds (open by default), optionally for one patron or book"""
+    status = request.args.get('status')
+    statuses = [status] if status else ['pending', 'ready']
+
+    holds = get_holds(patron_id=request.args.get('patron_id'),
+                      book_id=request.args.get('book_id', type=int),
+                      statuses=statuses,
+                      limit=request.args.get('limit', 200, type=int))
+    return jsonify(holds), 200
+
+@admin_borrowings_bp.route('/holds', methods=['POST'])
+@jwt_required()
+@admin_required
+def create_hold():
+    """Place a hold on behalf of a patron"""
+    data = request.get_json() or {}
+    patron_id = data.get('patron_id')
+    book_id = data.get('book_id')
+
+    if not patron_id or not book_id:
+        return jsonify({"error": "patron_id and book_id are required"}), 400
+
+    with get_db_cursor() as cursor:
+        cursor.execute("SELECT 1 FROM patrons WHERE patron_id = %s", (patron_id,))
+        if not cursor.fetchone():
+            return jsonify({"error": "Patron not found"}), 404
+
+        hold, error = place_hold(cursor, patron_id, book_id)
+        if error:
+            return jsonify({"error": error[0]}), error[1]
+
+    return jsonify({
+        "message": "Hold placed successfully",
+        "reservation_id": hold['reservation_id'],
+        "queue_position": hold['queue_position']
+    }), 201
+
+@admin_borrowings_bp.route('/holds/<int:reservation_id>', methods=['DELETE'])
+@jwt_required()
+@admin_required
+def delete_hold(reservation_id):
+    """Cancel a hold; a copy waiting on the hold shelf moves to the next patron"""
+    with get_db_cursor() as cursor:
+        cancelled = cancel_hold(cursor, reservation_id)
+
+    if not cancelled:
+        return jsonify({"error": "Hold not found or already closed"}), 404
+
+    return jsonify({"message": "Hold cancelled"}), 200
@@ -2,7 +2,6 @@ from flask import Blueprint, request, jsonify, send_file
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.utils.database import get_db_connection, get_db_cursor
 from app.utils.auth import admin_required
-from app.utils.cowork_invoice_generator import generate_cowork_invoice_pdf
 from datetime import datetime, timedelta
 import os
 import tempfile
@@ -151,6 +150,8 @@ def create_cowork_invoice():
                 'address': data.get('member_address', '')
             }
 
+            # reportlab is imported on first use, not at worker boot
+            from app.utils.cowork_invoice_generator import generate_cowork_invoice_pdf
             generate_cowork_invoice_pdf(invoice_data, data['line_items'], member_data, pdf_path, logo_path)
 
             # Update PDF URL in database
@@ -429,6 +430,7 @@ def download_invoice_pdf(invoice_id):
                         logo_path = potential_logo
                         break
 
+            from app.utils.cowork_invoice_generator import generate_cowork_invoice_pdf
             generate_cowork_invoice_pdf(invoice_data, line_items, member_data, pdf_path, logo_path)
 
         return send_file(
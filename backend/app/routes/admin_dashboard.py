@@ -2,142 +2,122 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
 from app.utils.auth import admin_required
 from app.utils.database import execute_query
-from datetime import datetime, timedelta
+from app.utils.popularity import get_popular_books as fetch_popular_books
+from app.utils.circulation_stats import get_circulation_trends
+from app.utils.cache import TTLCache
+from app.utils.replicas import read_only
+from app.utils.query_budget import query_budget
+from app.config import Config
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
 
 admin_dashboard_bp = Blueprint('admin_dashboard', __name__)
 
-@admin_dashboard_bp.route('/dashboard/stats', methods=['GET'])
-@jwt_required()
-@admin_required
-def get_dashboard_stats():
-    """Get overall library statistics"""
-
-    stats = {}
-
-    # Total Books
-    books_query = """
-        SELECT
-            COUNT(*) as total_books,
-            COALESCE(SUM(ba.total_items), 0) as total_copies,
-            COALESCE(SUM(ba.available_items), 0) as available_copies,
-            COUNT(CASE WHEN ba.available_items > 0 THEN 1 END) as available_titles
-        FROM books b
-        LEFT JOIN mv_book_availability ba ON b.book_id = ba.book_id
-        WHERE b.is_active = TRUE
-    """
-    books_stats = execute_query(books_query, fetch_one=True)
-    stats['books'] = dict(books_stats) if books_stats else {}
+# Snapshot widgets run concurrently, each on its own pooled connection
+_snapshot_executor = ThreadPoolExecutor(max_workers=Config.DASHBOARD_SNAPSHOT_WORKERS,
+                                        thread_name_prefix='dashboard')
+_snapshot_cache = TTLCache(Config.DASHBOARD_CACHE_TTL, Config.DASHBOARD_STALE_TTL, name='dashboard_snapshot')
 
-    # Total Patrons
-    patrons_query = """
+def _dashboard_stats():
+    """Overall library statistics in a single round trip"""
+    query = """
         SELECT
-            COUNT(*) as total_patrons,
-            COUNT(CASE WHEN u.status = 'active' THEN 1 END) as active_patrons,
-            COUNT(CASE WHEN u.status = 'frozen' THEN 1 END) as frozen_patrons,
-            COUNT(CASE WHEN u.status = 'closed' THEN 1 END) as closed_patrons
-        FROM patrons p
-        JOIN users u ON p.user_id = u.user_id
+            (SELECT row_to_json(bk) FROM (
+                SELECT
+                    COUNT(*) as total_books,
+                    COALESCE(SUM(ba.total_items), 0) as total_copies,
+                    COALESCE(SUM(ba.available_items), 0) as available_copies,
+                    COUNT(CASE WHEN ba.available_items > 0 THEN 1 END) as available_titles
+                FROM books b
+                LEFT JOIN mv_book_availability ba ON b.book_id = ba.book_id
+                WHERE b.is_active = TRUE
+            ) bk) as books,
+            (SELECT row_to_json(pt) FROM (
+                SELECT
+                    COUNT(*) as total_patrons,
+                    COUNT(CASE WHEN u.status = 'active' THEN 1 END) as active_patrons,
+                    COUNT(CASE WHEN u.status = 'frozen' THEN 1 END) as frozen_patrons,
+                    COUNT(CASE WHEN u.status = 'closed' THEN 1 END) as closed_patrons
+                FROM patrons p
+                JOIN users u ON p.user_id = u.user_id
+            ) pt) as patrons,
+            (SELECT row_to_json(br) FROM (
+                SELECT
+                    COUNT(*) as total_active,
+                    COUNT(overdue_since) as overdue,
+                    COUNT(*) - COUNT(overdue_since) as on_time
+                FROM borrowings
+                WHERE status = 'active'
+            ) br) as borrowings,
+            (SELECT row_to_json(cl) FROM (
+                SELECT
+                    COUNT(*) as total_collections,
+                    (SELECT COUNT(*) FROM books WHERE collection_id IS NOT NULL) as books_with_collection
+                FROM collections
+            ) cl) as collections,
+            (SELECT row_to_json(rt) FROM (
+                SELECT COUNT(*) as total_returns
+                FROM borrowings
+                WHERE status = 'returned'
+            ) rt) as returns
     """
-    patrons_stats = execute_query(patrons_query, fetch_one=True)
-    stats['patrons'] = dict(patrons_stats) if patrons_stats else {}
 
-    # Active Borrowings
-    borrowings_query = """
-        SELECT
-            COUNT(*) as total_active,
-            COUNT(CASE WHEN due_date < CURRENT_DATE THEN 1 END) as overdue,
-            COUNT(CASE WHEN due_date >= CURRENT_DATE THEN 1 END) as on_time
-        FROM borrowings
-        WHERE status = 'active'
-    """
-    borrowings_stats = execute_query(borrowings_query, fetch_one=True)
-    stats['borrowings'] = dict(borrowings_stats) if borrowings_stats else {}
+    stats = execute_query(query, fetch_one=True)
+    return {key: value or {} for key, value in dict(stats or {}).items()}
 
-    # Collections
-    collections_query = """
-        SELECT
-            COUNT(*) as total_collections,
-            (SELECT COUNT(*) FROM books WHERE collection_id IS NOT NULL) as books_with_collection
-        FROM collections
-    """
-    collections_stats = execute_query(collections_query, fetch_one=True)
-    stats['collections'] = dict(collections_stats) if collections_stats else {}
-
-    # Total returns (all time)
-    returns_query = """
-        SELECT COUNT(*) as total_returns
-        FROM borrowings
-        WHERE status = 'returned'
-    """
-    returns_stats = execute_query(returns_query, fetch_one=True)
-    stats['returns'] = dict(returns_stats) if returns_stats else {}
+@admin_dashboard_bp.route('/dashboard/stats', methods=['GET'])
+@jwt_required()
+@admin_required
+@read_only()
+def get_dashboard_stats():
+    """Get overall library statistics"""
+    return jsonify(_dashboard_stats()), 200
 
-    return jsonify(stats), 200
+def _borrowing_trends(days=30):
+    """Daily circulation for the last ``days`` days"""
+    today = date.today()
+    return get_circulation_trends(today - timedelta(days=days - 1), today)
 
 @admin_dashboard_bp.route('/dashboard/borrowing-trends', methods=['GET'])
 @jwt_required()
 @admin_required
+@query_budget(Config.REPORT_QUERY_BUDGET)
+@read_only()
 def get_borrowing_trends():
-    """Get borrowing trends over the last 30 days"""
+    """Get circulation trends (last 30 days, or start/end with day/week/month granularity)"""
     days = request.args.get('days', 30, type=int)
+    granularity = request.args.get('granularity', 'day')
+    collection_id = request.args.get('collection_id', type=int)
 
-    query = """
-        WITH date_series AS (
-            SELECT CURRENT_DATE - generate_series(0, %s) AS date
-        )
-        SELECT
-            ds.date,
-            COALESCE(COUNT(b.borrowing_id), 0) as checkouts,
-            COALESCE(COUNT(CASE WHEN b.status = 'returned' AND b.return_date = ds.date THEN 1 END), 0) as returns
-        FROM date_series ds
-        LEFT JOIN borrowings b ON DATE(b.checkout_date) = ds.date
-        GROUP BY ds.date
-        ORDER BY ds.date ASC
-    """
+    try:
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() \
+            if request.args.get('end') else date.today()
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d').date() \
+            if request.args.get('start') else end - timedelta(days=max(days, 1) - 1)
+        trends = get_circulation_trends(start, end, granularity, collection_id)
+    except (ValueError, OverflowError) as e:  # OverflowError: days beyond the calendar
+        return jsonify({'error': str(e)}), 400
 
-    trends = execute_query(query, (days - 1,), fetch_all=True)
-    return jsonify([dict(t) for t in (trends or [])]), 200
+    return jsonify(trends), 200
 
 @admin_dashboard_bp.route('/dashboard/popular-books', methods=['GET'])
 @jwt_required()
 @admin_required
+@read_only()
 def get_popular_books():
-    """Get most borrowed books"""
+    """Get most borrowed books (optionally for a 7/30/365 day window)"""
     limit = request.args.get('limit', 10, type=int)
+    window = request.args.get('window')
 
-    query = """
-        SELECT
-            b.book_id,
-            b.title,
-            COALESCE((SELECT json_agg(
-                json_build_object('name', c.name, 'role', bc.role)
-                ORDER BY bc.role, bc.sequence_number
-            )
-             FROM book_contributors bc
-             JOIN contributors c ON bc.contributor_id = c.contributor_id
-             WHERE bc.book_id = b.book_id
-            ), '[]'::json) as contributors,
-            col.collection_name,
-            COUNT(br.borrowing_id) as borrow_count,
-            b.cover_image_url
-        FROM books b
-        LEFT JOIN collections col ON b.collection_id = col.collection_id
-        LEFT JOIN items i ON b.book_id = i.book_id
-        LEFT JOIN borrowings br ON i.item_id = br.item_id
-        GROUP BY b.book_id, b.title, col.collection_name, b.cover_image_url
-        ORDER BY borrow_count DESC
-        LIMIT %s
-    """
-
-    popular = execute_query(query, (limit,), fetch_all=True)
-    return jsonify([dict(p) for p in (popular or [])]), 200
+    try:
+        popular = fetch_popular_books(window=window, limit=limit, active_only=False)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-@admin_dashboard_bp.route('/dashboard/collection-distribution', methods=['GET'])
-@jwt_required()
-@admin_required
-def get_collection_distribution():
-    """Get distribution of books across collections"""
+    return jsonify([dict(p) for p in popular]), 200
 
+def _collection_distribution():
+    """Books and copies per collection"""
     query = """
         SELECT
             c.collection_id,
@@ -153,14 +133,18 @@ def get_collection_distribution():
     """
 
     distribution = execute_query(query, fetch_all=True)
-    return jsonify([dict(d) for d in (distribution or [])]), 200
+    return [dict(d) for d in (distribution or [])]
 
-@admin_dashboard_bp.route('/dashboard/membership-distribution', methods=['GET'])
+@admin_dashboard_bp.route('/dashboard/collection-distribution', methods=['GET'])
 @jwt_required()
 @admin_required
-def get_membership_distribution():
-    """Get distribution of patrons across membership plans"""
+@read_only()
+def get_collection_distribution():
+    """Get distribution of books across collections"""
+    return jsonify(_collection_distribution()), 200
 
+def _membership_distribution():
+    """Active patrons per membership plan"""
     query = """
         SELECT
             COALESCE(mp.plan_name, 'No Plan') as plan_name,
@@ -176,20 +160,25 @@ def get_membership_distribution():
     """
 
     distribution = execute_query(query, fetch_all=True)
-    return jsonify([dict(d) for d in (distribution or [])]), 200
+    return [dict(d) for d in (distribution or [])]
 
-@admin_dashboard_bp.route('/dashboard/overdue-books', methods=['GET'])
+@admin_dashboard_bp.route('/dashboard/membership-distribution', methods=['GET'])
 @jwt_required()
 @admin_required
-def get_overdue_books():
-    """Get list of overdue books with patron details"""
+@read_only()
+def get_membership_distribution():
+    """Get distribution of patrons across membership plans"""
+    return jsonify(_membership_distribution()), 200
 
+def _overdue_books():
+    """Active borrowings past their due date, with patron details"""
     query = """
         SELECT
             br.borrowing_id,
             br.checkout_date,
             br.due_date,
             (CURRENT_DATE - br.due_date) as days_overdue,
+            br.overdue_since,
             b.book_id,
             b.title,
             COALESCE((SELECT json_agg(
@@ -211,20 +200,23 @@ def get_overdue_books():
         JOIN books b ON i.book_id = b.book_id
         JOIN patrons p ON br.patron_id = p.patron_id
         JOIN users u ON p.user_id = u.user_id
-        WHERE br.status = 'active' AND br.due_date < CURRENT_DATE
+        WHERE br.status = 'active' AND br.overdue_since IS NOT NULL
         ORDER BY br.due_date ASC
     """
 
     overdue = execute_query(query, fetch_all=True)
-    return jsonify([dict(o) for o in (overdue or [])]), 200
+    return [dict(o) for o in (overdue or [])]
 
-@admin_dashboard_bp.route('/dashboard/recent-activity', methods=['GET'])
+@admin_dashboard_bp.route('/dashboard/overdue-books', methods=['GET'])
 @jwt_required()
 @admin_required
-def get_recent_activity():
-    """Get recent borrowing activity"""
-    limit = request.args.get('limit', 20, type=int)
+@read_only()
+def get_overdue_books():
+    """Get list of overdue books with patron details"""
+    return jsonify(_overdue_books()), 200
 
+def _recent_activity(limit=20):
+    """Latest borrowings, newest first"""
     query = """
         SELECT
             br.borrowing_id,
@@ -257,14 +249,19 @@ def get_recent_activity():
     """
 
     activity = execute_query(query, (limit,), fetch_all=True)
-    return jsonify([dict(a) for a in (activity or [])]), 200
+    return [dict(a) for a in (activity or [])]
 
-@admin_dashboard_bp.route('/dashboard/patron-activity', methods=['GET'])
+@admin_dashboard_bp.route('/dashboard/recent-activity', methods=['GET'])
 @jwt_required()
 @admin_required
-def get_patron_activity():
-    """Get patron borrowing activity metrics"""
+@read_only()
+def get_recent_activity():
+    """Get recent borrowing activity"""
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify(_recent_activity(limit)), 200
 
+def _patron_activity():
+    """Top 20 active patrons by number of borrowings"""
     query = """
         SELECT
             p.patron_id,
@@ -274,7 +271,7 @@ def get_patron_activity():
             COUNT(br.borrowing_id) as total_borrows,
             COUNT(CASE WHEN br.status = 'active' THEN 1 END) as active_borrows,
             COUNT(CASE WHEN br.status = 'returned' THEN 1 END) as returned_books,
-            COUNT(CASE WHEN br.status = 'active' AND br.due_date < CURRENT_DATE THEN 1 END) as overdue_count,
+            COUNT(CASE WHEN br.status = 'active' AND br.overdue_since IS NOT NULL THEN 1 END) as overdue_count,
             MAX(br.checkout_date) as last_checkout
         FROM patrons p
         JOIN users u ON p.user_id = u.user_id
@@ -288,4 +285,47 @@ def get_patron_activity():
     """
 
     activity = execute_query(query, fetch_all=True)
-    return jsonify([dict(a) for a in (activity or [])]), 200
+    return [dict(a) for a in (activity or [])]
+
+@admin_dashboard_bp.route('/dashboard/patron-activity', methods=['GET'])
+@jwt_required()
+@admin_required
+@read_only()
+def get_patron_activity():
+    """Get patron borrowing activity metrics"""
+    return jsonify(_patron_activity()), 200
+
+def _on_replica(func, *args):
+    """Run a widget on a replica when one is usable (pool threads don't inherit read_only())"""
+    with read_only():
+        return func(*args)
+
+def _build_snapshot(days):
+    """Compute every dashboard widget concurrently"""
+    widgets = {
+        'stats': (_dashboard_stats,),
+        'borrowing_trends': (_borrowing_trends, days),
+        'popular_books': (lambda: [dict(p) for p in fetch_popular_books(limit=10, active_only=False)],),
+        'collection_distribution': (_collection_distribution,),
+        'membership_distribution': (_membership_distribution,),
+        'overdue_books': (_overdue_books,),
+        'recent_activity': (_recent_activity, 15),
+        'patron_activity': (_patron_activity,),
+    }
+
+    futures = {name: _snapshot_executor.submit(_on_replica, *call) for name, call in widgets.items()}
+    snapshot = {name: future.result() for name, future in futures.items()}
+    snapshot['generated_at'] = datetime.now().isoformat()
+    return snapshot
+
+@admin_dashboard_bp.route('/dashboard/snapshot', methods=['GET'])
+@jwt_required()
+@admin_required
+@read_only()
+def get_dashboard_snapshot():
+    """Get every dashboard widget in one response (cached)"""
+    days = request.args.get('days', 30, type=int)
+    days = max(1, min(days, 365))
+
+    snapshot = _snapshot_cache.get_or_compute(('snapshot', days), lambda: _build_snapshot(days))
+    return jsonify(snapshot), 200
@@ -5,6 +5,8 @@ from app.utils.database import execute_query, get_db_cursor
 from app.utils.isbndb import fetch_book_from_isbndb as fetch_isbndb, fetch_books_batch_isbndb
 from app.utils.googlebooks import fetch_book_by_isbn as fetch_google
 from app.utils.openlibrary import fetch_book_by_isbn as fetch_openlibrary
+from app.utils.http_cache import bump_content_version
+from app.utils.cover_cache import schedule_prefetch
 import csv
 import io
 import re
@@ -378,6 +380,8 @@ def execute_book_import():
                 ))
 
                 book_id = cursor.fetchone()['book_id']
+                # Thumbnails are ready before the catalogue first shows the book
+                schedule_prefetch(book_info.get('cover_image_url'))
 
                 # Add author as contributor if available
                 if book_info.get('author'):
@@ -446,6 +450,7 @@ def execute_book_import():
     try:
         with get_db_cursor() as cursor:
             cursor.execute("REFRESH MATERIALIZED VIEW mv_book_availability")
+            bump_content_version(cursor, 'catalogue')
     except Exception as e:
         print(f"Warning: Failed to refresh materialized view: {str(e)}")
         # Don't fail the entire import if materialized view refresh fails
@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
 from app.utils.auth import admin_required
 from app.utils.database import execute_query, get_db_cursor
+from app.utils.http_cache import bump_content_version
 from app.config import Config
 
 admin_items_bp = Blueprint('admin_items', __name__)
@@ -274,6 +275,7 @@ def add_item():
 
         # Refresh materialized view
         cursor.execute("REFRESH MATERIALIZED VIEW mv_book_availability")
+        bump_content_version(cursor, 'catalogue')
 
         return jsonify({
             "message": "Item added successfully",
@@ -333,6 +335,7 @@ def update_item(item_id):
         # If circulation status changed, refresh materialized view
         if 'circulation_status' in data:
             cursor.execute("REFRESH MATERIALIZED VIEW mv_book_availability")
+            bump_content_version(cursor, 'catalogue')
 
     return jsonify({"message": "Item updated successfully"}), 200
 
@@ -374,6 +377,7 @@ def update_item_status(item_id):
 
         # Refresh materialized view
         cursor.execute("REFRESH MATERIALIZED VIEW mv_book_availability")
+        bump_content_version(cursor, 'catalogue')
 
     return jsonify({"message": "Item status updated successfully"}), 200
 
@@ -404,6 +408,7 @@ def delete_item(item_id):
 
         # Refresh materialized view
         cursor.execute("REFRESH MATERIALIZED VIEW mv_book_availability")
+        bump_content_version(cursor, 'catalogue')
 
     return jsonify({"message": "Item deleted successfully"}), 200
 
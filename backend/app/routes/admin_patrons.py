@@ -2,6 +2,8 @@ from flask import Blueprint, request, jsonify, send_file
 from flask_jwt_extended import jwt_required
 from app.utils.auth import admin_required, hash_password
 from app.utils.database import execute_query, get_db_cursor
+from app.utils.media import (VARIANT_MIMETYPES, MediaError, asset_info, ingest,
+                             public_url, schedule_variants, send_asset)
 from app.config import Config
 import base64
 import io
@@ -9,6 +11,32 @@ from datetime import datetime
 
 admin_patrons_bp = Blueprint('admin_patrons', __name__)
 
+
+def _store_photo(cursor, photo_bytes):
+    """
+    Add a decoded patron photo to the media store (private, registered in the
+    cursor's transaction); its hash, or None if it isn't an image
+    """
+    try:
+        return ingest(io.BytesIO(photo_bytes), private=True, cursor=cursor)['sha256']
+    except MediaError as e:
+        print(f"Photo not added to media store: {e}")
+        return None
+
+
+def _photo_fields(patron):
+    """Resized photo URLs (the base64 patron_photo stays for existing clients)"""
+    variants = patron.pop('photo_variants', None) or []
+    if not patron.get('photo_hash'):
+        patron['photo_url'], patron['photo_srcset'] = None, {}
+        return
+    # Admin-only URLs: fetched with the admin's token, never cached
+    base = public_url(f"/api/admin/patrons/{patron['patron_id']}/photo")
+    patron['photo_url'] = base
+    patron['photo_srcset'] = {fmt: ', '.join(f"{base}/{v['width']}.{fmt} {v['width']}w"
+                                             for v in variants if v['format'] == fmt)
+                              for fmt in Config.MEDIA_VARIANT_FORMATS}
+
 @admin_patrons_bp.route('/patrons', methods=['GET'])
 @jwt_required()
 @admin_required
@@ -34,7 +62,9 @@ def get_patrons():
 
     if status:
         if status == 'inactive':
-            # Inactive = active users with expired memberships
+            # Inactive = active users with expired memberships. By date, not the
+            # sweep's membership_expired_at flag, which lags by up to a run
+            # (and is never set with the scheduler off)
             where_clauses.append("u.status = 'active' AND p.membership_end_date < CURRENT_DATE")
         else:
             where_clauses.append("u.status = %s")
@@ -59,11 +89,13 @@ def get_patrons():
                p.national_id, p.national_id_type, p.email as patron_email,
                p.secondary_phone_no, p.secondary_email, p.correspond_language,
                p.last_renewed_on_date, p.patron_photo, p.photo_content_type,
+               p.photo_hash, ma.variants AS photo_variants,
                u.user_id, u.email, u.status, u.created_at,
                mp.plan_name, mp.duration_months, mp.price, p.membership_plan_id
         FROM patrons p
         JOIN users u ON p.user_id = u.user_id
         LEFT JOIN membership_plans mp ON p.membership_plan_id = mp.plan_id
+        LEFT JOIN media_assets ma ON ma.sha256 = p.photo_hash
         {where_sql}
         ORDER BY p.patron_id DESC
         LIMIT %s OFFSET %s
@@ -79,6 +111,7 @@ def get_patrons():
                 patron['patron_photo'] = base64.b64encode(patron['patron_photo']).decode('utf-8')
             else:
                 patron['patron_photo'] = None
+            _photo_fields(patron)
     
     return jsonify({
         "patrons": [dict(p) for p in (patrons or [])],
@@ -95,10 +128,12 @@ def get_patron_details(patron_id):
     """Get detailed information about a patron"""
     query = """
         SELECT p.*, u.email, u.status,
-               mp.plan_name, mp.duration_months, mp.price, mp.borrowing_limit
+               mp.plan_name, mp.duration_months, mp.price, mp.borrowing_limit,
+               ma.variants AS photo_variants
         FROM patrons p
         JOIN users u ON p.user_id = u.user_id
         LEFT JOIN membership_plans mp ON p.membership_plan_id = mp.plan_id
+        LEFT JOIN media_assets ma ON ma.sha256 = p.photo_hash
         WHERE p.patron_id = %s
     """
     patron = execute_query(query, (patron_id,), fetch_one=True)
@@ -112,6 +147,7 @@ def get_patron_details(patron_id):
         patron['patron_photo'] = base64.b64encode(patron['patron_photo']).decode('utf-8')
     else:
         patron['patron_photo'] = None
+    _photo_fields(patron)
     
     # Get borrowing history
     borrowing_query = """
@@ -140,6 +176,22 @@ def get_patron_details(patron_id):
         "recent_borrowings": [dict(b) for b in (borrowings or [])]
     }), 200
 
+@admin_patrons_bp.route('/patrons/<patron_id>/photo', defaults={'width': None, 'fmt': None}, methods=['GET'])
+@admin_patrons_bp.route('/patrons/<patron_id>/photo/<int:width>.<fmt>', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_patron_photo(patron_id, width, fmt):
+    """Get a patron's photo, or a resized variant of it (never cached)"""
+    if fmt is not None and fmt not in VARIANT_MIMETYPES:
+        return jsonify({"error": "Photo not found"}), 404
+
+    patron = execute_query("SELECT photo_hash FROM patrons WHERE patron_id = %s", (patron_id,), fetch_one=True)
+    info = asset_info(patron['photo_hash']) if patron and patron['photo_hash'] else None
+    response = send_asset(patron['photo_hash'], info, width, fmt, private=True) if info else None
+    if response is None:
+        return jsonify({"error": "Photo not found"}), 404
+    return response
+
 @admin_patrons_bp.route('/patrons', methods=['POST'])
 @jwt_required()
 @admin_required
@@ -221,6 +273,7 @@ def create_patron():
         patron_photo = None
         photo_content_type = None
         photo_uploaded_at = None
+        photo_hash = None
         if data.get('patron_photo'):
             try:
                 # Decode base64 photo
@@ -231,6 +284,7 @@ def create_patron():
                     photo_data = photo_data.split(',')[1]
                 patron_photo = base64.b64decode(photo_data)
                 photo_uploaded_at = datetime.now()
+                photo_hash = _store_photo(cursor, patron_photo)
             except Exception as e:
                 print(f"Error processing photo: {e}")
 
@@ -241,8 +295,8 @@ def create_patron():
              membership_start_date, membership_end_date,
              national_id, national_id_type, email, secondary_phone_no,
              secondary_email, correspond_language, last_renewed_on_date,
-             patron_photo, photo_content_type, photo_uploaded_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+             patron_photo, photo_content_type, photo_uploaded_at, photo_hash)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             RETURNING patron_id
         """, (patron_id, user_id, data['membership_plan_id'],
               data.get('first_name'), data.get('last_name'), date_of_birth,
@@ -252,15 +306,18 @@ def create_patron():
               patron_email, secondary_phone_no,
               secondary_email, correspond_language,
               start_date,
-              patron_photo, photo_content_type, photo_uploaded_at))
+              patron_photo, photo_content_type, photo_uploaded_at, photo_hash))
 
         created_patron_id = cursor.fetchone()['patron_id']
 
-        return jsonify({
-            "message": "Patron created successfully",
-            "patron_id": patron_id,
-            "default_password": default_password
-        }), 201
+    if photo_hash:
+        schedule_variants(photo_hash)  # the asset row is committed now
+
+    return jsonify({
+        "message": "Patron created successfully",
+        "patron_id": patron_id,
+        "default_password": default_password
+    }), 201
 
 @admin_patrons_bp.route('/patrons/<patron_id>', methods=['PUT'])
 @jwt_required()
@@ -268,6 +325,7 @@ def create_patron():
 def update_patron(patron_id):
     """Update patron information"""
     data = request.get_json()
+    photo_hash = None
 
     with get_db_cursor() as cursor:
         # Check if patron exists
@@ -367,12 +425,16 @@ def update_patron(patron_id):
                             params.append(photo_content_type)
                         update_fields.append("photo_uploaded_at = %s")
                         params.append(datetime.now())
+                        photo_hash = _store_photo(cursor, patron_photo)
+                        update_fields.append("photo_hash = %s")
+                        params.append(photo_hash)
                     except Exception as e:
                         print(f"Error processing photo: {e}")
                 else:  # Delete photo
                     update_fields.append("patron_photo = NULL")
                     update_fields.append("photo_content_type = NULL")
                     update_fields.append("photo_uploaded_at = NULL")
+                    update_fields.append("photo_hash = NULL")
 
             if update_fields:
                 params.append(patron_id)
@@ -383,7 +445,10 @@ def update_patron(patron_id):
                     WHERE patron_id = %s
                 """, tuple(params))
 
-        return jsonify({"message": "Patron updated successfully"}), 200
+    if photo_hash:
+        schedule_variants(photo_hash)  # the asset row is committed now
+
+    return jsonify({"message": "Patron updated successfully"}), 200
 
 @admin_patrons_bp.route('/patrons/<patron_id>/reset-password', methods=['POST'])
 @jwt_required()
@@ -457,7 +522,8 @@ def update_patron_status(patron_id):
                 # Update patron with new end date and renewed date
                 cursor.execute("""
                     UPDATE patrons
-                    SET membership_end_date = %s, last_renewed_on_date = %s
+                    SET membership_end_date = %s, last_renewed_on_date = %s,
+                        membership_expired_at = NULL
                     WHERE patron_id = %s
                 """, (new_end_date, today, patron_id))
         elif action == 'activate':
@@ -2,11 +2,13 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
 from app.utils.auth import admin_required
 from app.utils.database import execute_query
+from app.utils.http_cache import versioned
 
 admin_rda_vocabularies_bp = Blueprint('admin_rda_vocabularies', __name__)
 
 @admin_rda_vocabularies_bp.route('/rda/content-types', methods=['GET'])
 @jwt_required()
+@versioned('rda')
 def get_content_types():
     """Get all RDA content types"""
     query = """
@@ -19,6 +21,7 @@ def get_content_types():
 
 @admin_rda_vocabularies_bp.route('/rda/content-types/<string:code>', methods=['GET'])
 @jwt_required()
+@versioned('rda')
 def get_content_type(code):
     """Get a specific RDA content type by code"""
     query = """
@@ -35,6 +38,7 @@ def get_content_type(code):
 
 @admin_rda_vocabularies_bp.route('/rda/media-types', methods=['GET'])
 @jwt_required()
+@versioned('rda')
 def get_media_types():
     """Get all RDA media types"""
     query = """
@@ -47,6 +51,7 @@ def get_media_types():
 
 @admin_rda_vocabularies_bp.route('/rda/media-types/<string:code>', methods=['GET'])
 @jwt_required()
+@versioned('rda')
 def get_media_type(code):
     """Get a specific RDA media type by code"""
     query = """
@@ -63,6 +68,7 @@ def get_media_type(code):
 
 @admin_rda_vocabularies_bp.route('/rda/carrier-types', methods=['GET'])
 @jwt_required()
+@versioned('rda')
 def get_carrier_types():
     """Get all RDA carrier types, optionally filtered by media type"""
     media_type = request.args.get('media_type')
@@ -87,6 +93,7 @@ def get_carrier_types():
 
 @admin_rda_vocabularies_bp.route('/rda/carrier-types/<string:code>', methods=['GET'])
 @jwt_required()
+@versioned('rda')
 def get_carrier_type(code):
     """Get a specific RDA carrier type by code"""
     query = """
@@ -103,6 +110,7 @@ def get_carrier_type(code):
 
 @admin_rda_vocabularies_bp.route('/rda/vocabularies', methods=['GET'])
 @jwt_required()
+@versioned('rda')
 def get_all_vocabularies():
     """Get all RDA vocabularies (content, media, carrier) in one response"""
     content_query = "SELECT code, label, definition, examples FROM rda_content_types ORDER BY label"
@@ -7,6 +7,11 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.utils.database import get_db_cursor
 from app.utils.auth import admin_required
+from app.utils.http_cache import versioned
+from app.utils.website_pages import load_page
+from app.utils.theme_bundle import publish_bundles
+from app.utils.media import MediaError, describe, ingest, media_url as asset_url
+from psycopg2.extras import Json
 import json
 from datetime import datetime
 import os
@@ -21,6 +26,7 @@ admin_website_bp = Blueprint('admin_website', __name__)
 @admin_website_bp.route('/theme/settings', methods=['GET'])
 @jwt_required()
 @admin_required
+@versioned('website')
 def get_theme_settings():
     """Get all theme settings"""
     try:
@@ -77,6 +83,8 @@ def update_theme_setting(setting_id):
             if not updated_setting:
                 return jsonify({'success': False, 'error': 'Setting not found'}), 404
 
+            publish_bundles(cur)
+
             return jsonify({
                 'success': True,
                 'message': 'Theme setting updated successfully',
@@ -113,6 +121,9 @@ def update_theme_settings_bulk():
                     """, (setting_value, setting_key))
                     updated_count += cur.rowcount
 
+            if updated_count:
+                publish_bundles(cur)
+
             return jsonify({
                 'success': True,
                 'message': f'{updated_count} settings updated successfully'
@@ -196,6 +207,8 @@ def reset_theme():
                 """, (default_value, setting_key))
                 reset_count += cur.rowcount
 
+            publish_bundles(cur)
+
             return jsonify({
                 'success': True,
                 'message': f'Theme reset to defaults ({reset_count} settings updated). Please refresh the page.',
@@ -238,50 +251,16 @@ def get_pages():
 @admin_website_bp.route('/pages/<int:page_id>', methods=['GET'])
 @jwt_required()
 @admin_required
+@versioned('website')
 def get_page(page_id):
     """Get a specific page with all its sections"""
     try:
         with get_db_cursor() as cur:
-            # Get page details
-            cur.execute("""
-                SELECT p.*, u.name as creator_name
-                FROM website_pages p
-                LEFT JOIN users u ON p.created_by = u.user_id
-                WHERE p.page_id = %s
-            """, (page_id,))
-
-            page = cur.fetchone()
+            page = load_page(cur, page_id)
 
             if not page:
                 return jsonify({'success': False, 'error': 'Page not found'}), 404
 
-            # Get sections for this page
-            cur.execute("""
-                SELECT * FROM website_sections
-                WHERE page_id = %s
-                ORDER BY display_order
-            """, (page_id,))
-
-            sections = cur.fetchall()
-
-            # Get content blocks and cards for each section
-            for section in sections:
-                cur.execute("""
-                    SELECT * FROM website_content_blocks
-                    WHERE section_id = %s
-                    ORDER BY display_order
-                """, (section['section_id'],))
-                section['content_blocks'] = cur.fetchall()
-
-                cur.execute("""
-                    SELECT * FROM website_cards
-                    WHERE section_id = %s
-                    ORDER BY display_order
-                """, (section['section_id'],))
-                section['cards'] = cur.fetchall()
-
-            page['sections'] = sections
-
             return jsonify({
                 'success': True,
                 'page': page
@@ -779,6 +758,7 @@ def delete_card(card_id):
 @admin_website_bp.route('/menu/<menu_location>', methods=['GET'])
 @jwt_required()
 @admin_required
+@versioned('website')
 def get_menu_items(menu_location):
     """Get menu items for a specific location"""
     try:
@@ -803,6 +783,7 @@ def get_menu_items(menu_location):
 @admin_website_bp.route('/menu', methods=['GET'])
 @jwt_required()
 @admin_required
+@versioned('website')
 def get_all_menu_items():
     """Get all menu items grouped by location"""
     try:
@@ -975,6 +956,8 @@ def get_media():
                 """)
 
             media_files = cur.fetchall()
+            for media in media_files:
+                media['srcset'] = describe(media.get('content_hash'), variants=media.get('variants'))['srcset']
 
             return jsonify({
                 'success': True,
@@ -989,18 +972,30 @@ def get_media():
 @jwt_required()
 @admin_required
 def upload_media():
-    """Register a new media file (URL-based, actual upload handled elsewhere)"""
+    """Upload a media file (multipart 'file') or register an external URL (JSON)"""
     try:
-        data = request.get_json()
         user_id = get_jwt_identity()
+        upload = request.files.get('file')
+        data = request.form if upload else (request.get_json() or {})
 
-        media_name = data.get('media_name')
+        media_name = data.get('media_name') or (upload.filename if upload else None)
         media_url = data.get('media_url')
         media_type = data.get('media_type', 'image')
         file_size = data.get('file_size', 0)
         mime_type = data.get('mime_type', '')
         alt_text = data.get('alt_text', '')
         caption = data.get('caption', '')
+        asset = None
+
+        if upload:
+            try:
+                asset = ingest(upload.stream, images_only=(media_type == 'image'))
+            except MediaError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+            media_name = secure_filename(media_name) or asset['sha256'][:12]
+            media_url = asset_url(asset['sha256'])
+            file_size = asset['file_size']
+            mime_type = asset['mime_type']
 
         if not media_name or not media_url:
             return jsonify({'success': False, 'error': 'Media name and URL are required'}), 400
@@ -1009,17 +1004,23 @@ def upload_media():
             cur.execute("""
                 INSERT INTO website_media
                 (media_name, media_url, media_type, file_size, mime_type,
-                 alt_text, caption, uploaded_by)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                 alt_text, caption, uploaded_by, content_hash, width, height, variants)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                 RETURNING *
             """, (media_name, media_url, media_type, file_size, mime_type,
-                  alt_text, caption, user_id))
+                  alt_text, caption, user_id,
+                  asset['sha256'] if asset else None,
+                  asset['width'] if asset else None,
+                  asset['height'] if asset else None,
+                  Json(asset['variants'] if asset else [])))
 
             new_media = cur.fetchone()
+            # Variants are usually still being generated: srcset fills in once they are
+            new_media['srcset'] = describe(new_media['content_hash'], variants=new_media['variants'])['srcset']
 
             return jsonify({
                 'success': True,
-                'message': 'Media registered successfully',
+                'message': 'Media uploaded successfully' if upload else 'Media registered successfully',
                 'media': new_media
             }), 201
 
@@ -1104,6 +1105,7 @@ def delete_media(media_id):
 @admin_website_bp.route('/settings/global', methods=['GET'])
 @jwt_required()
 @admin_required
+@versioned('website')
 def get_global_settings():
     """Get global website settings"""
     try:
@@ -1164,6 +1166,8 @@ def update_global_settings():
             if not updated_settings:
                 return jsonify({'success': False, 'error': 'Settings not found'}), 404
 
+            publish_bundles(cur)
+
             return jsonify({
                 'success': True,
                 'message': 'Global settings updated successfully',
@@ -0,0 +1,41 @@
+"""
+Cover Routes
+Book cover thumbnails from the local cover cache (no login required)
+"""
+
+import re
+from flask import Blueprint, jsonify, redirect, send_file
+from app.utils import metrics
+from app.utils.cover_cache import SIZES, cached_cover, cover_key, schedule_prefetch
+from app.utils.database import execute_query
+from app.utils.replicas import read_only
+
+covers_bp = Blueprint('covers', __name__)
+
+
+@covers_bp.route('/<int:book_id>/<key>/<size>.webp', methods=['GET'])
+@read_only()
+def get_cover(book_id, key, size):
+    """Get a cover thumbnail (cacheable forever), or the remote cover while it is being cached"""
+    if size not in SIZES or not re.fullmatch(r'[0-9a-f]{20}', key):
+        return jsonify({'error': 'Cover not found'}), 404
+
+    path = cached_cover(key, size)
+    if path is None:
+        book = execute_query("SELECT cover_image_url FROM books WHERE book_id = %s", (book_id,), fetch_one=True)
+        source_url = book['cover_image_url'] if book else None
+        # The key must be this book's current cover: the cache is not an open proxy
+        if not source_url or cover_key(source_url) != key:
+            return jsonify({'error': 'Cover not found'}), 404
+        # Never fetched inline, where a slow provider would hold the worker:
+        # queue it and let the client load the remote cover this time
+        schedule_prefetch(source_url)
+        metrics.inc('cover_cache_requests_total', result='miss')
+        response = redirect(source_url, code=302)
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    metrics.inc('cover_cache_requests_total', result='hit')
+    response = send_file(path, mimetype='image/webp', conditional=True, etag=False)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
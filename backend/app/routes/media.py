@@ -0,0 +1,38 @@
+"""
+Media Routes
+Uploaded originals and their resized variants, by content hash (no login required).
+Private assets (patron photos) are not served here
+"""
+
+import re
+from flask import Blueprint, jsonify
+from app.utils.media import VARIANT_MIMETYPES, asset_info, send_asset
+from app.utils.replicas import read_only
+
+media_bp = Blueprint('media', __name__)
+
+_SHA256 = re.compile(r'[0-9a-f]{64}')
+
+
+def _public_asset(sha256, width=None, fmt=None):
+    info = asset_info(sha256) if _SHA256.fullmatch(sha256) else None
+    response = send_asset(sha256, info, width, fmt) if info and not info['is_private'] else None
+    if response is None:
+        return jsonify({'error': 'Media not found'}), 404
+    return response
+
+
+@media_bp.route('/<sha256>', methods=['GET'])
+@read_only()
+def get_original(sha256):
+    """Get an uploaded original (cacheable forever)"""
+    return _public_asset(sha256)
+
+
+@media_bp.route('/<sha256>/<int:width>.<fmt>', methods=['GET'])
+@read_only()
+def get_variant(sha256, width, fmt):
+    """Get a resized variant; the original if it is smaller or the variant isn't generated yet"""
+    if fmt not in VARIANT_MIMETYPES:
+        return jsonify({'error': 'Media not found'}), 404
+    return _public_asset(sha256, width, fmt)
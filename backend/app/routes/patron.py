@@ -1,12 +1,21 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.utils.database import execute_query, get_db_cursor
+from app.utils.database import execute_query, get_db_cursor, query_rows
 from app.config import Config
 from app.utils.semantic_search import semantic_search as run_semantic_search
+from app.utils.recommendations import get_similar_books, get_stored_recommendations
+from app.utils.recommendation_jobs import compute_and_store, schedule_recompute
+from app.utils.popularity import get_popular_books
+from app.utils.holds import place_hold, get_holds, cancel_hold
+from app.utils.http_cache import versioned
+from app.utils.replicas import read_only
+from app.utils.query_budget import QueryBudgetExceeded, budget_exceeded, limit_search_terms, query_budget
+from app.utils.cover_cache import localize_covers
 
 patron_bp = Blueprint('patron', __name__)
 
 @patron_bp.route('/books/new-arrivals', methods=['GET'])
+@versioned('catalogue')
 def get_new_arrivals():
     """Get recently added books (public endpoint)"""
     limit = request.args.get('limit', 6, type=int)
@@ -43,10 +52,32 @@ def get_new_arrivals():
     books = execute_query(query, (limit,), fetch_all=True)
 
     return jsonify({
-        "books": [dict(b) for b in (books or [])]
+        "books": localize_covers([dict(b) for b in (books or [])])
+    }), 200
+
+@patron_bp.route('/books/trending', methods=['GET'])
+def get_trending_books():
+    """Get trending books by decayed checkout score (public endpoint)"""
+    limit = request.args.get('limit', 10, type=int)
+    window = request.args.get('window')
+
+    # Limit to a reasonable number to prevent abuse
+    if limit > 50:
+        limit = 50
+
+    try:
+        books = get_popular_books(window=window, limit=limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        "books": localize_covers([dict(b) for b in books])
     }), 200
 
 @patron_bp.route('/books/search', methods=['GET'])
+@query_budget(Config.SEARCH_QUERY_BUDGET)
+@read_only()
+@versioned('catalogue')
 def search_books_public():
     """Public endpoint to search books (no authentication required)"""
     search = request.args.get('search', '')
@@ -61,6 +92,7 @@ def search_books_public():
 
     where_clauses = ["b.is_active = TRUE"]
     params = []
+    ignored_terms = []
 
     if search:
         # Handle quoted phrases for exact tag matching and regular words
@@ -70,6 +102,7 @@ def search_books_public():
         # Remove quoted parts and split remaining into words
         remaining = re.sub(quoted_pattern, '', search)
         search_words = [word.strip() for word in remaining.split() if word.strip()]
+        quoted_terms, search_words, ignored_terms = limit_search_terms(quoted_terms, search_words)
 
         word_conditions = []
 
@@ -106,11 +139,7 @@ def search_books_public():
             where_clauses.append("(" + " AND ".join(word_conditions) + ")")
 
     where_sql = "WHERE " + " AND ".join(where_clauses)
-
-    # Get total count
-    count_query = f"SELECT COUNT(*) as total FROM books b {where_sql}"
-    total_result = execute_query(count_query, tuple(params) if params else None, fetch_one=True)
-    total = total_result['total'] if total_result else 0
+    filter_params = tuple(params)
 
     # Get books with contributors and availability
     query = f"""
@@ -138,14 +167,33 @@ def search_books_public():
     """
     params.extend([limit, offset])
 
-    books = execute_query(query, tuple(params), fetch_all=True)
+    books = query_rows(query, tuple(params))
 
-    return jsonify({
-        "books": [dict(b) for b in (books or [])],
+    # Counting every match costs more than one page of them; when it runs
+    # over the budget, serve the page with a lower bound for the total
+    partial = False
+    count_query = f"SELECT COUNT(*) as total FROM books b {where_sql}"
+    try:
+        total_result = execute_query(count_query, filter_params or None, fetch_one=True)
+        total = total_result['total'] if total_result else 0
+    except QueryBudgetExceeded:
+        budget_exceeded('partial')
+        partial = True
+        total = offset + len(books) + (1 if len(books) == limit else 0)
+
+    response = {
+        "books": localize_covers(books),
         "total": total,
         "page": page,
         "per_page": limit
-    }), 200
+    }
+    if ignored_terms:
+        response["ignored_terms"] = ignored_terms
+    if partial:
+        response["partial"] = True
+        # Not for reuse: the next request may well get the full answer
+        return jsonify(response), 200, {'Cache-Control': 'no-store'}
+    return jsonify(response), 200
 
 
 def _keyword_search(search: str, limit: int = 6):
@@ -160,6 +208,7 @@ def _keyword_search(search: str, limit: int = 6):
         # Remove quoted parts and split remaining into words
         remaining = re.sub(quoted_pattern, '', search)
         search_words = [word.strip() for word in remaining.split() if word.strip()]
+        quoted_terms, search_words, _ = limit_search_terms(quoted_terms, search_words)
 
         word_conditions = []
 
@@ -246,9 +295,9 @@ def semantic_search_books():
         books = run_semantic_search(query, limit=limit)
         if not books:
             books = _keyword_search(query, limit=limit)
-            return jsonify({"books": [dict(b) for b in books], "mode": "keyword-fallback"}), 200
+            return jsonify({"books": localize_covers([dict(b) for b in books]), "mode": "keyword-fallback"}), 200
 
-        return jsonify({"books": books, "mode": "semantic"}), 200
+        return jsonify({"books": localize_covers(books), "mode": "semantic"}), 200
     except Exception as exc:
         return jsonify({
             "books": [],
@@ -322,7 +371,7 @@ def browse_books():
     books = execute_query(query, tuple(params), fetch_all=True)
 
     return jsonify({
-        "books": [dict(b) for b in (books or [])],
+        "books": localize_covers([dict(b) for b in (books or [])]),
         "total": total,
         "page": page,
         "per_page": Config.ITEMS_PER_PAGE
@@ -370,12 +419,26 @@ def get_book_details(book_id):
     """
     reviews = execute_query(reviews_query, (book_id,), fetch_all=True)
 
-    result = dict(book)
+    result = localize_covers([dict(book)])[0]
     result['contributors'] = [dict(c) for c in (contributors or [])]
     result['reviews'] = [dict(r) for r in (reviews or [])]
 
     return jsonify(result), 200
 
+@patron_bp.route('/books/<int:book_id>/similar', methods=['GET'])
+def get_similar(book_id):
+    """Get books similar to a given book (public endpoint)"""
+    limit = request.args.get('limit', 5, type=int)
+
+    # Limit to a reasonable number to prevent abuse (LIMIT rejects negatives)
+    limit = max(1, min(limit, 20))
+
+    books = get_similar_books(book_id, limit=limit)
+
+    return jsonify({
+        "books": localize_covers([dict(b) for b in books])
+    }), 200
+
 @patron_bp.route('/books/<int:book_id>/review', methods=['POST'])
 @jwt_required()
 def add_review(book_id):
@@ -430,7 +493,9 @@ def add_review(book_id):
             ON CONFLICT DO NOTHING
         """, (patron['patron_id'], book_id))
 
-        return jsonify({"message": message}), 200
+    schedule_recompute(patron['patron_id'])
+
+    return jsonify({"message": message}), 200
 
 @patron_bp.route('/my-borrowings', methods=['GET'])
 @jwt_required()
@@ -462,6 +527,65 @@ def get_my_borrowings():
 
     return jsonify([dict(b) for b in (borrowings or [])]), 200
 
+@patron_bp.route('/books/<int:book_id>/hold', methods=['POST'])
+@jwt_required()
+def place_book_hold(book_id):
+    """Join the hold queue for a book with no copy on the shelf"""
+    user_id = int(get_jwt_identity())
+
+    with get_db_cursor() as cursor:
+        cursor.execute("""
+            SELECT p.patron_id, u.status
+            FROM patrons p
+            JOIN users u ON p.user_id = u.user_id
+            WHERE p.user_id = %s
+        """, (user_id,))
+        patron = cursor.fetchone()
+
+        if not patron:
+            return jsonify({"error": "Patron not found"}), 404
+        if patron['status'] != 'active':
+            return jsonify({"error": f"Patron account is {patron['status']}"}), 400
+
+        hold, error = place_hold(cursor, patron['patron_id'], book_id)
+        if error:
+            return jsonify({"error": error[0]}), error[1]
+
+    return jsonify({
+        "message": "Hold placed successfully",
+        "reservation_id": hold['reservation_id'],
+        "queue_position": hold['queue_position']
+    }), 201
+
+@patron_bp.route('/my-holds', methods=['GET'])
+@jwt_required()
+def get_my_holds():
+    """Get current patron's open holds with queue positions"""
+    user_id = int(get_jwt_identity())
+
+    patron = execute_query("SELECT patron_id FROM patrons WHERE user_id = %s",
+                           (user_id,), fetch_one=True)
+    if not patron:
+        return jsonify([]), 200
+
+    return jsonify(get_holds(patron_id=patron['patron_id'])), 200
+
+@patron_bp.route('/my-holds/<int:reservation_id>', methods=['DELETE'])
+@jwt_required()
+def cancel_my_hold(reservation_id):
+    """Cancel one of the current patron's holds"""
+    user_id = int(get_jwt_identity())
+
+    with get_db_cursor() as cursor:
+        cursor.execute("SELECT patron_id FROM patrons WHERE user_id = %s", (user_id,))
+        patron = cursor.fetchone()
+        cancelled = patron and cancel_hold(cursor, reservation_id, patron_id=patron['patron_id'])
+
+    if not cancelled:
+        return jsonify({"error": "Hold not found or already closed"}), 404
+
+    return jsonify({"message": "Hold cancelled"}), 200
+
 @patron_bp.route('/recommendations', methods=['GET'])
 @jwt_required()
 def get_recommendations():
@@ -477,46 +601,18 @@ def get_recommendations():
         return jsonify([]), 200
 
     try:
-        # Simple recommendation algorithm based on:
-        # 1. Books not already borrowed/read
-        # 2. Highly rated books
-        # 3. Recently added books
-
-        query = """
-            SELECT DISTINCT b.book_id, b.isbn, b.title, b.subtitle,
-                   b.publisher, b.publication_year,
-                   b.collection_id, c.collection_name,
-                   b.age_rating, b.cover_image_url,
-                   ba.available_items, ba.total_items,
-                   COALESCE((SELECT json_agg(
-                       json_build_object('name', contrib.name, 'role', bc.role)
-                       ORDER BY bc.role, bc.sequence_number
-                   )
-                    FROM book_contributors bc
-                    JOIN contributors contrib ON bc.contributor_id = contrib.contributor_id
-                    WHERE bc.book_id = b.book_id
-                   ), '[]'::json) as contributors,
-                   (SELECT AVG(rating) FROM reviews WHERE book_id = b.book_id) as avg_rating,
-                   (SELECT COUNT(*) FROM reviews WHERE book_id = b.book_id) as review_count
-            FROM books b
-            LEFT JOIN collections c ON b.collection_id = c.collection_id
-            LEFT JOIN mv_book_availability ba ON b.book_id = ba.book_id
-            WHERE b.is_active = TRUE
-              AND ba.available_items > 0
-              AND b.book_id NOT IN (
-                  -- Exclude books already borrowed by this patron
-                  SELECT DISTINCT i.book_id
-                  FROM borrowings br
-                  JOIN items i ON br.item_id = i.item_id
-                  WHERE br.patron_id = %s
-              )
-            ORDER BY avg_rating DESC NULLS LAST, b.created_at DESC
-            LIMIT 10
-        """
-
-        recommendations = execute_query(query, (patron['patron_id'],), fetch_all=True)
-
-        return jsonify([dict(r) for r in (recommendations or [])]), 200
+        # Served from the materialized list; refreshed in the background on
+        # borrow/return/review and nightly (see app/utils/recommendation_jobs.py)
+        stored = get_stored_recommendations(patron['patron_id'], limit=10)
+
+        if stored is None:
+            # First visit: build this patron's list synchronously once
+            compute_and_store([patron['patron_id']])
+            stored = get_stored_recommendations(patron['patron_id'], limit=10)
+
+        recommendations = localize_covers(stored['books']) if stored else []
+
+        return jsonify(recommendations), 200
     except Exception as e:
         # Log error and return empty list as fallback
         print(f"Error getting recommendations: {str(e)}")
@@ -581,6 +677,7 @@ def get_my_cowork_bookings():
     return jsonify([dict(b) for b in (bookings or [])]), 200
 
 @patron_bp.route('/collections', methods=['GET'])
+@versioned('catalogue')
 def get_collections():
     """Get all collections (public endpoint for filtering books)"""
     query = """
@@ -596,6 +693,7 @@ def get_collections():
     return jsonify([dict(c) for c in (collections or [])]), 200
 
 @patron_bp.route('/age-ratings', methods=['GET'])
+@versioned('catalogue')
 def get_age_ratings():
     """Get all age ratings (public endpoint for filtering books)"""
     query = "SELECT * FROM age_ratings ORDER BY min_age, max_age NULLS LAST"
@@ -0,0 +1,51 @@
+"""
+Public Website Routes
+Published CMS pages and theme bundles for the public website (no login required)
+"""
+
+import re
+from flask import Blueprint, current_app, g, jsonify, url_for
+from app.utils.http_cache import versioned
+from app.utils.replicas import read_only
+from app.utils.theme_bundle import MIMETYPES, bundle_body, current_hashes
+from app.utils.website_pages import rendered_page
+
+website_bp = Blueprint('website', __name__)
+
+
+@website_bp.route('/pages/<slug>', methods=['GET'])
+@read_only()
+@versioned('website')
+def get_published_page(slug):
+    """Get a published page with its visible sections, blocks and cards"""
+    # The snapshot @versioned built the ETag from, so content_versions is read once
+    body = rendered_page(slug, g.get('content_versions'))
+    if body is None:
+        return jsonify({'success': False, 'error': 'Page not found'}), 404
+    return current_app.response_class(body, mimetype='application/json')
+
+
+@website_bp.route('/theme', methods=['GET'])
+@read_only()
+@versioned('website')
+def get_theme():
+    """Get the URLs of the current theme stylesheet and site settings bundles"""
+    hashes = current_hashes()
+    return jsonify({
+        'success': True,
+        'stylesheet': url_for('website.get_bundle', kind='css', digest=hashes['css']),
+        'settings': url_for('website.get_bundle', kind='json', digest=hashes['json'])
+    }), 200
+
+
+@website_bp.route('/assets/theme.<digest>.css', defaults={'kind': 'css'}, methods=['GET'])
+@website_bp.route('/assets/site.<digest>.json', defaults={'kind': 'json'}, methods=['GET'])
+@read_only()
+def get_bundle(kind, digest):
+    """Get a compiled theme bundle by content hash (cacheable forever)"""
+    body = bundle_body(kind, digest) if re.fullmatch(r'[0-9a-f]{20}', digest) else None
+    if body is None:
+        return jsonify({'success': False, 'error': 'Bundle not found'}), 404
+    response = current_app.response_class(body, mimetype=MIMETYPES[kind])
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
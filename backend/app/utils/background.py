@@ -0,0 +1,63 @@
+"""
+Keyed background work on a small thread pool.
+
+Request handlers hand off slow work they don't wait for - resized media
+variants, cover prefetches - with ``BackgroundTasks.submit(key)``. The pool
+is created on first use (so never in a pre-forking master), a key already
+queued or running is not queued again, and failures are logged rather
+than raised: queueing must never fail the request.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundTasks:
+    """Runs ``task(key)`` in the background, at most once per key at a time"""
+
+    def __init__(self, task: Callable[[Hashable], Any], max_workers: int, name: str):
+        self.task = task
+        self.max_workers = max_workers
+        self.name = name  # thread name prefix and log label
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = set()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix=self.name)
+        return self._executor
+
+    def is_pending(self, key: Hashable) -> bool:
+        return key in self._pending
+
+    def submit(self, key: Hashable) -> bool:
+        """Queue ``task(key)`` unless it is already pending; never raises"""
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+        try:
+            future = self._get_executor().submit(self.task, key)
+            future.add_done_callback(lambda f: self._on_done(key, f))
+        except Exception as e:
+            self._discard(key)
+            logger.warning("Could not queue %s for %s: %s", self.name, key, e)
+            return False
+        return True
+
+    def _discard(self, key):
+        with self._lock:
+            self._pending.discard(key)
+
+    def _on_done(self, key, future):
+        self._discard(key)
+        exc = future.exception()
+        if exc is not None:
+            logger.warning("%s failed for %s: %s", self.name, key, exc)
@@ -0,0 +1,94 @@
+"""
+Small in-process TTL cache with stale-while-revalidate.
+
+Fresh entries are returned directly. Once an entry expires it is still
+served for up to ``stale_ttl`` seconds while a single background thread
+recomputes it, so readers never wait on a refresh. Only a missing (or too
+old) entry is computed inline, and concurrent callers for the same key wait
+for that one computation instead of stampeding the database.
+"""
+import logging
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, Hashable
+
+from app.utils import metrics
+
+_caches = weakref.WeakSet()
+
+
+class _Entry:
+    __slots__ = ('value', 'created_at')
+
+    def __init__(self, value, created_at):
+        self.value = value
+        self.created_at = created_at
+
+
+class TTLCache:
+    def __init__(self, ttl: float, stale_ttl: float = 0, name: str = 'default'):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries: Dict[Hashable, _Entry] = {}
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        _caches.add(self)
+
+    def _key_lock(self, key) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _compute(self, key, compute: Callable[[], Any]):
+        value = compute()
+        self._entries[key] = _Entry(value, time.monotonic())
+        return value
+
+    def _refresh(self, key, compute):
+        try:
+            with self._key_lock(key):
+                self._compute(key, compute)
+        except Exception as e:
+            # Keep serving the stale value; the next caller retries
+            logging.warning("Background cache refresh failed for %r: %s", key, e)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]):
+        """Return the cached value for ``key``, computing or refreshing it as needed."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry.created_at
+            if age < self.ttl:
+                metrics.inc('cache_requests_total', cache=self.name, result='hit')
+                return entry.value
+            if age < self.ttl + self.stale_ttl:
+                metrics.inc('cache_requests_total', cache=self.name, result='stale')
+                with self._lock:
+                    start = key not in self._refreshing
+                    self._refreshing.add(key)
+                if start:
+                    threading.Thread(target=self._refresh, args=(key, compute), daemon=True).start()
+                return entry.value
+
+        metrics.inc('cache_requests_total', cache=self.name, result='miss')
+        with self._key_lock(key):
+            # Another caller may have filled it while we waited
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.created_at < self.ttl:
+                return entry.value
+            return self._compute(key, compute)
+
+    def invalidate(self, key: Hashable = None):
+        """Drop one key, or everything when no key is given."""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+
+metrics.register_gauges(lambda: [('cache_entries', {'cache': cache.name}, len(cache._entries))
+                                 for cache in list(_caches)])
@@ -0,0 +1,65 @@
+"""
+Atomic checkout.
+
+``checkout_item`` wraps the ``checkout_item()`` database function
+(migration 012), which locks the patron and the item, re-checks availability
+and the borrowing limit under those locks and inserts the loan - all in one
+round trip. Outcomes map onto the error messages the issue route has always
+returned. ``checkout_items`` is the batch form (migration 019): the same
+rules for a list of items in one statement.
+"""
+from datetime import datetime, timedelta
+
+from app.config import Config
+
+
+def checkout_error(result):
+    """(message, status code) for a failed checkout outcome, or None if issued."""
+    outcome, detail = result['outcome'], result['detail']
+    if outcome == 'issued':
+        return None
+    if outcome == 'item_not_found':
+        return "Item not found", 404
+    if outcome == 'item_unavailable':
+        return f"Item is {detail}", 400
+    if outcome == 'patron_not_found':
+        return "Patron not found", 404
+    if outcome == 'patron_inactive':
+        return f"Patron account is {detail}", 400
+    if outcome == 'limit_reached':
+        return f"Borrowing limit reached. Maximum {detail} books allowed.", 400
+    return f"Checkout failed: {outcome}", 500
+
+
+def checkout_item(cursor, patron_id, item_id, checkout_date=None):
+    """
+    Issue one item inside the caller's transaction.
+    Returns the function's row: outcome, detail, borrowing_id, book_id,
+    barcode, title plus the due_date used.
+    """
+    checkout_date = checkout_date or datetime.now().date()
+    due_date = checkout_date + timedelta(days=Config.CHECKOUT_DURATION_DAYS)
+
+    cursor.execute("SELECT * FROM checkout_item(%s, %s, %s, %s)",
+                   (patron_id, item_id, checkout_date, due_date))
+    result = dict(cursor.fetchone())
+    result['checkout_date'] = checkout_date
+    result['due_date'] = due_date
+    return result
+
+
+def checkout_items(cursor, patron_id, item_ids, checkout_date=None):
+    """
+    Issue several items (in order, until the borrowing limit) inside the
+    caller's transaction. Returns one row per item id, as ``checkout_item``
+    """
+    checkout_date = checkout_date or datetime.now().date()
+    due_date = checkout_date + timedelta(days=Config.CHECKOUT_DURATION_DAYS)
+
+    cursor.execute("SELECT * FROM checkout_items(%s, %s::integer[], %s, %s)",
+                   (patron_id, list(item_ids), checkout_date, due_date))
+    results = [dict(row) for row in cursor.fetchall()]
+    for result in results:
+        result['checkout_date'] = checkout_date
+        result['due_date'] = due_date
+    return results
@@ -0,0 +1,209 @@
+"""
+Daily circulation rollup (``circulation_daily``).
+
+The borrowing routes fold each checkout, return and renewal into the rollup
+inside their own transaction, so trend charts read a few hundred small rows
+instead of scanning ``borrowings``. Overdue transitions are derived from due
+dates and refreshed by ``refresh_overdue_transitions``; the backfill command
+(``backfill_circulation_daily.py``) rebuilds any date range from history.
+"""
+from datetime import date, timedelta
+from typing import Iterable, Optional
+
+from app.config import Config
+from app.utils.database import execute_query, get_db_cursor
+
+EVENTS = ('checkouts', 'returns', 'renewals')
+GRANULARITIES = ('day', 'week', 'month')
+
+_BUCKET_DAYS = {'day': 1, 'week': 7, 'month': 30}
+
+
+def record_circulation(cursor, event: str, borrowing_ids: Iterable[int], day: Optional[date] = None) -> None:
+    """
+    Count ``event`` for each borrowing on ``day`` (default today), inside
+    the caller's transaction. Collection and patron come from the borrowing.
+    """
+    if event not in EVENTS:
+        raise ValueError(f"Unknown circulation event: {event}")
+
+    borrowing_ids = list(borrowing_ids)
+    if not borrowing_ids:
+        return
+
+    cursor.execute(f"""
+        WITH src AS (
+            SELECT COALESCE(%(day)s::date, CURRENT_DATE) AS day,
+                   COALESCE(b.collection_id, 0) AS collection_id,
+                   br.patron_id
+            FROM borrowings br
+            JOIN items i ON br.item_id = i.item_id
+            JOIN books b ON i.book_id = b.book_id
+            WHERE br.borrowing_id = ANY(%(ids)s)
+        ),
+        new_patrons AS (
+            INSERT INTO circulation_daily_patrons (day, collection_id, patron_id)
+            SELECT DISTINCT day, collection_id, patron_id FROM src
+            ON CONFLICT DO NOTHING
+            RETURNING day, collection_id
+        )
+        INSERT INTO circulation_daily (day, collection_id, {event}, unique_patrons)
+        SELECT s.day, s.collection_id, COUNT(*),
+               (SELECT COUNT(*) FROM new_patrons np
+                WHERE np.day = s.day AND np.collection_id = s.collection_id)
+        FROM src s
+        GROUP BY s.day, s.collection_id
+        ON CONFLICT (day, collection_id) DO UPDATE
+        SET {event} = circulation_daily.{event} + EXCLUDED.{event},
+            unique_patrons = circulation_daily.unique_patrons + EXCLUDED.unique_patrons
+    """, {'ids': borrowing_ids, 'day': day})
+
+
+def _overdue_sql(cursor, start: date, end: date) -> None:
+    # A borrowing becomes overdue the day after its due date unless it was
+    # returned by then. Idempotent: counts are recomputed, not incremented.
+    cursor.execute("""
+        UPDATE circulation_daily
+        SET overdue_transitions = 0
+        WHERE day BETWEEN %(start)s AND %(end)s AND overdue_transitions <> 0
+    """, {'start': start, 'end': end})
+    cursor.execute("""
+        INSERT INTO circulation_daily (day, collection_id, overdue_transitions)
+        SELECT br.due_date + 1, COALESCE(b.collection_id, 0), COUNT(*)
+        FROM borrowings br
+        JOIN items i ON br.item_id = i.item_id
+        JOIN books b ON i.book_id = b.book_id
+        WHERE br.due_date + 1 BETWEEN %(start)s AND %(end)s
+          AND br.due_date + 1 <= CURRENT_DATE
+          AND (br.return_date IS NULL OR br.return_date > br.due_date)
+        GROUP BY br.due_date + 1, COALESCE(b.collection_id, 0)
+        ON CONFLICT (day, collection_id) DO UPDATE
+        SET overdue_transitions = EXCLUDED.overdue_transitions
+    """, {'start': start, 'end': end})
+
+
+def refresh_overdue_transitions(days: int = 7) -> None:
+    """Recount overdue transitions for the last ``days`` days (run daily)."""
+    end = date.today()
+    with get_db_cursor() as cursor:
+        _overdue_sql(cursor, end - timedelta(days=days - 1), end)
+
+
+def rebuild_circulation_daily(start: date, end: date) -> int:
+    """
+    Recompute checkouts, returns, overdue transitions and unique patrons for
+    ``start``..``end`` from ``borrowings``. Renewal dates are not recorded on
+    borrowings, so renewal counts (and their patrons) are kept as they are.
+    Returns the number of rollup rows in the range.
+    """
+    params = {'start': start, 'end': end}
+    with get_db_cursor() as cursor:
+        cursor.execute("""
+            UPDATE circulation_daily
+            SET checkouts = 0, returns = 0
+            WHERE day BETWEEN %(start)s AND %(end)s
+        """, params)
+
+        cursor.execute("""
+            WITH events AS (
+                SELECT br.checkout_date AS day, COALESCE(b.collection_id, 0) AS collection_id,
+                       br.patron_id, 1 AS checkouts, 0 AS returns
+                FROM borrowings br
+                JOIN items i ON br.item_id = i.item_id
+                JOIN books b ON i.book_id = b.book_id
+                WHERE br.checkout_date BETWEEN %(start)s AND %(end)s
+                UNION ALL
+                SELECT br.return_date, COALESCE(b.collection_id, 0),
+                       br.patron_id, 0, 1
+                FROM borrowings br
+                JOIN items i ON br.item_id = i.item_id
+                JOIN books b ON i.book_id = b.book_id
+                WHERE br.status = 'returned'
+                  AND br.return_date BETWEEN %(start)s AND %(end)s
+            ),
+            new_patrons AS (
+                INSERT INTO circulation_daily_patrons (day, collection_id, patron_id)
+                SELECT DISTINCT day, collection_id, patron_id FROM events
+                ON CONFLICT DO NOTHING
+            )
+            INSERT INTO circulation_daily (day, collection_id, checkouts, returns)
+            SELECT day, collection_id, SUM(checkouts), SUM(returns)
+            FROM events
+            GROUP BY day, collection_id
+            ON CONFLICT (day, collection_id) DO UPDATE
+            SET checkouts = EXCLUDED.checkouts,
+                returns = EXCLUDED.returns
+        """, params)
+
+        _overdue_sql(cursor, start, end)
+
+        # Data-modifying CTEs share one snapshot, so count patrons afterwards
+        cursor.execute("""
+            UPDATE circulation_daily cd
+            SET unique_patrons = (
+                SELECT COUNT(*) FROM circulation_daily_patrons cp
+                WHERE cp.day = cd.day AND cp.collection_id = cd.collection_id
+            )
+            WHERE cd.day BETWEEN %(start)s AND %(end)s
+        """, params)
+        return cursor.rowcount
+
+
+def get_circulation_trends(start: date, end: date, granularity: str = 'day',
+                           collection_id: Optional[int] = None):
+    """
+    Circulation per day/week/month between ``start`` and ``end`` (inclusive),
+    one row per bucket including empty ones. Raises ValueError on bad input.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    if start > end:
+        raise ValueError("start must be on or before end")
+    buckets = (end - start).days // _BUCKET_DAYS[granularity] + 1
+    if buckets > Config.TRENDS_MAX_BUCKETS:
+        raise ValueError(f"Range too large: at most {Config.TRENDS_MAX_BUCKETS} {granularity}s per request")
+
+    collection_filter = "" if collection_id is None else "AND collection_id = %(collection_id)s"
+
+    query = f"""
+        WITH buckets AS (
+            SELECT generate_series(
+                date_trunc(%(granularity)s, %(start)s::date),
+                %(end)s::date,
+                ('1 ' || %(granularity)s)::interval
+            )::date AS bucket
+        ),
+        totals AS (
+            SELECT date_trunc(%(granularity)s, day)::date AS bucket,
+                   SUM(checkouts) AS checkouts,
+                   SUM(returns) AS returns,
+                   SUM(renewals) AS renewals,
+                   SUM(overdue_transitions) AS overdue_transitions
+            FROM circulation_daily
+            WHERE day BETWEEN %(start)s AND %(end)s {collection_filter}
+            GROUP BY 1
+        ),
+        patrons AS (
+            SELECT date_trunc(%(granularity)s, day)::date AS bucket,
+                   COUNT(DISTINCT patron_id) AS unique_patrons
+            FROM circulation_daily_patrons
+            WHERE day BETWEEN %(start)s AND %(end)s {collection_filter}
+            GROUP BY 1
+        )
+        SELECT
+            b.bucket AS date,
+            COALESCE(t.checkouts, 0) AS checkouts,
+            COALESCE(t.returns, 0) AS returns,
+            COALESCE(t.renewals, 0) AS renewals,
+            COALESCE(t.overdue_transitions, 0) AS overdue_transitions,
+            COALESCE(p.unique_patrons, 0) AS unique_patrons
+        FROM buckets b
+        LEFT JOIN totals t ON t.bucket = b.bucket
+        LEFT JOIN patrons p ON p.bucket = b.bucket
+        ORDER BY b.bucket ASC
+    """
+
+    rows = execute_query(query, {
+        'start': start, 'end': end, 'granularity': granularity, 'collection_id': collection_id,
+    }, fetch_all=True)
+    return [dict(r) for r in (rows or [])]
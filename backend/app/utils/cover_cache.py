@@ -0,0 +1,281 @@
+"""
+Local cover cache.
+
+Book covers mostly point at Google Books, Open Library or ISBNDB. Catalogue
+responses replace those URLs with ``/api/covers/<book_id>/<key>/<size>.webp``
+(``localize_covers``), where ``key`` is a hash of the remote URL. The first
+request for a key redirects to the remote image and queues a background
+fetch (``schedule_prefetch``) that writes normalized WebP thumbnails at
+``COVER_SMALL_WIDTH`` and ``COVER_LARGE_WIDTH`` under ``COVER_CACHE_ROOT``;
+later requests are a file read, and the URL never changes for a given
+remote cover, so clients cache it for good. Imports prefetch their covers,
+and prefetch_covers.py fills the cache for the existing catalogue.
+
+The directory is capped at ``COVER_CACHE_MAX_BYTES``: a file's mtime is its
+last use, and ``trim`` deletes the least recently used files once the cap
+is passed. A cover that fails to fetch is not retried for
+``COVER_RETRY_SECONDS``; meanwhile its URL redirects to the remote one.
+Redirects are followed by hand, at most ``MAX_REDIRECTS``, and every hop
+must be a cacheable URL, so an allowed host can't point the fetch
+elsewhere.
+
+Covers already in the media store (``/api/media``) are mapped to its
+variants instead.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from urllib.parse import urljoin, urlsplit
+
+from app.config import Config
+from app.utils import metrics
+from app.utils.background import BackgroundTasks
+from app.utils.http_client import get_client
+from app.utils.json_provider import Rows
+from app.utils.media import media_url, pil_image, public_url
+
+logger = logging.getLogger(__name__)
+
+SIZES = {'small': Config.COVER_SMALL_WIDTH, 'large': Config.COVER_LARGE_WIDTH}
+MAX_SOURCE_BYTES = 5 * 1024 * 1024
+MAX_REDIRECTS = 3
+WEBP_QUALITY = 80
+# Refresh a file's mtime (its LRU position) at most this often
+TOUCH_INTERVAL = 3600
+# Trim down to this share of the cap, so a full cache isn't trimmed on every write
+TRIM_TO = 0.9
+
+# COVER_ALLOWED_HOSTS: exact hosts, and ".example.org" for the domain and its subdomains
+_ALLOWED_HOSTS = {h.lstrip('.') for h in Config.COVER_ALLOWED_HOSTS}
+_ALLOWED_SUFFIXES = tuple(h for h in Config.COVER_ALLOWED_HOSTS if h.startswith('.'))
+
+# key -> monotonic time before which a failed cover isn't fetched again
+_failed_until = {}
+
+# Striped locks: one fetch per cover at a time, without a lock per key
+_fetch_locks = [threading.Lock() for _ in range(64)]
+
+_size_lock = threading.Lock()
+_cache_bytes = None       # at the last trim
+_written_since_trim = 0
+
+
+def cover_key(source_url):
+    return hashlib.blake2b(source_url.encode(), digest_size=10).hexdigest()
+
+
+def cover_path(key, size):
+    return os.path.join(Config.COVER_CACHE_ROOT, key[:2], f"{key}.{size}.webp")
+
+
+def is_cacheable(source_url):
+    """Whether a cover URL is fetched through the cache (https/http from an allowed host)"""
+    parts = urlsplit(source_url or '')
+    host = parts.hostname or ''
+    return parts.scheme in ('http', 'https') and (host in _ALLOWED_HOSTS or host.endswith(_ALLOWED_SUFFIXES))
+
+
+def cover_urls(book_id, source_url):
+    """{size: local URL} for a book's cover, or None to leave the URL as it is"""
+    if not source_url:
+        return None
+    if source_url.startswith('/api/media/'):
+        # Uploaded cover: the smallest media variant at least as wide
+        sha256 = source_url.split('/')[3]
+        widths = sorted(Config.MEDIA_VARIANT_WIDTHS)
+        return {size: public_url(media_url(sha256, next((w for w in widths if w >= width), widths[-1]), 'webp'))
+                for size, width in SIZES.items()}
+    if not is_cacheable(source_url):
+        return None
+    key = cover_key(source_url)
+    return {size: public_url(f"/api/covers/{book_id}/{key}/{size}.webp") for size in SIZES}
+
+
+def localize_covers(books):
+    """Point catalogue rows' cover_image_url (large) and thumbnail_url (small) at the cache"""
+    if isinstance(books, Rows):
+        return _localize_rows(books)
+    for book in books or []:
+        urls = cover_urls(book.get('book_id'), book.get('cover_image_url'))
+        if urls:
+            book['cover_image_url'] = urls['large']
+            book['thumbnail_url'] = urls['small']
+    return books
+
+
+def _localize_rows(books):
+    columns = list(books.columns)
+    book_id, cover = columns.index('book_id'), columns.index('cover_image_url')
+    if 'thumbnail_url' not in columns:
+        columns.append('thumbnail_url')
+        rows = [row + (None,) for row in books.rows]
+    else:
+        rows = [tuple(row) for row in books.rows]
+    thumbnail = columns.index('thumbnail_url')
+
+    for n, row in enumerate(rows):
+        urls = cover_urls(row[book_id], row[cover])
+        if urls:
+            row = list(row)
+            row[cover], row[thumbnail] = urls['large'], urls['small']
+            rows[n] = tuple(row)
+    return Rows(columns, rows)
+
+
+# -- storage ------------------------------------------------------------------
+
+def cached_cover(key, size):
+    """Path of a cached thumbnail, or None; marks it as recently used"""
+    path = cover_path(key, size)
+    try:
+        if time.time() - os.stat(path).st_mtime > TOUCH_INTERVAL:
+            os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def _download(source_url):
+    url = source_url
+    with metrics.timer('cover_fetch_seconds'):
+        for _ in range(MAX_REDIRECTS + 1):
+            # One client (pool and circuit breaker) per cover host
+            client = get_client(urlsplit(url).hostname)
+            with client.get(url, operation='cover', stream=True, allow_redirects=False,
+                            timeout=(Config.HTTP_CONNECT_TIMEOUT, Config.COVER_FETCH_TIMEOUT)) as response:
+                if response.is_redirect:
+                    url = urljoin(url, response.headers['Location'])
+                    if not is_cacheable(url):
+                        raise ValueError(f"Cover redirected to a host that is not allowed: {url}")
+                    continue
+                response.raise_for_status()
+                body = io.BytesIO()
+                for chunk in response.iter_content(64 * 1024):
+                    body.write(chunk)
+                    if body.tell() > MAX_SOURCE_BYTES:
+                        raise ValueError(f"Cover larger than {MAX_SOURCE_BYTES} bytes")
+                return body.getvalue()
+    raise ValueError(f"Cover redirected more than {MAX_REDIRECTS} times")
+
+
+def _write_thumbnails(key, data):
+    """Normalize one remote cover into every size; returns bytes written"""
+    from PIL import ImageOps
+
+    Image = pil_image()
+    with Image.open(io.BytesIO(data)) as original:
+        # JPEGs decode at 1/2, 1/4 or 1/8 scale when that still covers the
+        # largest size; scaled on the shorter side in case EXIF rotates it
+        scale = max(SIZES.values()) / min(original.size)
+        if scale < 1:
+            original.draft('RGB', (round(original.width * scale), round(original.height * scale)))
+        image = ImageOps.exif_transpose(original)
+        if image.mode != 'RGB':
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            rgba = image.convert('RGBA')
+            background.paste(rgba, mask=rgba.getchannel('A'))
+            image = background
+
+    os.makedirs(os.path.dirname(cover_path(key, 'small')), exist_ok=True)
+    written = 0
+    # Largest first, each from the previous; never upscaled
+    for size, width in sorted(SIZES.items(), key=lambda item: item[1], reverse=True):
+        if width < image.width:
+            image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        path = cover_path(key, size)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        image.save(tmp, 'WEBP', quality=WEBP_QUALITY, method=4)
+        os.replace(tmp, path)
+        written += os.path.getsize(path)
+    return written
+
+
+def fetch_cover(source_url):
+    """Make sure a remote cover is cached; False if it can't be fetched right now"""
+    key = cover_key(source_url)
+    if all(os.path.exists(cover_path(key, size)) for size in SIZES):
+        return True
+    if _failed_until.get(key, 0) > time.monotonic():
+        return False
+
+    with _fetch_locks[int(key[:2], 16) % len(_fetch_locks)]:
+        # Someone else may have fetched it while we waited
+        if all(os.path.exists(cover_path(key, size)) for size in SIZES):
+            return True
+        try:
+            written = _write_thumbnails(key, _download(source_url))
+        except Exception as e:
+            logger.warning("Cover fetch failed for %s: %s", source_url, e)
+            metrics.inc('cover_cache_fetches_total', result='failed')
+            if len(_failed_until) > 10000:
+                _failed_until.clear()
+            _failed_until[key] = time.monotonic() + Config.COVER_RETRY_SECONDS
+            return False
+
+    metrics.inc('cover_cache_fetches_total', result='stored')
+    _record_write(written)
+    return True
+
+
+# -- size cap -----------------------------------------------------------------
+
+def _record_write(written):
+    global _written_since_trim
+    with _size_lock:
+        _written_since_trim += written
+        due = _cache_bytes is None or _cache_bytes + _written_since_trim > Config.COVER_CACHE_MAX_BYTES
+    if due:
+        trim()
+
+
+def trim(max_bytes=None):
+    """Delete least recently used thumbnails until the cache is under its cap"""
+    global _cache_bytes, _written_since_trim
+    max_bytes = Config.COVER_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    files = []
+    root = Config.COVER_CACHE_ROOT
+    if os.path.isdir(root):
+        for shard in os.scandir(root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.webp'):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    if total > max_bytes:
+        for _, size, path in sorted(files):
+            if total <= max_bytes * TRIM_TO:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        metrics.inc('cover_cache_evictions_total', value=removed)
+
+    with _size_lock:
+        _cache_bytes = total
+        _written_since_trim = 0
+    return {'files': len(files) - removed, 'bytes': total, 'evicted': removed}
+
+
+metrics.register_gauges(lambda: [] if _cache_bytes is None else
+                        [('cover_cache_bytes', {}, _cache_bytes + _written_since_trim)])
+
+
+# -- prefetch -----------------------------------------------------------------
+
+_prefetch_tasks = BackgroundTasks(fetch_cover, Config.COVER_PREFETCH_WORKERS, 'cover-prefetch')
+
+
+def schedule_prefetch(source_url):
+    """Fetch a remote cover into the cache in the background; never raises"""
+    if is_cacheable(source_url):
+        _prefetch_tasks.submit(source_url)
@@ -1,52 +1,226 @@
+import importlib.util
+import os
+import threading
+import time
+import uuid
 import psycopg2
-from psycopg2.extras import RealDictCursor
+import psycopg2.errors
+import psycopg2.extensions
+from psycopg2.pool import PoolError, ThreadedConnectionPool
 from contextlib import contextmanager
 from app.config import Config
+from app.utils.sql_profiling import ProfilingCursor, ProfilingDictCursor, record_acquire
+from app.utils.json_provider import Rows
+from app.utils import metrics, query_budget, replicas
 
-# Try to import pgvector, but make it optional
-try:
-    from pgvector.psycopg2 import register_vector
-    PGVECTOR_AVAILABLE = True
-except ImportError:
-    PGVECTOR_AVAILABLE = False
+# pgvector is optional. It pulls in NumPy, so it is only imported when the
+# first connection is opened (or preloaded in the master, see app.preload)
+PGVECTOR_AVAILABLE = importlib.util.find_spec('pgvector') is not None
 
-@contextmanager
-def get_db_connection():
-    """Context manager for database connections"""
-    conn = psycopg2.connect(Config.DATABASE_URL)
+class PoolExhaustedError(PoolError):
+    """No pooled connection became free within DB_POOL_TIMEOUT"""
 
-    # Only register vector if pgvector is available and extension is installed
-    if PGVECTOR_AVAILABLE:
-        try:
-            register_vector(conn)
-        except (psycopg2.ProgrammingError, psycopg2.errors.UndefinedObject) as e:
-            # pgvector extension not installed in database - semantic search will be disabled
-            error_msg = str(e).lower()
-            if 'vector' in error_msg or 'does not exist' in error_msg:
-                print("WARNING: pgvector extension not found - semantic search disabled")
-                # Rollback the failed transaction so connection can be used
-                conn.rollback()
-            else:
-                raise
-        except Exception as e:
-            # Any other error during vector registration
-            print(f"WARNING: Failed to register pgvector: {e}")
+class _PooledConnection(psycopg2.extensions.connection):
+    """Connection that remembers whether pgvector types were registered on it"""
+    vector_registered = False
+
+_pools = {}  # dsn -> (ThreadedConnectionPool, BoundedSemaphore)
+_pools_pid = None
+_pool_lock = threading.Lock()
+
+def _register_vector(conn):
+    """Register pgvector types once per physical connection"""
+    if not PGVECTOR_AVAILABLE or getattr(conn, 'vector_registered', False):
+        return
+
+    try:
+        from pgvector.psycopg2 import register_vector
+        register_vector(conn)
+    except (psycopg2.ProgrammingError, psycopg2.errors.UndefinedObject) as e:
+        # pgvector extension not installed in database - semantic search will be disabled
+        error_msg = str(e).lower()
+        if 'vector' in error_msg or 'does not exist' in error_msg:
+            print("WARNING: pgvector extension not found - semantic search disabled")
+            # Rollback the failed transaction so connection can be used
             conn.rollback()
+        else:
+            raise
+    except Exception as e:
+        # Any other error during vector registration
+        print(f"WARNING: Failed to register pgvector: {e}")
+        conn.rollback()
 
+    if isinstance(conn, _PooledConnection):
+        # Don't retry on every checkout when the extension is missing
+        conn.vector_registered = True
+
+def _get_pool(dsn):
+    """Process-wide pool for ``dsn`` and its slots, created lazily (and again after a fork)"""
+    global _pools, _pools_pid
+    if Config.DB_POOL_MAX <= 0:
+        return None, None
+
+    if _pools_pid != os.getpid():
+        with _pool_lock:
+            if _pools_pid != os.getpid():
+                # Pools inherited from the parent share its sockets; drop them without closing
+                _pools = {}
+                _pools_pid = os.getpid()
+
+    entry = _pools.get(dsn)
+    if entry is None:
+        with _pool_lock:
+            entry = _pools.get(dsn)
+            if entry is None:
+                pool = ThreadedConnectionPool(
+                    Config.DB_POOL_MIN, Config.DB_POOL_MAX, dsn,
+                    connection_factory=_PooledConnection,
+                )
+                entry = _pools[dsn] = (pool, threading.BoundedSemaphore(Config.DB_POOL_MAX))
+    return entry
+
+def _pool_name(dsn):
+    for replica in replicas.replicas:
+        if replica.url == dsn:
+            return replica.name
+    return 'primary'
+
+def pool_stats(dsn=None):
+    """Connections of this process's pool for ``dsn`` (default: the primary) by state"""
+    pool = _pools.get(dsn or Config.DATABASE_URL, (None,))[0] if _pools_pid == os.getpid() else None
+    if pool is None:
+        return {'in_use': 0, 'idle': 0, 'max': Config.DB_POOL_MAX}
+    return {'in_use': len(pool._used), 'idle': len(pool._pool), 'max': Config.DB_POOL_MAX}
+
+metrics.register_gauges(lambda: [('db_pool_connections', {'pool': _pool_name(dsn), 'state': state}, value)
+                                 for dsn in [Config.DATABASE_URL] + [r.url for r in replicas.replicas]
+                                 for state, value in pool_stats(dsn).items()])
+
+def close_pool():
+    """Close every pooled connection (e.g. on worker shutdown)"""
+    global _pools
+    with _pool_lock:
+        if _pools_pid == os.getpid():
+            for pool, _ in _pools.values():
+                pool.closeall()
+        _pools = {}
+
+def _acquire(dsn):
+    """(connection, pool, slots); pool and slots are None without pooling"""
+    pool, slots = _get_pool(dsn)
+    if pool is None:
+        return psycopg2.connect(dsn), None, None
+    # ThreadedConnectionPool raises when exhausted; wait for a free slot instead,
+    # but not forever: a thread that already holds a connection and asks for
+    # another can otherwise deadlock a busy pool
+    if not slots.acquire(timeout=Config.DB_POOL_TIMEOUT):
+        metrics.inc('db_pool_exhausted_total')
+        raise PoolExhaustedError(
+            f"No database connection free after {Config.DB_POOL_TIMEOUT:g}s "
+            f"(all {Config.DB_POOL_MAX} in use in this process)"
+        )
     try:
+        return pool.getconn(), pool, slots
+    except Exception:
+        slots.release()
+        raise
+
+def get_db_connection():
+    """
+    Context manager for database connections. Inside a replicas.read_only()
+    block the connection comes from a replica when one is usable
+    """
+    return _connection(replicas.choose_replica())
+
+def _replica_failed(replica_url, error):
+    """Whether ``error`` means the replica itself failed (went away, dropped the connection), not the query"""
+    return replica_url is not None and isinstance(error, psycopg2.OperationalError) \
+        and not isinstance(error, psycopg2.errors.QueryCanceled)
+
+def _drop_replica(replica_url):
+    """Take a failed replica out of rotation and close its idle connections, most likely dead too"""
+    replicas.mark_unusable(replica_url)
+    pool = _pools.get(replica_url, (None,))[0] if _pools_pid == os.getpid() else None
+    if pool is not None:
+        with pool._lock:
+            while pool._pool:
+                pool._pool.pop().close()
+
+def _read(work):
+    """
+    ``work(conn)`` on the connection get_db_connection() would give. If that is
+    a replica and it fails mid-query, the work runs again on the primary -
+    nothing can have been written on a replica, so single-query helpers can
+    always be retried
+    """
+    replica_url = replicas.choose_replica()
+    try:
+        with _connection(replica_url) as conn:
+            return work(conn)
+    except psycopg2.OperationalError as e:
+        if not _replica_failed(replica_url, e):
+            raise
+        _drop_replica(replica_url)
+        metrics.inc('db_read_routing_total', target='primary', reason='replica_failed')
+    with _connection() as conn:
+        return work(conn)
+
+@contextmanager
+def _connection(replica_url=None):
+    started = time.perf_counter()
+    try:
+        conn, pool, slots = _acquire(replica_url or Config.DATABASE_URL)
+    except psycopg2.OperationalError as e:
+        if not _replica_failed(replica_url, e):
+            raise
+        _drop_replica(replica_url)
+        metrics.inc('db_read_routing_total', target='primary', reason='replica_failed')
+        replica_url = None
+        conn, pool, slots = _acquire(Config.DATABASE_URL)
+
+    timeout_ms = None
+    try:
+        # Inside the try: the connection goes back to the pool whatever fails
+        _register_vector(conn)
+        acquire_time = time.perf_counter() - started
+        record_acquire(acquire_time)
+        metrics.observe('db_pool_acquire_seconds', acquire_time)
+        # Plain conn.cursor() calls get profiled tuple cursors too
+        conn.cursor_factory = ProfilingCursor
+
+        # Inside a @query_budget view: cap this transaction at the time left
+        timeout_ms = query_budget.statement_timeout_ms()
+        if timeout_ms is not None:
+            with conn.cursor(cursor_factory=psycopg2.extensions.cursor) as cursor:
+                cursor.execute("SET LOCAL statement_timeout = %s", (timeout_ms,))
         yield conn
         conn.commit()
     except Exception as e:
-        conn.rollback()
+        if not conn.closed:
+            conn.rollback()
+        if conn.closed and _replica_failed(replica_url, e):
+            # Covers get_db_cursor() blocks too, which can't be retried here
+            _drop_replica(replica_url)
+        if timeout_ms is not None and isinstance(e, psycopg2.errors.QueryCanceled):
+            raise query_budget.QueryBudgetExceeded(f"Statement cancelled after {timeout_ms} ms") from e
         raise e
     finally:
-        conn.close()
+        if pool is None:
+            conn.close()
+        else:
+            # Discard connections that broke or were left mid-transaction
+            broken = bool(conn.closed) or \
+                conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+            try:
+                pool.putconn(conn, close=broken)
+            finally:
+                slots.release()
 
 @contextmanager
 def get_db_cursor(commit=True):
     """Context manager for database cursor with automatic commit/rollback"""
     with get_db_connection() as conn:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor = conn.cursor(cursor_factory=ProfilingDictCursor)
         try:
             yield cursor
             if commit:
@@ -59,18 +233,58 @@ def get_db_cursor(commit=True):
 
 def execute_query(query, params=None, fetch_one=False, fetch_all=False):
     """Execute a query and return results"""
-    with get_db_cursor() as cursor:
-        cursor.execute(query, params or ())
-        
-        if fetch_one:
-            return cursor.fetchone()
-        elif fetch_all:
-            return cursor.fetchall()
-        else:
-            return cursor.rowcount
+    def run(conn):
+        with conn.cursor(cursor_factory=ProfilingDictCursor) as cursor:
+            cursor.execute(query, params or ())
+
+            if fetch_one:
+                return cursor.fetchone()
+            elif fetch_all:
+                return cursor.fetchall()
+            else:
+                return cursor.rowcount
+
+    return _read(run)
+
+def query_rows(query, params=None):
+    """
+    Fetch all rows as tuples plus column names (``Rows``), for large lists
+    that are only returned as JSON - cheaper than building a dict per row
+    """
+    def run(conn):
+        with conn.cursor() as cursor:
+            cursor.execute(query, params or ())
+            return Rows.from_cursor(cursor)
+
+    return _read(run)
 
 def execute_many(query, params_list):
     """Execute multiple queries with different parameters"""
     with get_db_cursor() as cursor:
         cursor.executemany(query, params_list)
         return cursor.rowcount
+
+def stream_query(query, params=None, chunk_size=2000):
+    """
+    Yield rows from a server-side (named) cursor, fetching ``chunk_size`` at
+    a time, so memory stays flat however many rows the query returns.
+    Holds one pooled connection until the generator is exhausted or closed.
+    """
+    # Routed now: the rows are usually consumed after the view (and any
+    # read_only() block around it) has returned
+    return _stream(query, params, chunk_size, replicas.choose_replica())
+
+def _stream(query, params, chunk_size, replica_url):
+    with _connection(replica_url) as conn:
+        cursor = conn.cursor(name=f"stream_{uuid.uuid4().hex}", cursor_factory=ProfilingDictCursor)
+        cursor.itersize = chunk_size
+        try:
+            cursor.execute(query, params or ())
+            for row in cursor:
+                yield row
+        finally:
+            cursor.close()
+            # Read-only; also leaves the connection idle (and reusable) when
+            # the consumer stops early, e.g. a client aborting a download
+            if not conn.closed:
+                conn.rollback()
@@ -1,6 +1,7 @@
 import requests
 import json
 from app.config import Config
+from app.utils.http_client import get_client
 
 def fetch_book_by_isbn(isbn):
     """
@@ -14,7 +15,7 @@ def fetch_book_by_isbn(isbn):
         # Google Books API endpoint
         url = f"https://www.googleapis.com/books/v1/volumes?q=isbn:{clean_isbn}"
 
-        response = requests.get(url, timeout=10)
+        response = get_client('googlebooks').get(url, operation='isbn')
         response.raise_for_status()
 
         data = response.json()
@@ -74,7 +75,7 @@ def search_books_google(query, limit=10):
     """
     try:
         url = f"https://www.googleapis.com/books/v1/volumes?q={query}&maxResults={limit}"
-        response = requests.get(url, timeout=10)
+        response = get_client('googlebooks').get(url, operation='search')
         response.raise_for_status()
 
         data = response.json()
@@ -0,0 +1,227 @@
+"""
+Holds (reservations) queue.
+
+Each title has a FIFO queue of ``pending`` reservations ordered by
+``reservation_id``. When a copy comes back, ``allocate_items`` hands it to
+the head of the queue inside the return transaction: one statement per
+item that probes ``idx_reservations_queue`` for the first eligible hold,
+claims it with ``FOR UPDATE SKIP LOCKED`` (so concurrent returns of two
+copies take two different holds), marks it ``ready``, puts the item
+``on_hold`` and queues a notification. The cost does not depend on the
+queue length.
+
+Ready holds that are not picked up within ``HOLD_PICKUP_DAYS`` are expired
+by ``sweep_expired_holds`` and their item moves on to the next hold.
+"""
+from app.config import Config
+from app.utils.database import execute_query, get_db_cursor
+
+_ALLOCATE_SQL = """
+    WITH next_hold AS (
+        SELECT r.reservation_id
+        FROM reservations r
+        JOIN patrons p ON r.patron_id = p.patron_id
+        JOIN users u ON p.user_id = u.user_id
+        WHERE r.book_id = (SELECT book_id FROM items WHERE item_id = %(item_id)s)
+          AND r.status = 'pending'
+          AND (r.expiry_date IS NULL OR r.expiry_date >= CURRENT_DATE)
+          AND u.status = 'active'
+        ORDER BY r.reservation_id
+        LIMIT 1
+        FOR UPDATE OF r SKIP LOCKED
+    ),
+    held AS (
+        UPDATE reservations r
+        SET status = 'ready',
+            item_id = %(item_id)s,
+            ready_at = CURRENT_TIMESTAMP,
+            pickup_expires_at = CURRENT_TIMESTAMP + make_interval(days => %(pickup_days)s),
+            updated_at = CURRENT_TIMESTAMP
+        FROM next_hold
+        WHERE r.reservation_id = next_hold.reservation_id
+        RETURNING r.reservation_id, r.patron_id, r.book_id, r.pickup_expires_at
+    ),
+    shelved AS (
+        UPDATE items
+        SET circulation_status = CASE WHEN EXISTS (SELECT 1 FROM held) THEN 'on_hold' ELSE 'available' END
+        WHERE item_id = %(item_id)s
+          AND circulation_status IN ('available', 'on_hold')
+        RETURNING item_id
+    ),
+    notified AS (
+        INSERT INTO notifications (user_id, notification_type, title, message)
+        SELECT p.user_id, 'hold_ready',
+               'Ready for pickup: ' || LEFT(b.title, 200),
+               'Your hold on "' || b.title || '" is ready at the library. Please collect it by '
+                   || TO_CHAR(h.pickup_expires_at, 'DD Mon YYYY') || '.'
+        FROM held h
+        JOIN patrons p ON h.patron_id = p.patron_id
+        JOIN books b ON h.book_id = b.book_id
+        RETURNING 1
+    )
+    SELECT h.reservation_id, h.patron_id,
+           (SELECT COUNT(*) FROM shelved) AS shelved,
+           (SELECT COUNT(*) FROM notified) AS notified
+    FROM held h
+"""
+
+
+def allocate_items(cursor, item_ids):
+    """
+    Offer each newly available item to the next hold on its title, inside
+    the caller's transaction. Returns ``{item_id: (reservation_id, patron_id)}``
+    for the items that went to a hold; the rest stay available.
+    """
+    allocated = {}
+    for item_id in item_ids:
+        cursor.execute(_ALLOCATE_SQL, {'item_id': item_id, 'pickup_days': Config.HOLD_PICKUP_DAYS})
+        row = cursor.fetchone()
+        if row:
+            allocated[item_id] = (row['reservation_id'], row['patron_id'])
+    return allocated
+
+
+def place_hold(cursor, patron_id, book_id):
+    """
+    Queue a hold for ``patron_id`` on ``book_id``.
+    Returns ``(reservation, error)``; ``error`` is ``(message, status code)``.
+    """
+    # Read the items themselves; mv_book_availability can lag behind returns
+    cursor.execute("""
+        SELECT b.is_active,
+               EXISTS (SELECT 1 FROM items i
+                       WHERE i.book_id = b.book_id AND i.circulation_status = 'available') as on_shelf
+        FROM books b
+        WHERE b.book_id = %s
+    """, (book_id,))
+    book = cursor.fetchone()
+    if not book or not book['is_active']:
+        return None, ("Book not found", 404)
+    if book['on_shelf']:
+        return None, ("A copy is available on the shelf - no hold needed", 400)
+
+    cursor.execute("""
+        INSERT INTO reservations (patron_id, book_id, status)
+        VALUES (%s, %s, 'pending')
+        ON CONFLICT (patron_id, book_id) WHERE status IN ('pending', 'ready') DO NOTHING
+        RETURNING reservation_id, patron_id, book_id, status, reservation_date
+    """, (patron_id, book_id))
+    reservation = cursor.fetchone()
+    if not reservation:
+        return None, ("You already have a hold on this book", 400)
+
+    reservation = dict(reservation)
+    reservation['queue_position'] = queue_position(cursor, reservation['reservation_id'])
+    return reservation, None
+
+
+def queue_position(cursor, reservation_id):
+    """1-based position of a pending hold in its title's queue (None otherwise)."""
+    cursor.execute("""
+        SELECT COUNT(*) as position
+        FROM reservations q
+        JOIN reservations r ON r.reservation_id = %s
+        WHERE q.book_id = r.book_id AND q.status = 'pending' AND r.status = 'pending'
+          AND q.reservation_id <= r.reservation_id
+    """, (reservation_id,))
+    position = cursor.fetchone()['position']
+    return position or None
+
+
+def get_holds(patron_id=None, book_id=None, statuses=('pending', 'ready'), limit=200):
+    """Holds with title, barcode and (for pending holds) queue position"""
+    filters, params = ["r.status = ANY(%s)"], [list(statuses)]
+    if patron_id:
+        filters.append("r.patron_id = %s")
+        params.append(patron_id)
+    if book_id:
+        filters.append("r.book_id = %s")
+        params.append(book_id)
+    params.append(limit)
+
+    query = f"""
+        SELECT r.reservation_id, r.patron_id, r.book_id, r.status,
+               r.reservation_date, r.expiry_date, r.ready_at, r.pickup_expires_at,
+               b.title, b.cover_image_url,
+               i.barcode,
+               p.first_name || ' ' || p.last_name as patron_name,
+               CASE WHEN r.status = 'pending' THEN (
+                   SELECT COUNT(*) FROM reservations q
+                   WHERE q.book_id = r.book_id AND q.status = 'pending'
+                     AND q.reservation_id <= r.reservation_id
+               ) END as queue_position
+        FROM reservations r
+        JOIN books b ON r.book_id = b.book_id
+        JOIN patrons p ON r.patron_id = p.patron_id
+        LEFT JOIN items i ON r.item_id = i.item_id
+        WHERE {' AND '.join(filters)}
+        ORDER BY r.reservation_id DESC
+        LIMIT %s
+    """
+    holds = execute_query(query, tuple(params), fetch_all=True)
+    return [dict(h) for h in (holds or [])]
+
+
+def cancel_hold(cursor, reservation_id, patron_id=None):
+    """
+    Cancel an open hold (optionally only if it belongs to ``patron_id``).
+    A ready hold releases its item to the next patron in the queue.
+    Returns the cancelled row or None.
+    """
+    patron_filter = "AND patron_id = %(patron_id)s" if patron_id else ""
+    cursor.execute(f"""
+        UPDATE reservations
+        SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP
+        WHERE reservation_id = %(reservation_id)s
+          AND status IN ('pending', 'ready') {patron_filter}
+        RETURNING reservation_id, patron_id, book_id, item_id,
+                  (pickup_expires_at IS NOT NULL) as was_ready
+    """, {'reservation_id': reservation_id, 'patron_id': patron_id})
+    cancelled = cursor.fetchone()
+
+    if cancelled and cancelled['was_ready'] and cancelled['item_id']:
+        allocate_items(cursor, [cancelled['item_id']])
+    return cancelled
+
+
+def sweep_expired_holds():
+    """
+    Expire ready holds past their pickup window (passing the item on) and
+    pending holds past their expiry date. One short transaction per batch.
+    """
+    totals = {'pickup_expired': 0, 'reallocated': 0, 'pending_expired': 0}
+    batch_size = Config.SWEEP_BATCH_SIZE
+
+    while True:
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                WITH due AS (
+                    SELECT reservation_id
+                    FROM reservations
+                    WHERE status = 'ready' AND pickup_expires_at < CURRENT_TIMESTAMP
+                    ORDER BY pickup_expires_at
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                UPDATE reservations r
+                SET status = 'expired', updated_at = CURRENT_TIMESTAMP
+                FROM due
+                WHERE r.reservation_id = due.reservation_id
+                RETURNING r.item_id
+            """, (batch_size,))
+            expired = cursor.fetchall()
+            totals['pickup_expired'] += len(expired)
+            item_ids = [row['item_id'] for row in expired if row['item_id']]
+            totals['reallocated'] += len(allocate_items(cursor, item_ids))
+        if len(expired) < batch_size:
+            break
+
+    with get_db_cursor() as cursor:
+        cursor.execute("""
+            UPDATE reservations
+            SET status = 'expired', updated_at = CURRENT_TIMESTAMP
+            WHERE status = 'pending' AND expiry_date < CURRENT_DATE
+        """)
+        totals['pending_expired'] = cursor.rowcount
+
+    return totals
@@ -0,0 +1,209 @@
+"""
+Conditional GET and response compression.
+
+Every 200 response to a GET gets a weak ETag (a hash of its body) and
+``Cache-Control: private, no-cache``, so clients revalidate with
+``If-None-Match`` and get a bodiless 304 when nothing changed. That saves
+bandwidth but not work: the view still runs.
+
+Views wrapped in ``@versioned(scope, ...)`` skip the work too. Their ETag
+is derived up front from the ``content_versions`` counters (migration
+016, bumped by triggers whenever a scope's tables change) plus the URL,
+so a matching ``If-None-Match`` is answered before the view queries or
+serializes anything. Responses marked ``no-store`` (partial answers)
+get no ETag at all.
+
+Bodies of compressible types over ``COMPRESS_MIN_BYTES`` are sent with
+brotli (when installed) or gzip. Compressed GET bodies are kept in a
+small LRU keyed by ETag, so hot payloads are compressed once per process.
+"""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+import psycopg2
+from flask import current_app, g, request
+
+from app.config import Config
+from app.utils import metrics
+from app.utils.cache import TTLCache
+from app.utils.database import execute_query
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/javascript', 'application/xml',
+                      'image/svg+xml', 'text/')
+
+_versions_cache = TTLCache(ttl=Config.CONTENT_VERSION_TTL, name='content_versions')
+
+
+# -- content versions ---------------------------------------------------------
+
+def bump_content_version(cursor, scope):
+    """Mark ``scope`` changed, for writes the 016 triggers don't see"""
+    cursor.execute("""
+        INSERT INTO content_versions (scope, version, updated_at)
+        VALUES (%s, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT (scope) DO UPDATE
+            SET version = content_versions.version + 1,
+                updated_at = CURRENT_TIMESTAMP
+    """, (scope,))
+
+
+def _load_versions():
+    try:
+        rows = execute_query("SELECT scope, version FROM content_versions", fetch_all=True) or []
+    except psycopg2.Error:
+        return None  # migration 016 not applied: fall back to body hashes
+    return {row['scope']: row['version'] for row in rows}
+
+
+def content_versions():
+    """{scope: version}; reused for CONTENT_VERSION_TTL seconds (0: read every time)"""
+    if Config.CONTENT_VERSION_TTL <= 0:
+        return _load_versions()
+    return _versions_cache.get_or_compute('all', _load_versions)
+
+
+def _version_etag(scopes):
+    versions = content_versions()
+    if versions is None:
+        return None
+    g.content_versions = versions  # for the view, so it keys on the same snapshot
+    # The release is part of the key so a deploy that changes a response's
+    # shape doesn't keep serving 304s for the old one
+    key = '|'.join([Config.RELEASE_VERSION, request.full_path]
+                   + [f"{scope}={versions.get(scope, 0)}" for scope in scopes])
+    return 'v-' + hashlib.blake2b(key.encode(), digest_size=12).hexdigest()
+
+
+def _not_modified(etag):
+    response = current_app.response_class(status=304)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def versioned(*scopes):
+    """ETag from the scopes' content versions; 304 before the view runs"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = _version_etag(scopes)
+            if etag is None:
+                return view(*args, **kwargs)
+            if request.if_none_match.contains_weak(etag):
+                return _not_modified(etag)
+
+            response = current_app.make_response(view(*args, **kwargs))
+            # A degraded answer (no-store, e.g. over its query budget) must
+            # not be validated - or compressed and cached - as the full one
+            if response.status_code == 200 and not response.cache_control.no_store:
+                response.set_etag(etag, weak=True)
+            return response
+        return wrapper
+    return decorator
+
+
+# -- compression --------------------------------------------------------------
+
+class _CompressedCache:
+    """LRU of compressed bodies by (ETag, encoding), bounded by total bytes"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes // 4:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+
+_compressed = _CompressedCache(Config.COMPRESS_CACHE_BYTES)
+
+
+def _encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compress_body(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=Config.BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=Config.GZIP_LEVEL)
+
+
+def _compress(response):
+    if response.direct_passthrough or response.is_streamed or response.status_code in (204, 304) \
+            or 'Content-Encoding' in response.headers \
+            or not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = _encoding()
+    if encoding is None or (response.content_length or 0) < Config.COMPRESS_MIN_BYTES:
+        return response
+
+    etag, weak = response.get_etag()
+    key = (etag, encoding) if etag and request.method in ('GET', 'HEAD') else None
+    body = _compressed.get(key) if key else None
+    if key:
+        metrics.inc('cache_requests_total', cache='compressed_responses',
+                    result='hit' if body is not None else 'miss')
+    if body is None:
+        body = _compress_body(response.get_data(), encoding)
+        if key:
+            _compressed.put(key, body)
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+# -- wiring -------------------------------------------------------------------
+
+def init_http_cache(app):
+    """ETags, 304s and compression for every response (see module docstring)"""
+    if not Config.HTTP_CACHE_ENABLED:
+        return
+
+    @app.after_request
+    def finish_response(response):
+        if request.method not in ('GET', 'HEAD'):
+            if response.status_code < 400:
+                _versions_cache.invalidate()  # this process sees its own writes at once
+            return _compress(response)
+
+        if response.status_code == 200 and not response.direct_passthrough \
+                and not response.is_streamed and not response.cache_control.no_store:
+            if 'ETag' not in response.headers:
+                digest = hashlib.blake2b(response.get_data(), digest_size=12).hexdigest()
+                response.set_etag(digest, weak=True)
+            response.headers.setdefault('Cache-Control', 'private, no-cache')
+            response.make_conditional(request)
+        return _compress(response)
@@ -0,0 +1,215 @@
+"""
+Outbound HTTP client for external providers.
+
+One ``HttpClient`` per provider (``get_client('openlibrary')``), each with
+its own pooled ``requests.Session``, so imports reuse connections instead
+of opening one per ISBN. A request is retried on connection errors
+(connect timeouts included) and 500/502/503/504 - up to
+``HTTP_MAX_RETRIES`` times, with full-jitter exponential backoff - when
+the method is idempotent (or the caller says it is safe with
+``retry=True``). A read timeout is not retried: the provider has the
+request and is slow, and each retry would add a full ``HTTP_READ_TIMEOUT``.
+
+Each provider has a circuit breaker: after ``CIRCUIT_FAILURE_THRESHOLD``
+consecutive failures it opens and requests fail at once with
+``CircuitOpenError`` for ``CIRCUIT_RESET_SECONDS``, then a single trial
+request decides whether it closes again. ``CircuitOpenError`` is a
+``requests.ConnectionError``, so the metadata clients' existing error
+handling treats an open circuit like an unreachable provider and the
+import falls through to the next one without waiting on a timeout.
+
+Latency goes to ``external_request_seconds`` and outcomes to
+``external_requests_total`` per provider and operation.
+"""
+import random
+import threading
+import time
+from typing import Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.config import Config
+from app.utils import metrics
+
+RETRY_STATUSES = frozenset({500, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+
+# Provider-specific settings; anything else gets the defaults
+PROVIDER_OPTIONS = {
+    # ISBNDB allows one request per second
+    'isbndb': {'min_interval': 1.0},
+}
+
+_clients: Dict[str, 'HttpClient'] = {}
+_clients_lock = threading.Lock()
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """The provider's circuit is open: it has been failing, so it isn't called"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half open (one trial) -> closed"""
+
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at < self.reset_seconds:
+            return 'open'
+        return 'half_open'
+
+    def allow(self):
+        """Whether a request may go out now"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def release(self):
+        """End a request that says nothing about the provider's health"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class HttpClient:
+    """Pooled session, retries and circuit breaker for one provider"""
+
+    def __init__(self, provider, min_interval=0.0):
+        self.provider = provider
+        self.min_interval = min_interval
+        self.breaker = CircuitBreaker(Config.CIRCUIT_FAILURE_THRESHOLD, Config.CIRCUIT_RESET_SECONDS)
+        self.session = requests.Session()
+        # Retries are done here, not by urllib3, so each one is counted and backed off
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=Config.HTTP_POOL_SIZE, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._last_request = 0.0
+        self._interval_lock = threading.Lock()
+
+    def _wait_turn(self):
+        if not self.min_interval:
+            return
+        with self._interval_lock:
+            delay = self._last_request + self.min_interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._last_request = time.monotonic()
+
+    @staticmethod
+    def _backoff(attempt):
+        # Full jitter: anywhere up to the exponential step, so retries spread out
+        return random.uniform(0, min(Config.HTTP_BACKOFF_MAX, Config.HTTP_BACKOFF_BASE * 2 ** attempt))
+
+    def request(self, method, url, operation='request', retry=None, **kwargs):
+        """
+        Send a request; returns the response (any status, as requests does).
+        Raises requests exceptions as requests does, or CircuitOpenError
+        """
+        method = method.upper()
+        retries = Config.HTTP_MAX_RETRIES if (method in IDEMPOTENT_METHODS if retry is None else retry) else 0
+        kwargs.setdefault('timeout', (Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_READ_TIMEOUT))
+        labels = {'provider': self.provider, 'operation': operation}
+
+        trial = self.breaker.state == 'half_open'
+        if not self.breaker.allow():
+            metrics.inc('external_requests_total', outcome='short_circuit', **labels)
+            raise CircuitOpenError(f"{self.provider} is unavailable (circuit open)")
+        if trial:
+            retries = 0  # one attempt decides whether the provider is back
+
+        settled = False  # whether the breaker has heard how this request went
+        try:
+            for attempt in range(retries + 1):
+                if attempt:
+                    metrics.inc('external_requests_total', outcome='retry', **labels)
+                    time.sleep(self._backoff(attempt - 1))
+                self._wait_turn()
+                try:
+                    with metrics.timer('external_request_seconds', **labels):
+                        response = self.session.request(method, url, **kwargs)
+                except requests.ConnectionError:
+                    # Includes ConnectTimeout: nothing reached the provider, so try again
+                    if attempt < retries:
+                        continue
+                    metrics.inc('external_requests_total', outcome='error', **labels)
+                    self.breaker.record_failure()
+                    settled = True
+                    raise
+                except requests.Timeout:
+                    metrics.inc('external_requests_total', outcome='timeout', **labels)
+                    self.breaker.record_failure()
+                    settled = True
+                    raise
+                except requests.RequestException:
+                    # Bad URL and the like: not the provider's fault
+                    metrics.inc('external_requests_total', outcome='error', **labels)
+                    raise
+
+                if response.status_code in RETRY_STATUSES:
+                    if attempt < retries:
+                        response.close()
+                        continue
+                    metrics.inc('external_requests_total', outcome='server_error', **labels)
+                    self.breaker.record_failure()
+                    settled = True
+                    return response
+
+                # 4xx (not found, rate limited, bad key) is still a working provider
+                metrics.inc('external_requests_total', outcome='ok' if response.ok else 'client_error', **labels)
+                self.breaker.record_success()
+                settled = True
+                return response
+        finally:
+            if not settled:
+                # Anything else (a bad URL, an exception from a hook, a worker
+                # timeout) must not leave a half-open trial running for good
+                self.breaker.release()
+
+    def get(self, url, operation='get', **kwargs):
+        return self.request('GET', url, operation=operation, **kwargs)
+
+    def post(self, url, operation='post', **kwargs):
+        return self.request('POST', url, operation=operation, **kwargs)
+
+
+def get_client(provider):
+    """The shared client for a provider (created on first use)"""
+    client = _clients.get(provider)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(provider)
+            if client is None:
+                client = _clients[provider] = HttpClient(provider, **PROVIDER_OPTIONS.get(provider, {}))
+    return client
+
+
+metrics.register_gauges(lambda: [('external_circuit_open', {'provider': name},
+                                  0 if client.breaker.state == 'closed' else 1)
+                                 for name, client in list(_clients.items())])
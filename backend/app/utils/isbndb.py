@@ -1,23 +1,10 @@
 import requests
 import os
-import time
 from app.config import Config
+from app.utils.http_client import get_client
 
-# Rate limit tracking - ISBNDB allows 1 request per second
-_last_request_time = 0
-_rate_limit_delay = 1.0  # seconds
-
-def _respect_rate_limit():
-    """Ensure we don't exceed ISBNDB's rate limit of 1 request per second"""
-    global _last_request_time
-    current_time = time.time()
-    time_since_last_request = current_time - _last_request_time
-
-    if time_since_last_request < _rate_limit_delay:
-        sleep_time = _rate_limit_delay - time_since_last_request
-        time.sleep(sleep_time)
-
-    _last_request_time = time.time()
+# The shared client spaces requests to ISBNDB's limit of 1 per second
+# (PROVIDER_OPTIONS in app/utils/http_client.py)
 
 
 def fetch_book_from_isbndb(isbn):
@@ -41,9 +28,6 @@ def fetch_book_from_isbndb(isbn):
         # Clean ISBN (remove hyphens and spaces)
         clean_isbn = isbn.replace('-', '').replace(' ', '')
 
-        # Respect rate limit
-        _respect_rate_limit()
-
         # ISBNDB API endpoint
         url = f"https://api2.isbndb.com/book/{clean_isbn}"
 
@@ -52,7 +36,7 @@ def fetch_book_from_isbndb(isbn):
             'Content-Type': 'application/json'
         }
 
-        response = requests.get(url, headers=headers, timeout=10)
+        response = get_client('isbndb').get(url, operation='isbn', headers=headers)
 
         # Handle different status codes
         if response.status_code == 404:
@@ -147,9 +131,6 @@ def fetch_books_batch_isbndb(isbns):
         for i in range(0, len(clean_isbns), batch_size):
             batch = clean_isbns[i:i + batch_size]
 
-            # Respect rate limit (1 request per second)
-            _respect_rate_limit()
-
             url = 'https://api2.isbndb.com/books'
 
             headers = {
@@ -164,7 +145,10 @@ def fetch_books_batch_isbndb(isbns):
             print(f"Sending payload: {payload[:200]}...")  # Show first 200 chars
 
             try:
-                response = requests.post(url, headers=headers, data=payload.encode('utf-8'), timeout=30)
+                # A lookup despite the POST, so safe to retry
+                response = get_client('isbndb').post(url, operation='batch', retry=True, headers=headers,
+                                                     data=payload.encode('utf-8'),
+                                                     timeout=(Config.HTTP_CONNECT_TIMEOUT, 30))
 
                 print(f"ISBNDB API Response Status: {response.status_code}")
 
@@ -335,9 +319,6 @@ def search_books_isbndb(query, page=1, page_size=20):
             print("ISBNDB_API_KEY not found in environment variables")
             return []
 
-        # Respect rate limit
-        _respect_rate_limit()
-
         url = f"https://api2.isbndb.com/books/{query}"
 
         headers = {
@@ -350,7 +331,7 @@ def search_books_isbndb(query, page=1, page_size=20):
             'pageSize': min(page_size, 1000)
         }
 
-        response = requests.get(url, headers=headers, params=params, timeout=10)
+        response = get_client('isbndb').get(url, operation='search', headers=headers, params=params)
 
         if response.status_code == 429:
             print("ISBNDB API rate limit exceeded")
@@ -0,0 +1,376 @@
+"""
+Content-addressed media store.
+
+Uploads are streamed to a temp file under ``MEDIA_ROOT`` while their
+SHA-256 is computed, then moved to ``originals/<ab>/<sha256>``; a file
+uploaded twice is stored once. Each original has a ``media_assets`` row
+(migration 018) with its type, size and dimensions.
+
+Images get resized variants - every ``MEDIA_VARIANT_WIDTHS`` width below
+the original's, in each of ``MEDIA_VARIANT_FORMATS`` - written to
+``variants/<ab>/<sha256>/<width>.<format>`` by a small thread pool after
+the upload returns. The ``media_variants`` scheduler job picks up
+anything a restart interrupted. Until an asset's variants exist its
+variant URLs serve the original.
+
+Everything is served from ``/api/media`` (app/routes/media.py) with
+immutable caching and HTTP range support. Website media, book covers and
+patron photos all go through ``ingest``; patron photos are ingested as
+private assets, which ``/api/media`` refuses - they are only served by the
+admin patron routes, with ``Cache-Control: private, no-store``.
+"""
+import functools
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+from flask import send_file
+from psycopg2.extras import Json
+
+from app.config import Config
+from app.utils import metrics
+from app.utils.background import BackgroundTasks
+from app.utils.cache import TTLCache
+from app.utils.database import execute_query, get_db_cursor
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+MAX_ATTEMPTS = 3
+
+# Accepted uploads: Pillow format -> mimetype
+IMAGE_FORMATS = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'GIF': 'image/gif',
+    'WEBP': 'image/webp',
+}
+VARIANT_MIMETYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+# sha256 -> type, size and privacy; only a private asset re-uploaded publicly
+# changes (this process drops its entry; others see it within the TTL)
+_assets = TTLCache(ttl=86400, name='media_assets')
+
+
+class MediaError(ValueError):
+    """The upload can't be stored (empty, too large, not an accepted image)"""
+
+
+# -- storage and Pillow -------------------------------------------------------
+
+def check_media_root():
+    """Raise at startup unless MEDIA_ROOT is set and outside temp directories"""
+    if not Config.MEDIA_ROOT:
+        raise RuntimeError("MEDIA_ROOT is not set: uploads need durable storage "
+                           "(shared by every instance when there are several)")
+    root = os.path.realpath(Config.MEDIA_ROOT)
+    for tmp in {os.path.realpath(tempfile.gettempdir()), '/tmp', '/var/tmp'}:
+        if root == tmp or root.startswith(tmp + os.sep):
+            raise RuntimeError(f"MEDIA_ROOT ({Config.MEDIA_ROOT}) is under {tmp}, "
+                               "which is not kept across restarts; use durable storage")
+
+
+@functools.lru_cache(maxsize=None)
+def pil_image():
+    """``PIL.Image``, imported on first use with the decompression bomb guard set"""
+    from PIL import Image
+
+    Image.MAX_IMAGE_PIXELS = Config.MEDIA_MAX_PIXELS
+    return Image
+
+
+# -- paths and URLs -----------------------------------------------------------
+
+def original_path(sha256):
+    return os.path.join(Config.MEDIA_ROOT, 'originals', sha256[:2], sha256)
+
+
+def variant_path(sha256, width, fmt):
+    return os.path.join(Config.MEDIA_ROOT, 'variants', sha256[:2], sha256, f"{width}.{fmt}")
+
+
+def media_url(sha256, width=None, fmt=None):
+    """Public URL of an original, or of one of its variants"""
+    if width is None:
+        return f"/api/media/{sha256}"
+    return f"/api/media/{sha256}/{width}.{fmt}"
+
+
+def public_url(path):
+    """A stored /api/... path as clients should fetch it (see PUBLIC_BASE_URL)"""
+    return f"{Config.PUBLIC_BASE_URL}{path}" if path and path.startswith('/') else path
+
+
+def srcset(variants, fmt='webp'):
+    """``srcset`` attribute value for one variant format ('' if none yet)"""
+    return ', '.join(f"{public_url(v['url'])} {v['width']}w" for v in variants or [] if v['format'] == fmt)
+
+
+def describe(sha256, width=None, height=None, variants=None):
+    """URL fields for an asset, as returned by the API"""
+    if not sha256:
+        return {'url': None, 'srcset': {}}
+    return {
+        'url': public_url(media_url(sha256)),
+        'srcset': {fmt: srcset(variants, fmt) for fmt in Config.MEDIA_VARIANT_FORMATS},
+        'width': width,
+        'height': height,
+    }
+
+
+# -- ingest -------------------------------------------------------------------
+
+def _image_info(path):
+    """(mimetype, width, height) for an accepted image, else None"""
+    from PIL import UnidentifiedImageError
+
+    Image = pil_image()
+    try:
+        with Image.open(path) as image:
+            if image.format not in IMAGE_FORMATS:
+                return None
+            image.verify()
+            return IMAGE_FORMATS[image.format], image.width, image.height
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError):
+        return None
+
+
+def _write_temp(stream):
+    """Copy ``stream`` to a temp file in MEDIA_ROOT; returns (path, sha256, size)"""
+    tmp_dir = os.path.join(Config.MEDIA_ROOT, 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > Config.MAX_CONTENT_LENGTH:
+                    raise MediaError(f"File is larger than {Config.MAX_CONTENT_LENGTH // (1024 * 1024)} MB")
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    if size == 0:
+        os.unlink(path)
+        raise MediaError("File is empty")
+    return path, digest.hexdigest(), size
+
+
+def ingest(stream, images_only=True, private=False, cursor=None):
+    """
+    Store an uploaded file (any object with ``read``) and register it.
+    Returns the ``media_assets`` row; raises MediaError for a rejected file.
+
+    With ``cursor`` the row is written in the caller's transaction, and the
+    caller calls ``schedule_variants`` once it has committed (the
+    ``media_variants`` job catches any it misses). A file whose transaction
+    rolls back stays on disk unregistered until it is uploaded again
+    """
+    path, sha256, size = _write_temp(stream)
+    try:
+        info = _image_info(path)
+        if info is None and images_only:
+            raise MediaError("Not a supported image (JPEG, PNG, GIF or WebP)")
+        mime_type, width, height = info or ('application/octet-stream', None, None)
+
+        target = original_path(sha256)
+        if os.path.exists(target):
+            metrics.inc('media_uploads_total', result='duplicate')
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(path, target)
+            metrics.inc('media_uploads_total', result='stored')
+    finally:
+        if os.path.exists(path):
+            os.unlink(path)
+
+    # Bytes already uploaded publicly stay public; a private asset uploaded
+    # publicly becomes public
+    query = """
+        INSERT INTO media_assets (sha256, mime_type, file_size, width, height, variant_status, is_private)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (sha256) DO UPDATE SET is_private = media_assets.is_private AND EXCLUDED.is_private
+        RETURNING *
+    """
+    params = (sha256, mime_type, size, width, height, 'pending' if info else 'none', private)
+    if cursor is not None:
+        cursor.execute(query, params)
+        return cursor.fetchone()
+
+    asset = execute_query(query, params, fetch_one=True)
+    _assets.invalidate(sha256)
+    if asset['variant_status'] == 'pending':
+        schedule_variants(sha256)
+    return asset
+
+
+def asset_info(sha256):
+    """{mime_type, width, height, is_private} of a stored original, or None if there is no such asset"""
+    def load():
+        return execute_query("SELECT mime_type, width, height, is_private FROM media_assets WHERE sha256 = %s",
+                             (sha256,), fetch_one=True)
+
+    info = _assets.get_or_compute(sha256, load)
+    if info is None:
+        _assets.invalidate(sha256)
+    return info
+
+
+def should_have_variant(info, width, fmt):
+    """Whether generate_variants writes this width/format for the asset"""
+    return (info['width'] is not None and width < info['width']
+            and width in Config.MEDIA_VARIANT_WIDTHS and fmt in Config.MEDIA_VARIANT_FORMATS)
+
+
+# -- serving ------------------------------------------------------------------
+
+def _send(path, mimetype, max_age=None, private=False):
+    # conditional=True answers Range and If-Modified-Since from the file itself
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=False)
+    if private:
+        response.headers['Cache-Control'] = 'private, no-store'
+    else:
+        response.headers['Cache-Control'] = (f'public, max-age={max_age}' if max_age
+                                             else 'public, max-age=31536000, immutable')
+    return response
+
+
+def send_asset(sha256, info, width=None, fmt=None, private=False):
+    """
+    Response with an asset's original, or its ``width``/``fmt`` variant (the
+    original until that is generated); None if the file is missing
+    """
+    if width is not None:
+        path = variant_path(sha256, width, fmt)
+        if os.path.exists(path):
+            return _send(path, VARIANT_MIMETYPES[fmt], private=private)
+
+    original = original_path(sha256)
+    if not os.path.exists(original):
+        return None
+    if width is None:
+        return _send(original, info['mime_type'], private=private)
+    if not should_have_variant(info, width, fmt):
+        # Not a variant this asset gets (e.g. wider than the original)
+        return _send(original, info['mime_type'], 86400, private)
+    schedule_variants(sha256)
+    # Short-lived: the real variant should exist on the next request
+    return _send(original, info['mime_type'], 60, private)
+
+
+# -- variants -----------------------------------------------------------------
+
+def _save_variant(image, sha256, fmt):
+    from PIL import Image
+
+    if fmt == 'jpeg' and image.mode not in ('RGB', 'L'):
+        # JPEG has no alpha: flatten onto white
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+        image = background
+
+    path = variant_path(sha256, image.width, fmt)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    if fmt == 'webp':
+        image.save(tmp, 'WEBP', quality=Config.MEDIA_WEBP_QUALITY, method=4)
+    else:
+        image.save(tmp, 'JPEG', quality=Config.MEDIA_JPEG_QUALITY, optimize=True, progressive=True)
+    os.replace(tmp, path)
+    return {'width': image.width, 'height': image.height, 'format': fmt,
+            'url': media_url(sha256, image.width, fmt), 'bytes': os.path.getsize(path)}
+
+
+def _variants(image, sha256):
+    """Resize largest first, each width from the previous one rather than the full original"""
+    from PIL import Image, ImageOps
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA', 'L'):
+        has_alpha = image.mode in ('LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    variants = []
+    for width in sorted({w for w in Config.MEDIA_VARIANT_WIDTHS if w < image.width}, reverse=True):
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.LANCZOS)
+        variants += [_save_variant(image, sha256, fmt) for fmt in Config.MEDIA_VARIANT_FORMATS]
+    return sorted(variants, key=lambda v: (v['format'], v['width']))
+
+
+def generate_variants(sha256):
+    """Write the resized variants of one image and record them; returns how many"""
+    Image = pil_image()
+
+    status = execute_query("SELECT variant_status FROM media_assets WHERE sha256 = %s",
+                           (sha256,), fetch_one=True)
+    if status is None or status['variant_status'] in ('none', 'failed'):
+        return 0
+
+    try:
+        with metrics.timer('media_variant_seconds'):
+            with Image.open(original_path(sha256)) as original:
+                variants = _variants(original, sha256)
+    except Exception:
+        with get_db_cursor() as cur:
+            cur.execute("""
+                UPDATE media_assets
+                SET variant_attempts = variant_attempts + 1,
+                    variant_status = CASE WHEN variant_attempts + 1 >= %s THEN 'failed' ELSE 'pending' END,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE sha256 = %s
+            """, (MAX_ATTEMPTS, sha256))
+        raise
+
+    with get_db_cursor() as cur:
+        cur.execute("""
+            UPDATE media_assets
+            SET variants = %s, variant_status = 'ready', updated_at = CURRENT_TIMESTAMP
+            WHERE sha256 = %s
+        """, (Json(variants), sha256))
+        # Copied onto website media so the page cache sees the change
+        cur.execute("""
+            UPDATE website_media
+            SET variants = %s, updated_at = CURRENT_TIMESTAMP
+            WHERE content_hash = %s
+        """, (Json(variants), sha256))
+    metrics.inc('media_variants_total', value=len(variants))
+    return len(variants)
+
+
+# Pillow releases the GIL while resizing and encoding. A failed asset stays
+# 'pending' (until MAX_ATTEMPTS) and the media_variants job retries it
+_variant_tasks = BackgroundTasks(generate_variants, Config.MEDIA_VARIANT_WORKERS, 'media-variants')
+
+
+def schedule_variants(sha256):
+    """Generate an asset's variants in the background; never raises"""
+    _variant_tasks.submit(sha256)
+
+
+def sweep_pending_variants(limit=50):
+    """Scheduler job: generate variants for assets still waiting on them"""
+    rows = execute_query("""
+        SELECT sha256 FROM media_assets
+        WHERE variant_status = 'pending'
+        ORDER BY created_at
+        LIMIT %s
+    """, (limit,), fetch_all=True) or []
+    done = 0
+    for row in rows:
+        if _variant_tasks.is_pending(row['sha256']):
+            continue
+        try:
+            generate_variants(row['sha256'])
+            done += 1
+        except Exception as e:
+            logger.warning("Variant generation failed for %s: %s", row['sha256'], e)
+    return {'assets': done}
@@ -0,0 +1,360 @@
+"""
+Prometheus metrics, aggregated across gunicorn workers.
+
+Each process keeps its counters and histograms in plain dicts; recording
+is a dict update under one uncontended lock, with no I/O. A daemon thread
+writes the process's totals to ``<METRICS_DIR>/<pid>.json`` every
+``METRICS_FLUSH_SECONDS`` (atomically, via rename). ``GET /metrics`` -
+served by whichever worker gets the scrape - flushes its own file, then
+sums every process's file into the text exposition format.
+
+Files of processes that have exited are folded into ``archive.json`` so
+counters keep counting across worker restarts; their gauges are dropped.
+Clear METRICS_DIR when the server starts, before any worker forks.
+
+Metric names and help texts are declared at the bottom of this module.
+"""
+import atexit
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+_definitions = {}      # name -> (kind, help, buckets)
+_gauge_callbacks = []  # callables returning [(name, labels dict, value)]
+
+_lock = threading.Lock()
+_counters = {}         # (name, labels tuple) -> float
+_histograms = {}       # (name, labels tuple) -> [per-bucket counts..., +Inf count, sum]
+
+_flusher_pid = None
+
+
+# -- declaring --------------------------------------------------------------
+
+def counter(name, help_text):
+    _definitions[name] = ('counter', help_text, None)
+
+
+def histogram(name, help_text, buckets=LATENCY_BUCKETS):
+    _definitions[name] = ('histogram', help_text, tuple(buckets))
+
+
+def gauge(name, help_text):
+    _definitions[name] = ('gauge', help_text, None)
+
+
+def register_gauges(callback):
+    """``callback()`` returns [(name, labels, value)] for this process at flush time"""
+    _gauge_callbacks.append(callback)
+
+
+# -- recording --------------------------------------------------------------
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    _ensure_flusher()
+
+
+def observe(name, value, **labels):
+    buckets = _definitions[name][2]
+    index = bisect_left(buckets, value)
+    key = _key(name, labels)
+    with _lock:
+        counts = _histograms.get(key)
+        if counts is None:
+            counts = _histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+        counts[index] += 1
+        counts[-1] += value
+    _ensure_flusher()
+
+
+@contextmanager
+def timer(name, **labels):
+    """Observe the duration of the block, with ``outcome`` set to ok/error"""
+    started = time.perf_counter()
+    outcome = 'ok'
+    try:
+        yield
+    except Exception:
+        outcome = 'error'
+        raise
+    finally:
+        observe(name, time.perf_counter() - started, outcome=outcome, **labels)
+
+
+def timed(name, **labels):
+    """Decorator form of ``timer``"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(name, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# -- sharing between processes ----------------------------------------------
+
+def metrics_dir():
+    return Config.METRICS_DIR or os.path.join(tempfile.gettempdir(), 'nuk-metrics')
+
+
+def _snapshot():
+    with _lock:
+        counters = [[name, list(labels), value] for (name, labels), value in _counters.items()]
+        histograms = [[name, list(labels), list(counts)] for (name, labels), counts in _histograms.items()]
+    gauges = []
+    for callback in _gauge_callbacks:
+        try:
+            gauges.extend([name, sorted((k, str(v)) for k, v in labels.items()), value]
+                          for name, labels, value in callback())
+        except Exception as e:
+            logger.warning("Metrics gauge callback failed: %s", e)
+    return {'counters': counters, 'histograms': histograms, 'gauges': gauges}
+
+
+def _write_json(path, data):
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def flush():
+    """Write this process's totals to its file in METRICS_DIR"""
+    directory = metrics_dir()
+    os.makedirs(directory, exist_ok=True)
+    _write_json(os.path.join(directory, f"{os.getpid()}.json"), _snapshot())
+
+
+def _flush_loop():
+    while True:
+        time.sleep(Config.METRICS_FLUSH_SECONDS)
+        try:
+            flush()
+        except OSError as e:
+            logger.warning("Metrics flush failed: %s", e)
+
+
+def _ensure_flusher():
+    """Start the flush thread once per process"""
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True).start()
+
+
+def _reset_after_fork():
+    """A forked child starts from zero; the parent's totals stay in the parent's file"""
+    global _lock, _flusher_pid
+    _lock = threading.Lock()
+    _counters.clear()
+    _histograms.clear()
+    _flusher_pid = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+@atexit.register
+def _flush_at_exit():
+    if _flusher_pid == os.getpid():
+        try:
+            flush()
+        except OSError:
+            pass
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _merge(total, data, with_gauges=True):
+    for name, labels, value in data.get('counters', []):
+        key = (name, tuple(map(tuple, labels)))
+        total['counters'][key] = total['counters'].get(key, 0) + value
+    for name, labels, counts in data.get('histograms', []):
+        key = (name, tuple(map(tuple, labels)))
+        merged = total['histograms'].get(key)
+        total['histograms'][key] = counts if merged is None else [a + b for a, b in zip(merged, counts)]
+    if with_gauges:
+        for name, labels, value in data.get('gauges', []):
+            key = (name, tuple(map(tuple, labels)))
+            total['gauges'][key] = total['gauges'].get(key, 0) + value
+
+
+def _archive_dead(directory, path):
+    """Fold an exited process's counters into archive.json (once, under a file lock)"""
+    claimed = f"{path}.dead{os.getpid()}"
+    try:
+        os.rename(path, claimed)  # only one scraper wins the rename
+    except FileNotFoundError:
+        return
+    with open(os.path.join(directory, 'archive.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        archive_path = os.path.join(directory, 'archive.json')
+        archive = {'counters': {}, 'histograms': {}, 'gauges': {}}
+        for source in (archive_path, claimed):
+            try:
+                with open(source) as f:
+                    _merge(archive, json.load(f), with_gauges=False)
+            except (OSError, ValueError):
+                pass
+        _write_json(archive_path, {
+            'counters': [[n, list(l), v] for (n, l), v in archive['counters'].items()],
+            'histograms': [[n, list(l), c] for (n, l), c in archive['histograms'].items()],
+        })
+    os.remove(claimed)
+
+
+def collect():
+    """Totals across every process that has written to METRICS_DIR"""
+    flush()
+    directory = metrics_dir()
+    total = {'counters': {}, 'histograms': {}, 'gauges': {}}
+
+    for filename in sorted(os.listdir(directory)):
+        path = os.path.join(directory, filename)
+        if filename.endswith('.json') and filename[:-5].isdigit() and not _alive(int(filename[:-5])):
+            _archive_dead(directory, path)
+            continue
+
+    for filename in os.listdir(directory):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as f:
+                _merge(total, json.load(f))
+        except (OSError, ValueError):
+            continue  # replaced or removed while we read it
+    return total
+
+
+# -- exposition -------------------------------------------------------------
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """Prometheus text exposition format (version 0.0.4)"""
+    total = collect()
+    lines = []
+    for name, (kind, help_text, buckets) in sorted(_definitions.items()):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == 'histogram':
+            for (metric, labels), counts in sorted(total['histograms'].items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ['+Inf'], counts[:-1]):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else _number(float(bound))
+                    lines.append(f"{name}_bucket{_labels(list(labels) + [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(counts[-1])}")
+                lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+        else:
+            values = total['counters'] if kind == 'counter' else total['gauges']
+            for (metric, labels), value in sorted(values.items()):
+                if metric == name:
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+def init_metrics(app):
+    """Record per-route latency and status counts, and serve GET /metrics"""
+    if not Config.METRICS_ENABLED:
+        return
+
+    from flask import Response, g, request
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        route = request.url_rule.rule if request.url_rule else '<unmatched>'
+        labels = {'blueprint': request.blueprint or '', 'route': route, 'method': request.method}
+        observe('http_request_duration_seconds', time.perf_counter() - started, **labels)
+        inc('http_requests_total', status=response.status_code, **labels)
+        return response
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        if Config.METRICS_TOKEN and \
+                request.headers.get('Authorization') != f"Bearer {Config.METRICS_TOKEN}":
+            return {"error": "Unauthorized"}, 401
+        return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
+# -- metric catalogue -------------------------------------------------------
+
+histogram('http_request_duration_seconds', 'Request latency by blueprint, route and method')
+counter('http_requests_total', 'Requests by blueprint, route, method and status')
+counter('query_budget_exceeded_total', 'Requests over their query budget by endpoint and outcome (partial, unavailable)')
+histogram('db_pool_acquire_seconds', 'Time waiting for a pooled database connection')
+counter('db_pool_exhausted_total', 'Connection requests that gave up after DB_POOL_TIMEOUT with the pool in use')
+gauge('db_pool_connections', 'Pooled database connections by pool (primary, replicaN) and state (in_use, idle, max)')
+counter('db_read_routing_total', 'Read-only connections by target (primary, replicaN) and reason')
+gauge('db_replica_lag_seconds', 'Replay lag of each read replica at its last health check')
+gauge('db_replica_usable', '1 when a read replica is healthy and within REPLICA_MAX_LAG_SECONDS')
+counter('cache_requests_total', 'In-process cache lookups by cache and result (hit, stale, miss)')
+gauge('cache_entries', 'Entries held by in-process caches')
+histogram('model_inference_seconds', 'Embedding / ranking model inference time')
+histogram('model_inference_batch_size', 'Inputs per model inference call', SIZE_BUCKETS)
+counter('media_uploads_total', 'Media uploads by result (stored, duplicate)')
+counter('media_variants_total', 'Resized media variants written')
+histogram('media_variant_seconds', 'Time to generate all variants of one image')
+counter('cover_cache_requests_total', 'Cover thumbnail requests by result (hit, or miss: redirected to the remote cover)')
+counter('cover_cache_fetches_total', 'Remote cover fetches by result (stored, failed)')
+counter('cover_cache_evictions_total', 'Cover thumbnails deleted to stay under COVER_CACHE_MAX_BYTES')
+gauge('cover_cache_bytes', 'Size of the local cover cache as last measured by this process')
+histogram('cover_fetch_seconds', 'Fetching one remote cover image')
+histogram('external_request_seconds', 'Calls to external providers (book metadata, cover hosts), per attempt')
+counter('external_requests_total', 'External requests by provider, operation and outcome (ok, client_error, server_error, error, timeout, retry, short_circuit)')
+gauge('external_circuit_open', '1 while a provider\'s circuit breaker is open or half open')
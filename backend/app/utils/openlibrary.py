@@ -1,6 +1,7 @@
 import requests
 import json
 from app.config import Config
+from app.utils.http_client import get_client
 
 def fetch_book_by_isbn(isbn):
     """
@@ -14,7 +15,7 @@ def fetch_book_by_isbn(isbn):
         # Open Library API endpoint
         url = f"{Config.OPEN_LIBRARY_API_URL}?bibkeys=ISBN:{clean_isbn}&format=json&jscmd=data"
 
-        response = requests.get(url, timeout=10)
+        response = get_client('openlibrary').get(url, operation='isbn')
         response.raise_for_status()
 
         data = response.json()
@@ -72,7 +73,7 @@ def search_books_openlibrary(query, limit=10):
     """
     try:
         url = f"https://openlibrary.org/search.json?q={query}&limit={limit}"
-        response = requests.get(url, timeout=10)
+        response = get_client('openlibrary').get(url, operation='search')
         response.raise_for_status()
         
         data = response.json()
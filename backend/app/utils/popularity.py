@@ -0,0 +1,173 @@
+"""
+Time-decayed book popularity (``book_popularity``).
+
+Each checkout adds 1 to a book's exponentially decayed score. Scores are kept
+in log2 space relative to a fixed epoch (see migration 010), which makes the
+ranking key time-invariant: a checkout is one UPSERT per window, reads are an
+index range scan, and decay is applied lazily when a score is displayed.
+
+Besides the main score (half-life ``POPULARITY_HALF_LIFE_DAYS``) there are
+7/30/365-day variants. An exponential with mean lifetime W has the same total
+weight as a sliding W-day window, so their half-life is ``W * ln 2``.
+"""
+import math
+from typing import Iterable, List, Optional, Tuple
+
+from app.config import Config
+from app.utils.database import execute_query, get_db_cursor
+
+EPOCH = '2024-01-01'
+WINDOWS = (7, 30, 365)
+MAIN_WINDOW = 0
+
+# Lower bound on exponents passed to POWER() - Postgres raises on float underflow
+_MIN_EXPONENT = -1000
+
+
+def half_lives() -> List[Tuple[int, float]]:
+    """``[(window_days, half_life_days), ...]`` for every maintained score."""
+    return [(MAIN_WINDOW, float(Config.POPULARITY_HALF_LIFE_DAYS))] + \
+           [(w, w * math.log(2)) for w in WINDOWS]
+
+
+def record_checkouts(cursor, book_ids: Iterable[int]) -> None:
+    """
+    Fold checkouts into every popularity window, inside the caller's
+    transaction. One statement regardless of how many books are passed;
+    repeated book ids count once each.
+    """
+    book_ids = [b for b in book_ids if b is not None]
+    if not book_ids:
+        return
+
+    windows = half_lives()
+    cursor.execute(f"""
+        WITH now_days AS (
+            SELECT EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - %s::timestamp)) / 86400.0 AS t
+        ),
+        checkouts AS (
+            SELECT book_id, COUNT(*) AS n
+            FROM unnest(%s::integer[]) AS c(book_id)
+            GROUP BY book_id
+        ),
+        windows AS (
+            SELECT * FROM unnest(%s::smallint[], %s::double precision[]) AS w(window_days, half_life_days)
+        )
+        INSERT INTO book_popularity
+            (book_id, window_days, half_life_days, log_score, checkout_count, last_checkout_at)
+        SELECT c.book_id, w.window_days, w.half_life_days,
+               LN(c.n) / LN(2) + now_days.t / w.half_life_days,
+               c.n, CURRENT_TIMESTAMP
+        FROM checkouts c CROSS JOIN windows w CROSS JOIN now_days
+        ON CONFLICT (book_id, window_days) DO UPDATE
+        SET log_score = LN(
+                POWER(2::float8, GREATEST(
+                    book_popularity.log_score
+                    - (EXCLUDED.log_score - LN(EXCLUDED.checkout_count) / LN(2)),
+                    {_MIN_EXPONENT}))
+                + EXCLUDED.checkout_count
+            ) / LN(2) + (EXCLUDED.log_score - LN(EXCLUDED.checkout_count) / LN(2)),
+            checkout_count = book_popularity.checkout_count + EXCLUDED.checkout_count,
+            last_checkout_at = EXCLUDED.last_checkout_at
+    """, (EPOCH, book_ids, [w for w, _ in windows], [h for _, h in windows]))
+
+
+def _window_key(window: Optional[int]) -> int:
+    if window in (None, '', MAIN_WINDOW, str(MAIN_WINDOW)):
+        return MAIN_WINDOW
+    window = int(window)
+    if window not in WINDOWS:
+        raise ValueError(f"window must be one of {', '.join(map(str, WINDOWS))}")
+    return window
+
+
+def get_popular_books(window: Optional[int] = None, limit: int = 10, active_only: bool = True):
+    """
+    Most popular books for a window (None = main trending score), best first.
+    ``popularity_score`` is the decayed score as of now; ``borrow_count`` is
+    all-time for the main score and the last ``window`` days' checkouts for
+    a window, so it agrees with the window it is shown for.
+    """
+    window_days = _window_key(window)
+    if window_days == MAIN_WINDOW:
+        borrow_count = "bp.checkout_count"
+    else:
+        # A handful of rows: one idx_borrowings_item_checkout range per copy
+        borrow_count = f"""(SELECT COUNT(*)
+              FROM items i
+              JOIN borrowings br ON br.item_id = i.item_id
+              WHERE i.book_id = b.book_id
+                AND br.checkout_date > CURRENT_DATE - {window_days})"""
+
+    query = f"""
+        SELECT
+            b.book_id,
+            b.title,
+            b.subtitle,
+            b.isbn,
+            COALESCE((SELECT json_agg(
+                json_build_object('name', c.name, 'role', bc.role)
+                ORDER BY bc.role, bc.sequence_number
+            )
+             FROM book_contributors bc
+             JOIN contributors c ON bc.contributor_id = c.contributor_id
+             WHERE bc.book_id = b.book_id
+            ), '[]'::json) as contributors,
+            b.collection_id,
+            col.collection_name,
+            b.age_rating,
+            b.cover_image_url,
+            ba.available_items, ba.total_items,
+            {borrow_count} as borrow_count,
+            bp.last_checkout_at,
+            POWER(2::float8, GREATEST(
+                bp.log_score - (EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - %s::timestamp)) / 86400.0)
+                / bp.half_life_days,
+                {_MIN_EXPONENT})) as popularity_score
+        FROM book_popularity bp
+        JOIN books b ON bp.book_id = b.book_id
+        LEFT JOIN collections col ON b.collection_id = col.collection_id
+        LEFT JOIN mv_book_availability ba ON b.book_id = ba.book_id
+        WHERE bp.window_days = %s
+          {"AND b.is_active = TRUE" if active_only else ""}
+        ORDER BY bp.log_score DESC
+        LIMIT %s
+    """
+
+    return execute_query(query, (EPOCH, window_days, limit), fetch_all=True) or []
+
+
+def rebuild_popularity() -> int:
+    """
+    Recompute every window from the full borrowing history.
+    Used for the initial backfill and after changing POPULARITY_HALF_LIFE_DAYS.
+    """
+    windows = half_lives()
+    with get_db_cursor() as cursor:
+        cursor.execute("DELETE FROM book_popularity")
+        cursor.execute(f"""
+        WITH now_days AS (
+            SELECT EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - %s::timestamp)) / 86400.0 AS t
+        ),
+        windows AS (
+            SELECT * FROM unnest(%s::smallint[], %s::double precision[]) AS w(window_days, half_life_days)
+        ),
+        scores AS (
+            SELECT i.book_id, w.window_days, w.half_life_days,
+                   SUM(POWER(2::float8, GREATEST(
+                       -(CURRENT_DATE - br.checkout_date) / w.half_life_days, {_MIN_EXPONENT}))) AS score,
+                   COUNT(*) AS checkout_count,
+                   MAX(br.checkout_date)::timestamp AS last_checkout_at
+            FROM borrowings br
+            JOIN items i ON br.item_id = i.item_id
+            CROSS JOIN windows w
+            GROUP BY i.book_id, w.window_days, w.half_life_days
+        )
+        INSERT INTO book_popularity
+            (book_id, window_days, half_life_days, log_score, checkout_count, last_checkout_at)
+        SELECT s.book_id, s.window_days, s.half_life_days,
+               LN(GREATEST(s.score, 1e-300)) / LN(2) + now_days.t / s.half_life_days,
+               s.checkout_count, s.last_checkout_at
+        FROM scores s CROSS JOIN now_days
+        """, (EPOCH, [w for w, _ in windows], [h for _, h in windows]))
+        return cursor.rowcount
@@ -0,0 +1,91 @@
+"""
+Per-endpoint query budgets.
+
+``@query_budget(seconds)`` gives a view a deadline. Every transaction it
+opens through ``app.utils.database`` starts with ``SET LOCAL
+statement_timeout`` set to the time left, so a pathological search or
+report is cancelled by Postgres instead of holding a connection and a
+worker for minutes.
+
+A statement cancelled that way (or not started because the budget is
+spent) raises ``QueryBudgetExceeded``. Views that can still answer - e.g.
+a page of results without its total count - catch it and call
+``budget_exceeded('partial')``; otherwise the decorator turns it into a
+503 with ``Retry-After``. Both are counted in
+``query_budget_exceeded_total``.
+
+Free-text searches also cap how many words become SQL conditions
+(``limit_search_terms``), since each one adds ILIKE / EXISTS clauses.
+"""
+import contextvars
+import time
+from functools import wraps
+
+from flask import has_request_context, jsonify, request
+
+from app.config import Config
+from app.utils import metrics
+
+_deadline = contextvars.ContextVar('query_deadline', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    """A statement ran past (or would start after) the request's query budget"""
+
+
+def statement_timeout_ms():
+    """Milliseconds left in the current budget, or None without one"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise QueryBudgetExceeded("Query budget spent before the statement started")
+    return max(int(remaining * 1000), 1)
+
+
+def budget_exceeded(outcome):
+    """Count a budget overrun: 'partial' (degraded answer) or 'unavailable' (503)"""
+    endpoint = request.endpoint if has_request_context() else None
+    metrics.inc('query_budget_exceeded_total', endpoint=endpoint or 'none', outcome=outcome)
+
+
+def query_budget(seconds):
+    """Cancel the view's queries after ``seconds`` in total; 503 if it can't answer"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not Config.QUERY_BUDGETS_ENABLED or seconds <= 0:
+                return view(*args, **kwargs)
+            token = _deadline.set(time.monotonic() + seconds)
+            try:
+                return view(*args, **kwargs)
+            except QueryBudgetExceeded:
+                budget_exceeded('unavailable')
+                response = jsonify({'error': 'This request is taking too long. Narrow it down or try again shortly.'})
+                response.status_code = 503
+                response.headers['Retry-After'] = str(Config.QUERY_BUDGET_RETRY_AFTER)
+                return response
+            finally:
+                _deadline.reset(token)
+        return wrapper
+    return decorator
+
+
+def limit_search_terms(quoted_terms, words):
+    """
+    Drop repeated terms and keep at most SEARCH_MAX_TERMS in total (quoted
+    tags first); returns (quoted_terms, words, ignored)
+    """
+    kept, ignored, seen = ([], []), [], set()
+    for index, terms in enumerate((quoted_terms, words)):
+        for term in terms:
+            key = (index, term.lower())
+            if key in seen:
+                continue
+            seen.add(key)
+            if len(kept[0]) + len(kept[1]) < Config.SEARCH_MAX_TERMS:
+                kept[index].append(term)
+            else:
+                ignored.append(term)
+    return kept[0], kept[1], ignored
@@ -0,0 +1,314 @@
+"""
+Vectorised recommendation scoring engine.
+
+The candidate set (every active book with its features) is pulled once and
+kept as NumPy arrays; a patron is then scored with a single matrix-vector
+product over the feature columns and the top-k is taken with
+``np.argpartition``. All ranking strategies (popular, top rated, genre/age
+fit, "more like what you read") are just weights in that product.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.config import Config
+from app.utils.popularity import EPOCH as POPULARITY_EPOCH, MAIN_WINDOW, half_lives
+from app.utils.database import get_db_cursor
+from app.utils.similarity import load_embedding_matrix
+from app.utils import metrics
+
+FEATURES = ('popularity', 'circulation', 'rating', 'age_fit', 'affinity', 'novelty')
+
+DEFAULT_WEIGHTS = {
+    'popularity': 1.0,   # long-window decayed checkouts (log scaled)
+    'circulation': 1.5,  # trending: decayed checkouts, POPULARITY_HALF_LIFE_DAYS
+    'rating': 1.0,       # Bayesian average rating
+    'age_fit': 1.0,      # matches the patron's age / usual age ratings
+    'affinity': 2.0,     # embedding similarity to the patron's history centroid
+    'novelty': 0.5,      # long-tail bonus (self-information of popularity)
+}
+
+# Popularity window used for the long-term "popular" feature and novelty
+_LONG_WINDOW = 365
+
+# Bayesian rating prior: a book needs a few reviews before its average counts
+_RATING_PRIOR_MEAN = 3.0
+_RATING_PRIOR_WEIGHT = 3.0
+
+
+def load_weights(overrides: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """
+    Resolve scoring weights: defaults, then Config.RECOMMENDATION_WEIGHTS
+    ("affinity=2.5,novelty=0"), then explicit overrides.
+    """
+    weights = dict(DEFAULT_WEIGHTS)
+    for part in (Config.RECOMMENDATION_WEIGHTS or '').split(','):
+        if '=' in part:
+            key, value = part.split('=', 1)
+            key = key.strip()
+            if key in weights:
+                try:
+                    weights[key] = float(value)
+                except ValueError:
+                    logging.warning("Ignoring invalid recommendation weight %r", part)
+    if overrides:
+        weights.update({k: float(v) for k, v in overrides.items() if k in weights})
+    return weights
+
+
+@dataclass
+class CandidateSet:
+    """Feature arrays for every candidate book, aligned by row."""
+    book_ids: np.ndarray
+    popularity: np.ndarray           # 365-day window checkout score
+    circulation: np.ndarray          # main half-life checkout score
+    rating: np.ndarray
+    age_ratings: np.ndarray          # object array of rating names
+    available: np.ndarray            # bool, has an available item right now
+    embeddings: Optional[np.ndarray]
+    emb_mask: Optional[np.ndarray]
+    total_patrons: int
+    age_ranges: Dict[str, tuple] = field(default_factory=dict)
+    loaded_at: float = field(default_factory=time.time)
+
+    def __post_init__(self):
+        self.index = {int(b): i for i, b in enumerate(self.book_ids)}
+
+
+@dataclass
+class PatronProfile:
+    patron_id: str
+    history: List[int]               # book ids borrowed or read, most recent first
+    age: Optional[int] = None
+
+
+def load_candidates(as_of: Optional[date] = None) -> CandidateSet:
+    """
+    Pull the whole candidate set in one pass.
+
+    Live scoring reads the incrementally maintained ``book_popularity``
+    scores. ``as_of`` instead recomputes the same decayed scores from
+    borrowings (and reviews) before that date, which is what the offline
+    evaluation harness uses to hide held-out data.
+    """
+    if as_of is None:
+        circulation_sql = """
+            SELECT bp.book_id,
+                   SUM(POWER(2::float8, GREATEST(bp.log_score - now_days.t / bp.half_life_days, -1000)))
+                       FILTER (WHERE bp.window_days = %(long_window)s) AS popularity,
+                   SUM(POWER(2::float8, GREATEST(bp.log_score - now_days.t / bp.half_life_days, -1000)))
+                       FILTER (WHERE bp.window_days = %(main_window)s) AS decayed
+            FROM book_popularity bp
+            CROSS JOIN (
+                SELECT EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - %(epoch)s::timestamp)) / 86400.0 AS t
+            ) now_days
+            WHERE bp.window_days IN (%(long_window)s, %(main_window)s)
+            GROUP BY bp.book_id
+        """
+    else:
+        circulation_sql = """
+            SELECT i.book_id,
+                   SUM(POWER(0.5, (%(as_of)s::date - br.checkout_date) / %(long_half_life)s)) AS popularity,
+                   SUM(POWER(0.5, (%(as_of)s::date - br.checkout_date) / %(half_life)s)) AS decayed
+            FROM borrowings br
+            JOIN items i ON br.item_id = i.item_id
+            WHERE br.checkout_date < %(as_of)s
+            GROUP BY i.book_id
+        """
+
+    params = {
+        'as_of': as_of,
+        'epoch': POPULARITY_EPOCH,
+        'main_window': MAIN_WINDOW,
+        'long_window': _LONG_WINDOW,
+        'half_life': float(Config.POPULARITY_HALF_LIFE_DAYS),
+        'long_half_life': dict(half_lives())[_LONG_WINDOW],
+    }
+
+    with get_db_cursor(commit=False) as cur:
+        cur.execute(f"""
+            SELECT b.book_id, b.age_rating,
+                   COALESCE(ba.available_items, 0) > 0 AS available,
+                   COALESCE(circ.popularity, 0) AS popularity,
+                   COALESCE(circ.decayed, 0) AS decayed,
+                   COALESCE(rv.rating_sum, 0) AS rating_sum,
+                   COALESCE(rv.review_count, 0) AS review_count
+            FROM books b
+            LEFT JOIN mv_book_availability ba ON b.book_id = ba.book_id
+            LEFT JOIN ({circulation_sql}) circ ON circ.book_id = b.book_id
+            LEFT JOIN (
+                SELECT book_id, SUM(rating) AS rating_sum, COUNT(*) AS review_count
+                FROM reviews
+                WHERE %(as_of)s::date IS NULL OR created_at < %(as_of)s::date
+                GROUP BY book_id
+            ) rv ON rv.book_id = b.book_id
+            WHERE b.is_active = TRUE
+            ORDER BY b.book_id
+        """, params)
+        rows = cur.fetchall() or []
+
+        cur.execute("SELECT COUNT(*) AS total FROM patrons")
+        total_patrons = cur.fetchone()['total']
+
+        cur.execute("SELECT rating_name, min_age, max_age FROM age_ratings")
+        age_ranges = {r['rating_name']: (r['min_age'], r['max_age']) for r in (cur.fetchall() or [])}
+
+        book_ids = np.array([r['book_id'] for r in rows], dtype=np.int64)
+        index = {int(b): i for i, b in enumerate(book_ids)}
+        embeddings, emb_mask = load_embedding_matrix(cur, index)
+
+    review_count = np.array([r['review_count'] for r in rows], dtype=np.float64)
+    rating_sum = np.array([float(r['rating_sum']) for r in rows], dtype=np.float64)
+    rating = ((_RATING_PRIOR_MEAN * _RATING_PRIOR_WEIGHT + rating_sum)
+              / (_RATING_PRIOR_WEIGHT + review_count))
+
+    return CandidateSet(
+        book_ids=book_ids,
+        popularity=np.array([float(r['popularity']) for r in rows], dtype=np.float64),
+        circulation=np.array([float(r['decayed']) for r in rows], dtype=np.float64),
+        rating=rating,
+        age_ratings=np.array([r['age_rating'] for r in rows], dtype=object),
+        available=np.array([r['available'] for r in rows], dtype=bool),
+        embeddings=embeddings,
+        emb_mask=emb_mask,
+        total_patrons=total_patrons,
+        age_ranges=age_ranges,
+    )
+
+
+_cache_lock = threading.Lock()
+_cached_candidates: Optional[CandidateSet] = None
+
+
+def get_candidates() -> CandidateSet:
+    """Process-wide candidate set, reloaded after RECOMMENDATION_CANDIDATE_TTL seconds."""
+    global _cached_candidates
+    candidates = _cached_candidates
+    if candidates is None or time.time() - candidates.loaded_at > Config.RECOMMENDATION_CANDIDATE_TTL:
+        metrics.inc('cache_requests_total', cache='recommendation_candidates', result='miss')
+        with _cache_lock:
+            candidates = _cached_candidates
+            if candidates is None or time.time() - candidates.loaded_at > Config.RECOMMENDATION_CANDIDATE_TTL:
+                candidates = _cached_candidates = load_candidates()
+    else:
+        metrics.inc('cache_requests_total', cache='recommendation_candidates', result='hit')
+    return candidates
+
+
+def load_patron_profiles(patron_ids: Optional[Sequence[str]] = None,
+                         as_of: Optional[date] = None) -> Dict[str, PatronProfile]:
+    """
+    Borrowing/reading history for many patrons in one round trip.
+    With ``patron_ids=None`` every patron is returned.
+    """
+    as_of = as_of or date.today()
+    patron_filter = "" if patron_ids is None else "AND p.patron_id = ANY(%(patron_ids)s)"
+
+    with get_db_cursor(commit=False) as cur:
+        cur.execute(f"""
+            SELECT p.patron_id,
+                   DATE_PART('year', AGE(%(as_of)s::date, p.date_of_birth))::int AS age,
+                   COALESCE((
+                       SELECT array_agg(h.book_id ORDER BY h.event_date DESC)
+                       FROM (
+                           SELECT i.book_id, MAX(br.checkout_date) AS event_date
+                           FROM borrowings br
+                           JOIN items i ON br.item_id = i.item_id
+                           WHERE br.patron_id = p.patron_id AND br.checkout_date < %(as_of)s
+                           GROUP BY i.book_id
+                           UNION ALL
+                           SELECT rh.book_id, MAX(rh.read_date)::date
+                           FROM reading_history rh
+                           WHERE rh.patron_id = p.patron_id AND rh.read_date < %(as_of)s
+                           GROUP BY rh.book_id
+                       ) h
+                   ), ARRAY[]::integer[]) AS history
+            FROM patrons p
+            WHERE TRUE {patron_filter}
+        """, {'as_of': as_of, 'patron_ids': list(patron_ids or [])})
+        rows = cur.fetchall() or []
+
+    profiles = {}
+    for row in rows:
+        # De-duplicate while keeping most-recent-first order
+        history = list(dict.fromkeys(row['history'] or []))
+        profiles[row['patron_id']] = PatronProfile(row['patron_id'], history, row['age'])
+    return profiles
+
+
+def _scaled(values: np.ndarray) -> np.ndarray:
+    top = values.max() if values.size else 0.0
+    return values / top if top > 0 else np.zeros_like(values)
+
+
+def feature_matrix(candidates: CandidateSet, profile: PatronProfile) -> np.ndarray:
+    """(n_books x len(FEATURES)) matrix of per-feature scores in [0, 1]."""
+    n = candidates.book_ids.size
+    history_idx = np.array([candidates.index[b] for b in profile.history[:Config.RECOMMENDATION_HISTORY_SIZE]
+                            if b in candidates.index], dtype=np.int64)
+
+    popularity = _scaled(np.log1p(candidates.popularity))
+    circulation = _scaled(candidates.circulation)
+    rating = (candidates.rating - 1.0) / 4.0
+
+    # Age fit: share of the patron's history with the same age rating,
+    # falling back to the patron's age against the age_ratings ranges
+    if history_idx.size:
+        names, counts = np.unique(candidates.age_ratings[history_idx].astype(str), return_counts=True)
+        share = dict(zip(names, counts / counts.sum()))
+        age_fit = np.array([share.get(str(r), 0.0) for r in candidates.age_ratings])
+        age_fit = _scaled(age_fit)
+    elif profile.age is not None and candidates.age_ranges:
+        fits = {}
+        for name, (low, high) in candidates.age_ranges.items():
+            fits[name] = 1.0 if low <= profile.age and (high is None or profile.age <= high) else 0.0
+        age_fit = np.array([fits.get(r, 0.5) for r in candidates.age_ratings])
+    else:
+        age_fit = np.full(n, 0.5)
+
+    # Affinity: cosine to the centroid of the patron's history embeddings
+    affinity = np.zeros(n)
+    if candidates.embeddings is not None and history_idx.size:
+        with_vectors = history_idx[candidates.emb_mask[history_idx]]
+        if with_vectors.size:
+            centroid = candidates.embeddings[with_vectors].mean(axis=0)
+            norm = np.linalg.norm(centroid)
+            if norm > 0:
+                affinity = np.clip(candidates.embeddings @ (centroid / norm), 0.0, None)
+                affinity[~candidates.emb_mask] = 0.0
+
+    # Novelty: self-information of the (approximate) borrow probability
+    p = (candidates.popularity + 1.0) / (candidates.total_patrons + 1.0)
+    novelty = _scaled(-np.log2(np.clip(p, 1e-12, 1.0)))
+
+    return np.column_stack([popularity, circulation, rating, age_fit, affinity, novelty])
+
+
+def rank(candidates: CandidateSet, profile: PatronProfile, limit: int = 10,
+         weights: Optional[Dict[str, float]] = None, require_available: bool = True):
+    """Return ``[(book_id, score), ...]`` best first, excluding the patron's history."""
+    if candidates.book_ids.size == 0:
+        return []
+
+    weights = weights or load_weights()
+    w = np.array([weights[f] for f in FEATURES], dtype=np.float64)
+    scores = feature_matrix(candidates, profile) @ w
+
+    excluded = [candidates.index[b] for b in profile.history if b in candidates.index]
+    scores[excluded] = -np.inf
+    if require_available:
+        scores[~candidates.available] = -np.inf
+
+    eligible = int(np.isfinite(scores).sum())
+    k = min(limit, eligible)
+    if k <= 0:
+        return []
+
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [(int(candidates.book_ids[i]), float(scores[i])) for i in top]
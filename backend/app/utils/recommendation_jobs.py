@@ -0,0 +1,194 @@
+"""
+Background computation of materialized patron recommendations.
+
+Lists live in ``patron_recommendations`` and are served as-is by
+``/api/patron/recommendations``. Borrow, return and review events call
+``schedule_recompute`` which marks the patron's list stale and hands the
+work to a small process pool, so the request never pays for scoring. The
+nightly rebuild runs either from cron (``recompute_recommendations.py``,
+parallel across cores) or from the in-app scheduler, which only queues it
+on that pool (``schedule_recompute_all``) one batch at a time.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence
+
+from psycopg2.extras import execute_values
+
+from app.config import Config
+from app.utils.database import execute_query, get_db_cursor
+from app.utils import metrics
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+_pending = set()
+# Patrons with an event since their queued refresh was submitted
+_requeue = set()
+# Patron batches of a schedule_recompute_all run not yet handed to the pool
+_batches: List[List[str]] = []
+_batches_lock = threading.Lock()
+
+
+def compute_and_store(patron_ids: Sequence[str]) -> int:
+    """Score and persist recommendation lists for a batch of patrons."""
+    # Imported here so pool processes only pay for NumPy when they score
+    from app.utils.recommendation_engine import get_candidates, load_patron_profiles, rank
+
+    if not patron_ids:
+        return 0
+
+    candidates = get_candidates()
+    profiles = load_patron_profiles(list(patron_ids))
+    payload = []
+    metrics.observe('model_inference_batch_size', len(profiles), model='recommendation_ranker', operation='rank')
+    with metrics.timer('model_inference_seconds', model='recommendation_ranker', operation='rank'):
+        for patron_id, profile in profiles.items():
+            ranked = rank(candidates, profile, limit=Config.RECOMMENDATION_LIST_SIZE)
+            payload.append((patron_id, [b for b, _ in ranked], [s for _, s in ranked]))
+
+    if payload:
+        with get_db_cursor() as cur:
+            execute_values(cur, """
+                INSERT INTO patron_recommendations (patron_id, book_ids, scores, generated_at, is_stale)
+                VALUES %s
+                ON CONFLICT (patron_id) DO UPDATE
+                SET book_ids = EXCLUDED.book_ids,
+                    scores = EXCLUDED.scores,
+                    generated_at = EXCLUDED.generated_at,
+                    is_stale = FALSE
+            """, payload, template="(%s, %s::integer[], %s::real[], CURRENT_TIMESTAMP, FALSE)")
+
+    return len(payload)
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # spawn: children must not inherit the parent's DB connections
+                _executor = ProcessPoolExecutor(
+                    max_workers=Config.RECOMMENDATION_POOL_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+    return _executor
+
+
+def _on_done(patron_id, future):
+    _pending.discard(patron_id)
+    exc = future.exception()
+    if exc is not None:
+        # The list stays flagged stale and the nightly run picks it up
+        logging.warning("Recommendation refresh failed for %s: %s", patron_id, exc)
+    if patron_id in _requeue:
+        _requeue.discard(patron_id)
+        # The refresh may have read the patron's history before that event
+        schedule_recompute(patron_id)
+
+
+def schedule_recompute(patron_id: str) -> None:
+    """
+    Invalidate a patron's list and recompute it in the background.
+    Safe to call from request handlers; never raises.
+    """
+    if not patron_id:
+        return
+
+    try:
+        execute_query(
+            "UPDATE patron_recommendations SET is_stale = TRUE WHERE patron_id = %s",
+            (patron_id,)
+        )
+    except Exception as e:
+        logging.warning("Could not mark recommendations stale for %s: %s", patron_id, e)
+
+    if patron_id in _pending:
+        # A refresh is queued or already running and may not see this event;
+        # run another one once it finishes
+        _requeue.add(patron_id)
+        return
+
+    try:
+        _pending.add(patron_id)
+        future = _get_executor().submit(compute_and_store, [patron_id])
+        future.add_done_callback(lambda f: _on_done(patron_id, f))
+    except Exception as e:
+        _pending.discard(patron_id)
+        logging.warning("Could not queue recommendation refresh for %s: %s", patron_id, e)
+
+
+def _chunks(items: List[str], size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _submit_next_batch():
+    with _batches_lock:
+        if not _batches:
+            return
+        batch = _batches.pop(0)
+    try:
+        _get_executor().submit(compute_and_store, batch).add_done_callback(_on_batch_done)
+    except Exception as e:
+        with _batches_lock:
+            _batches.clear()
+        logging.warning("Could not queue recommendation batch: %s", e)
+
+
+def _on_batch_done(future):
+    exc = future.exception()
+    if exc is not None:
+        logging.warning("Recommendation batch failed: %s", exc)
+    _submit_next_batch()
+
+
+def schedule_recompute_all(chunk_size: int = 200) -> dict:
+    """
+    Rebuild every patron's list on the background pool and return at once.
+    Batches go to the pool one at a time, so event-driven refreshes queue
+    between them rather than behind the whole run. Does nothing while a
+    previous run still has batches waiting.
+    """
+    with _batches_lock:
+        if _batches:
+            return {'queued': 0, 'batches_waiting': len(_batches)}
+
+    rows = execute_query("SELECT patron_id FROM patrons", fetch_all=True)
+    patron_ids = [r['patron_id'] for r in (rows or [])]
+    with _batches_lock:
+        _batches.extend(_chunks(patron_ids, chunk_size))
+        batches = len(_batches)
+    _submit_next_batch()
+    return {'queued': len(patron_ids), 'batches': batches}
+
+
+def recompute_all(stale_only: bool = False, workers: Optional[int] = None, chunk_size: int = 200) -> int:
+    """
+    Rebuild lists for every patron (or only stale/missing ones) using one
+    process per core. Each process loads the candidate set once and then
+    scores whole chunks of patrons.
+    """
+    if stale_only:
+        rows = execute_query("""
+            SELECT p.patron_id
+            FROM patrons p
+            LEFT JOIN patron_recommendations pr ON pr.patron_id = p.patron_id
+            WHERE pr.patron_id IS NULL OR pr.is_stale
+        """, fetch_all=True)
+    else:
+        rows = execute_query("SELECT patron_id FROM patrons", fetch_all=True)
+
+    patron_ids = [r['patron_id'] for r in (rows or [])]
+    if not patron_ids:
+        return 0
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return sum(compute_and_store(chunk) for chunk in _chunks(patron_ids, chunk_size))
+
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=multiprocessing.get_context('spawn')) as pool:
+        return sum(pool.map(compute_and_store, _chunks(patron_ids, chunk_size)))
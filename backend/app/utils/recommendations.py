@@ -1,179 +1,124 @@
 from app.utils.database import execute_query
+from app.utils.recommendation_engine import get_candidates, load_patron_profiles, PatronProfile, rank
 
-def get_recommendations_for_patron(patron_id, limit=10):
+def get_recommendations_for_patron(patron_id, limit=10, weights=None):
     """
     Get personalized book recommendations for a patron
-    Based on:
-    1. Age-appropriate content (from patron's age or reading history)
-    2. Genre preferences (from reading history)
-    3. Popular books
+    Scored in one pass by the recommendation engine over:
+    1. Popularity and time-decayed circulation
+    2. Ratings
+    3. Age fit (patron's age or reading history)
+    4. Embedding affinity to the patron's reading history
+    5. Novelty
     """
-    
-    # Get patron's reading history
-    history_query = """
-        SELECT DISTINCT b.genre, b.age_rating, b.sub_genre
-        FROM reading_history rh
-        JOIN books b ON rh.book_id = b.book_id
-        WHERE rh.patron_id = %s
-        ORDER BY rh.read_date DESC
-        LIMIT 20
+    profile = load_patron_profiles([patron_id]).get(patron_id) or PatronProfile(patron_id, [])
+    ranked = rank(get_candidates(), profile, limit=limit, weights=weights)
+
+    return get_books_by_ids([book_id for book_id, _ in ranked])
+
+def get_stored_recommendations(patron_id, limit=10):
+    """
+    Get a patron's materialized recommendation list (patron_recommendations)
+    Returns None when no list has been generated for the patron yet
     """
-    reading_history = execute_query(history_query, (patron_id,), fetch_all=True)
-    
-    # Extract genres and age ratings from history
-    preferred_genres = list(set([book['genre'] for book in reading_history if book['genre']]))
-    age_ratings = list(set([book['age_rating'] for book in reading_history if book['age_rating']]))
-    
-    # Get books already read or borrowed
-    excluded_books_query = """
-        SELECT DISTINCT book_id FROM (
-            SELECT book_id FROM reading_history WHERE patron_id = %s
-            UNION
-            SELECT book_id FROM borrowings WHERE patron_id = %s
-        ) AS read_or_borrowed
+    query = """
+        SELECT pr.generated_at,
+               COALESCE((
+                   SELECT json_agg(book ORDER BY rec.position)
+                   FROM unnest(pr.book_ids[1:%s]) WITH ORDINALITY AS rec(book_id, position)
+                   JOIN LATERAL (
+                       SELECT b.book_id, b.isbn, b.title, b.subtitle,
+                              b.publisher, b.publication_year,
+                              b.collection_id, c.collection_name,
+                              b.age_rating, b.cover_image_url,
+                              ba.available_items, ba.total_items,
+                              COALESCE((SELECT json_agg(
+                                  json_build_object('name', contrib.name, 'role', bc.role)
+                                  ORDER BY bc.role, bc.sequence_number
+                              )
+                               FROM book_contributors bc
+                               JOIN contributors contrib ON bc.contributor_id = contrib.contributor_id
+                               WHERE bc.book_id = b.book_id
+                              ), '[]'::json) as contributors,
+                              (SELECT AVG(rating) FROM reviews WHERE book_id = b.book_id) as avg_rating,
+                              (SELECT COUNT(*) FROM reviews WHERE book_id = b.book_id) as review_count
+                       FROM books b
+                       LEFT JOIN collections c ON b.collection_id = c.collection_id
+                       LEFT JOIN mv_book_availability ba ON b.book_id = ba.book_id
+                       WHERE b.book_id = rec.book_id AND b.is_active = TRUE
+                   ) book ON TRUE
+               ), '[]'::json) as books
+        FROM patron_recommendations pr
+        WHERE pr.patron_id = %s
+    """
+
+    return execute_query(query, (limit, patron_id), fetch_one=True)
+
+def get_books_by_ids(book_ids):
+    """
+    Fetch catalogue rows for the given books, preserving the given order
+    """
+    if not book_ids:
+        return []
+
+    query = """
+        SELECT b.book_id, b.isbn, b.title, b.subtitle,
+               b.publisher, b.publication_year,
+               b.collection_id, c.collection_name,
+               b.age_rating, b.cover_image_url,
+               ba.available_items, ba.total_items,
+               COALESCE((SELECT json_agg(
+                   json_build_object('name', contrib.name, 'role', bc.role)
+                   ORDER BY bc.role, bc.sequence_number
+               )
+                FROM book_contributors bc
+                JOIN contributors contrib ON bc.contributor_id = contrib.contributor_id
+                WHERE bc.book_id = b.book_id
+               ), '[]'::json) as contributors,
+               (SELECT AVG(rating) FROM reviews WHERE book_id = b.book_id) as avg_rating,
+               (SELECT COUNT(*) FROM reviews WHERE book_id = b.book_id) as review_count
+        FROM books b
+        LEFT JOIN collections c ON b.collection_id = c.collection_id
+        LEFT JOIN mv_book_availability ba ON b.book_id = ba.book_id
+        WHERE b.book_id = ANY(%s)
+        ORDER BY array_position(%s, b.book_id)
     """
-    excluded = execute_query(excluded_books_query, (patron_id, patron_id), fetch_all=True)
-    excluded_ids = [book['book_id'] for book in excluded] if excluded else [-1]
-    
-    recommendations = []
-    
-    # Strategy 1: Genre-based recommendations (if we have genre preferences)
-    if preferred_genres:
-        genre_query = """
-            SELECT b.*, 
-                   COUNT(DISTINCT rh.patron_id) as popularity_score,
-                   AVG(r.rating) as avg_rating
-            FROM books b
-            LEFT JOIN reading_history rh ON b.book_id = rh.book_id
-            LEFT JOIN reviews r ON b.book_id = r.book_id
-            WHERE b.genre = ANY(%s)
-              AND b.age_rating = ANY(%s)
-              AND b.book_id != ALL(%s)
-              AND b.available_copies > 0
-              AND b.status = 'Available'
-            GROUP BY b.book_id
-            ORDER BY popularity_score DESC, avg_rating DESC NULLS LAST
-            LIMIT %s
-        """
-        genre_recs = execute_query(
-            genre_query, 
-            (preferred_genres, age_ratings or [None], excluded_ids, limit // 2),
-            fetch_all=True
-        )
-        recommendations.extend(genre_recs or [])
-    
-    # Strategy 2: Popular books (age-appropriate)
-    remaining = limit - len(recommendations)
-    if remaining > 0:
-        popular_query = """
-            SELECT b.*, 
-                   COUNT(DISTINCT rh.patron_id) as popularity_score,
-                   AVG(r.rating) as avg_rating
-            FROM books b
-            LEFT JOIN reading_history rh ON b.book_id = rh.book_id
-            LEFT JOIN reviews r ON b.book_id = r.book_id
-            WHERE b.book_id != ALL(%s)
-              AND b.available_copies > 0
-              AND b.status = 'Available'
-              AND (b.age_rating = ANY(%s) OR %s = 0)
-            GROUP BY b.book_id
-            ORDER BY popularity_score DESC, avg_rating DESC NULLS LAST
-            LIMIT %s
-        """
-        popular_recs = execute_query(
-            popular_query,
-            (excluded_ids, age_ratings or [None], len(age_ratings), remaining),
-            fetch_all=True
-        )
-        
-        # Avoid duplicates
-        existing_ids = {book['book_id'] for book in recommendations}
-        for book in (popular_recs or []):
-            if book['book_id'] not in existing_ids:
-                recommendations.append(book)
-                existing_ids.add(book['book_id'])
-    
-    # Strategy 3: If still not enough, get highest rated books
-    remaining = limit - len(recommendations)
-    if remaining > 0:
-        rated_query = """
-            SELECT b.*, 
-                   AVG(r.rating) as avg_rating,
-                   COUNT(r.review_id) as review_count
-            FROM books b
-            JOIN reviews r ON b.book_id = r.book_id
-            WHERE b.book_id != ALL(%s)
-              AND b.available_copies > 0
-              AND b.status = 'Available'
-            GROUP BY b.book_id
-            HAVING COUNT(r.review_id) >= 3
-            ORDER BY avg_rating DESC, review_count DESC
-            LIMIT %s
-        """
-        rated_recs = execute_query(
-            rated_query,
-            (excluded_ids, remaining),
-            fetch_all=True
-        )
-        
-        existing_ids = {book['book_id'] for book in recommendations}
-        for book in (rated_recs or []):
-            if book['book_id'] not in existing_ids:
-                recommendations.append(book)
-    
-    return recommendations[:limit]
+
+    books = execute_query(query, (list(book_ids), list(book_ids)), fetch_all=True)
+
+    return books or []
 
 def get_similar_books(book_id, limit=5):
     """
     Get books similar to a given book
-    Based on genre, sub-genre, and author
-    """
-    # Get the book details
-    book_query = """
-        SELECT genre, sub_genre, author, age_rating
-        FROM books
-        WHERE book_id = %s
+    Served from the precomputed book_similarity index
+    (co-borrowing + embeddings, see app/utils/similarity.py)
     """
-    book = execute_query(book_query, (book_id,), fetch_one=True)
-    
-    if not book:
-        return []
-    
-    # Find similar books
     similar_query = """
-        SELECT b.*, 
-               AVG(r.rating) as avg_rating,
-               COUNT(DISTINCT rh.patron_id) as popularity_score
-        FROM books b
-        LEFT JOIN reviews r ON b.book_id = r.book_id
-        LEFT JOIN reading_history rh ON b.book_id = rh.book_id
-        WHERE b.book_id != %s
-          AND (
-              b.genre = %s 
-              OR b.sub_genre = %s 
-              OR b.author = %s
-          )
-          AND b.available_copies > 0
-          AND b.status = 'Available'
-        GROUP BY b.book_id
-        ORDER BY 
-            CASE 
-                WHEN b.genre = %s AND b.sub_genre = %s THEN 1
-                WHEN b.genre = %s THEN 2
-                WHEN b.author = %s THEN 3
-                ELSE 4
-            END,
-            popularity_score DESC,
-            avg_rating DESC NULLS LAST
+        SELECT b.book_id, b.isbn, b.title, b.subtitle,
+               b.publisher, b.publication_year,
+               b.collection_id, c.collection_name,
+               b.age_rating, b.cover_image_url,
+               ba.available_items, ba.total_items,
+               COALESCE((SELECT json_agg(
+                   json_build_object('name', contrib.name, 'role', bc.role)
+                   ORDER BY bc.role, bc.sequence_number
+               )
+                FROM book_contributors bc
+                JOIN contributors contrib ON bc.contributor_id = contrib.contributor_id
+                WHERE bc.book_id = b.book_id
+               ), '[]'::json) as contributors,
+               bs.score as similarity_score
+        FROM book_similarity bs
+        JOIN books b ON bs.similar_book_id = b.book_id
+        LEFT JOIN collections c ON b.collection_id = c.collection_id
+        LEFT JOIN mv_book_availability ba ON b.book_id = ba.book_id
+        WHERE bs.book_id = %s
+          AND b.is_active = TRUE
+        ORDER BY bs.score DESC
         LIMIT %s
     """
-    
-    similar_books = execute_query(
-        similar_query,
-        (book_id, book['genre'], book['sub_genre'], book['author'],
-         book['genre'], book['sub_genre'], book['genre'], book['author'],
-         limit),
-        fetch_all=True
-    )
-    
+
+    similar_books = execute_query(similar_query, (book_id, limit), fetch_all=True)
+
     return similar_books or []
@@ -0,0 +1,199 @@
+"""
+Read-replica routing.
+
+With ``DATABASE_REPLICA_URLS`` set, connections opened inside a
+``with read_only():`` block (or a view decorated with ``@read_only()``) go to a
+replica; everything else - and all writes - use ``DATABASE_URL``. Reads
+are only marked read-only where a slightly stale answer is acceptable:
+catalogue searches, dashboards, history and exports.
+
+A daemon thread per process checks every replica each
+``REPLICA_CHECK_INTERVAL`` seconds. A replica is used only once a check
+has succeeded and its replay lag is at most ``REPLICA_MAX_LAG_SECONDS``;
+one that refuses a connection is skipped until its next good check.
+With no usable replica, reads fall back to the primary.
+
+Read-your-writes: after a request that wrote (a successful non-GET), that
+client's reads stay on the primary for ``READ_YOUR_WRITES_SECONDS``. The
+window's end, signed with ``SECRET_KEY``, goes back in the
+``X-DB-Primary-Until`` response header and a cookie. The SPAs are on another
+origin and don't send cookies, so their API clients echo the header on
+later requests; either way the pin holds whichever worker or instance
+serves the next request.
+"""
+import contextvars
+import itertools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from flask import current_app, has_request_context, request
+from itsdangerous import BadSignature, Signer
+
+from app.config import Config
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+STICKY_COOKIE = 'db_primary_until'
+STICKY_HEADER = 'X-DB-Primary-Until'
+
+# Seconds the replica is behind: 0 when it has replayed everything it
+# received (an idle primary is not lag), 0 on a server that is not a standby
+LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+_prefer_replica = contextvars.ContextVar('prefer_replica', default=False)
+
+
+class Replica:
+    def __init__(self, url, name):
+        self.url = url
+        self.name = name
+        self.healthy = False   # unknown until the first check
+        self.lag = None
+        self.checked_at = None
+        self.error = None
+
+    @property
+    def usable(self):
+        return self.healthy and self.lag is not None and self.lag <= Config.REPLICA_MAX_LAG_SECONDS
+
+    def check(self):
+        try:
+            conn = psycopg2.connect(self.url, connect_timeout=Config.REPLICA_CONNECT_TIMEOUT)
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(LAG_SQL)
+                    self.lag = float(cur.fetchone()[0])
+            finally:
+                conn.close()
+            self.healthy, self.error = True, None
+        except psycopg2.Error as e:
+            self.healthy, self.error = False, str(e).strip()
+        self.checked_at = time.time()
+        return self.usable
+
+
+replicas = [Replica(url, f"replica{i}") for i, url in enumerate(Config.DATABASE_REPLICA_URLS, start=1)]
+_round_robin = itertools.count()
+_checker_pid = None
+_checker_lock = threading.Lock()
+
+
+def _check_loop():
+    while True:
+        for replica in replicas:
+            was_usable = replica.usable
+            if replica.check() != was_usable:
+                logger.warning("Replica %s is now %s (lag %s, %s)", replica.name,
+                               'in use' if replica.usable else 'out of rotation',
+                               replica.lag, replica.error or 'ok')
+        time.sleep(Config.REPLICA_CHECK_INTERVAL)
+
+
+def _ensure_checker():
+    """Start the health check thread once per process"""
+    global _checker_pid
+    if _checker_pid == os.getpid():
+        return
+    with _checker_lock:
+        if _checker_pid == os.getpid():
+            return
+        _checker_pid = os.getpid()
+    threading.Thread(target=_check_loop, name='replica-check', daemon=True).start()
+
+
+def mark_unusable(url):
+    """A replica refused a connection or dropped one: skip it until its next good check"""
+    for replica in replicas:
+        if replica.url == url:
+            replica.healthy, replica.error = False, 'connection failed'
+
+
+# -- choosing -----------------------------------------------------------------
+
+def _signer():
+    return Signer(current_app.config['SECRET_KEY'], salt='db-primary-until')
+
+
+def _pinned_until(value):
+    """End of a signed read-your-writes window; 0 if missing or tampered with"""
+    try:
+        return float(_signer().unsign(value).decode()) if value else 0
+    except (BadSignature, ValueError):
+        return 0
+
+
+def _recent_writer():
+    if not has_request_context():
+        return False
+    now = time.time()
+    return any(_pinned_until(value) > now
+               for value in (request.headers.get(STICKY_HEADER), request.cookies.get(STICKY_COOKIE)))
+
+
+def choose_replica():
+    """URL of a usable replica for read-only work, or None for the primary"""
+    if not replicas or not _prefer_replica.get():
+        return None
+    _ensure_checker()
+    if _recent_writer():
+        metrics.inc('db_read_routing_total', target='primary', reason='recent_write')
+        return None
+    usable = [replica for replica in replicas if replica.usable]
+    if not usable:
+        metrics.inc('db_read_routing_total', target='primary', reason='no_replica')
+        return None
+    replica = usable[next(_round_robin) % len(usable)]
+    metrics.inc('db_read_routing_total', target=replica.name, reason='read_only')
+    return replica.url
+
+
+@contextmanager
+def read_only():
+    """
+    Connections opened in the block go to a replica when one is usable.
+    Also works as a decorator: ``@read_only()``
+    """
+    token = _prefer_replica.set(True)
+    try:
+        yield
+    finally:
+        _prefer_replica.reset(token)
+
+
+# -- wiring -------------------------------------------------------------------
+
+def init_replicas(app):
+    """Start replica checks and track writes for read-your-writes (no-op without replicas)"""
+    if not replicas:
+        return
+
+    @app.after_request
+    def remember_write(response):
+        if request.method in ('GET', 'HEAD', 'OPTIONS') or response.status_code >= 400:
+            return response
+        pin = _signer().sign(f"{time.time() + Config.READ_YOUR_WRITES_SECONDS:.0f}").decode()
+        response.headers[STICKY_HEADER] = pin
+        response.set_cookie(STICKY_COOKIE, pin, max_age=Config.READ_YOUR_WRITES_SECONDS,
+                            httponly=True, secure=request.is_secure,
+                            samesite='None' if request.is_secure else 'Lax')
+        return response
+
+
+def replica_gauges():
+    return [('db_replica_lag_seconds', {'replica': replica.name}, replica.lag)
+            for replica in replicas if replica.lag is not None] + \
+           [('db_replica_usable', {'replica': replica.name}, int(replica.usable)) for replica in replicas]
+
+
+metrics.register_gauges(replica_gauges)
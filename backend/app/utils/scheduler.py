@@ -0,0 +1,207 @@
+"""
+In-app job scheduler.
+
+Every app process starts a daemon thread, but only one process across all
+workers and replicas runs jobs at a time: the leader is whoever holds the
+session-level advisory lock ``SCHEDULER_LOCK_KEY`` on a dedicated
+connection. If the leader dies its connection drops, the lock is released
+and another process takes over on its next poll.
+
+Job timings are stored in ``scheduled_jobs`` so a restarted leader does not
+re-run a job that finished recently. Jobs must be idempotent; they are
+plain callables returning a JSON-serialisable summary.
+"""
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+import psycopg2
+
+from app.config import Config
+from app.utils.database import execute_query
+
+# Arbitrary application-wide key for pg_try_advisory_lock
+SCHEDULER_LOCK_KEY = 0x4E554B01
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Job:
+    name: str
+    interval: int                  # seconds between runs
+    func: Callable[[], object]
+    next_run: float = 0.0
+
+
+class Scheduler:
+    def __init__(self, poll_interval: int = 30):
+        self.poll_interval = poll_interval
+        self.jobs: Dict[str, Job] = {}
+        self._lock_conn = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, name: str, interval: int, func: Callable[[], object]) -> None:
+        self.jobs[name] = Job(name, interval, func)
+
+    # -- leadership ---------------------------------------------------------
+
+    def _is_leader(self) -> bool:
+        """Keep (or try to take) the advisory lock; False if another process holds it."""
+        try:
+            if self._lock_conn is not None:
+                with self._lock_conn.cursor() as cur:
+                    cur.execute("SELECT 1")  # connection still alive => still leader
+                return True
+
+            conn = psycopg2.connect(Config.DATABASE_URL)
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_try_advisory_lock(%s)", (SCHEDULER_LOCK_KEY,))
+                acquired = cur.fetchone()[0]
+            if not acquired:
+                conn.close()
+                return False
+
+            self._lock_conn = conn
+            self._load_last_runs()
+            logger.info("Scheduler: this process is now the leader")
+            return True
+        except psycopg2.Error as e:
+            logger.warning("Scheduler: database unavailable: %s", e)
+            self._release()
+            return False
+
+    def _release(self):
+        if self._lock_conn is not None:
+            try:
+                self._lock_conn.close()  # closing the session releases the lock
+            except psycopg2.Error:
+                pass
+            self._lock_conn = None
+
+    def _load_last_runs(self):
+        """Schedule each job relative to its last recorded finish."""
+        rows = execute_query("""
+            SELECT job_name, EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - last_finished_at)) AS age
+            FROM scheduled_jobs
+            WHERE job_name = ANY(%s) AND last_finished_at IS NOT NULL
+        """, (list(self.jobs),), fetch_all=True) or []
+        ages = {r['job_name']: float(r['age']) for r in rows}
+        now = time.monotonic()
+        for job in self.jobs.values():
+            age = ages.get(job.name)
+            job.next_run = now if age is None else now + max(job.interval - age, 0)
+
+    # -- running ------------------------------------------------------------
+
+    def run_job(self, job: Job) -> None:
+        execute_query("""
+            INSERT INTO scheduled_jobs (job_name, last_started_at)
+            VALUES (%s, CURRENT_TIMESTAMP)
+            ON CONFLICT (job_name) DO UPDATE SET last_started_at = EXCLUDED.last_started_at
+        """, (job.name,))
+
+        started = time.perf_counter()
+        status, error, result = 'ok', None, None
+        try:
+            result = job.func()
+        except Exception as e:
+            status, error = 'error', str(e)
+            logger.exception("Scheduler: job %s failed", job.name)
+        duration_ms = int((time.perf_counter() - started) * 1000)
+
+        execute_query("""
+            UPDATE scheduled_jobs
+            SET last_finished_at = CURRENT_TIMESTAMP, last_status = %s, last_error = %s,
+                last_duration_ms = %s, last_result = %s
+            WHERE job_name = %s
+        """, (status, error, duration_ms, json.dumps(result, default=str), job.name))
+        logger.info("Scheduler: %s %s in %d ms: %s", job.name, status, duration_ms, error or result)
+
+        job.next_run = time.monotonic() + job.interval
+
+    def tick(self) -> None:
+        if not self._is_leader():
+            return
+        for job in sorted(self.jobs.values(), key=lambda j: j.next_run):
+            if self._stop.is_set():
+                return
+            if time.monotonic() >= job.next_run:
+                try:
+                    self.run_job(job)
+                except Exception as e:
+                    # Bookkeeping failed (database down?) - retry on the next poll
+                    logger.warning("Scheduler: could not run %s: %s", job.name, e)
+                    self._release()
+                    return
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.tick()
+            self._stop.wait(self.poll_interval)
+        self._release()
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval)
+
+
+scheduler = Scheduler(poll_interval=Config.SCHEDULER_POLL_SECONDS)
+
+
+def register_default_jobs(target: Scheduler = scheduler) -> None:
+    """Register the library maintenance jobs (heavy modules are imported when a job runs)."""
+    from app.utils.sweeps import sweep_expired_memberships, sweep_overdue_borrowings
+    from app.utils.circulation_stats import refresh_overdue_transitions
+    from app.utils.holds import sweep_expired_holds
+
+    def overdue_job():
+        result = sweep_overdue_borrowings()
+        refresh_overdue_transitions(days=2)
+        return result
+
+    def similarity_job():
+        from app.utils.similarity import rebuild_similarity_index
+        return rebuild_similarity_index()
+
+    def recommendations_job():
+        # Only queued here: the full rebuild would hold up every other job
+        from app.utils.recommendation_jobs import schedule_recompute_all
+        return schedule_recompute_all()
+
+    def media_variants_job():
+        from app.utils.media import sweep_pending_variants
+        return sweep_pending_variants()
+
+    def cover_cache_job():
+        from app.utils.cover_cache import trim
+        return trim()
+
+    target.register('overdue_sweep', Config.OVERDUE_SWEEP_INTERVAL, overdue_job)
+    target.register('membership_expiry_sweep', Config.MEMBERSHIP_SWEEP_INTERVAL, sweep_expired_memberships)
+    target.register('hold_expiry_sweep', Config.HOLD_EXPIRY_SWEEP_INTERVAL, sweep_expired_holds)
+    target.register('similarity_rebuild', Config.SIMILARITY_REBUILD_INTERVAL, similarity_job)
+    target.register('recommendations_nightly', Config.RECOMMENDATIONS_REBUILD_INTERVAL, recommendations_job)
+    target.register('media_variants', Config.MEDIA_VARIANT_SWEEP_INTERVAL, media_variants_job)
+    target.register('cover_cache_trim', Config.COVER_CACHE_TRIM_INTERVAL, cover_cache_job)
+
+
+def start_scheduler() -> None:
+    """Start the scheduler thread in this process if enabled."""
+    if not Config.SCHEDULER_ENABLED:
+        return
+    if not scheduler.jobs:
+        register_default_jobs()
+    scheduler.start()
@@ -1,26 +1,33 @@
 import logging
-from typing import List, Sequence
+from typing import TYPE_CHECKING, List, Sequence
 
 import numpy as np
-from sentence_transformers import SentenceTransformer
 
 from app.utils.database import get_db_cursor
+from app.utils import metrics
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
 
 _MODEL = None
 _MODEL_NAME = "all-MiniLM-L6-v2"
 _EMBED_DIM = 384
 
 
-def get_model() -> SentenceTransformer:
+def get_model() -> "SentenceTransformer":
     global _MODEL
     if _MODEL is None:
+        # Imported on first use: sentence-transformers loads torch (~1-2s)
+        from sentence_transformers import SentenceTransformer
         _MODEL = SentenceTransformer(_MODEL_NAME)
     return _MODEL
 
 
 def embed_texts(texts: Sequence[str]) -> List[List[float]]:
     model = get_model()
-    embeddings = model.encode(list(texts), normalize_embeddings=True)
+    metrics.observe('model_inference_batch_size', len(texts), model=_MODEL_NAME, operation='embed')
+    with metrics.timer('model_inference_seconds', model=_MODEL_NAME, operation='embed'):
+        embeddings = model.encode(list(texts), normalize_embeddings=True)
     if isinstance(embeddings, list):
         return [list(map(float, emb)) for emb in embeddings]
     return [vec.astype(float).tolist() for vec in np.atleast_2d(embeddings)]
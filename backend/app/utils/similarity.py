@@ -0,0 +1,276 @@
+"""
+Item-to-item similarity index for "similar books".
+
+Neighbours are precomputed from borrowing co-occurrence (a sparse
+book x book count matrix, cosine- or Jaccard-normalised), blended with
+embedding similarity from ``book_embeddings`` and pruned to the top-k per
+book. The result lives in ``book_similarity`` so serving "similar books" is a
+single range scan on ``idx_book_similarity_lookup``.
+
+Rebuilds are incremental: only books touched by borrowings newer than the
+watermark in ``book_similarity_state`` (and the books they co-occur with)
+are recomputed, each from every basket it appears in, so their co-borrow counts match a
+full rebuild. Untouched books keep their rows; their scores drift slightly
+as neighbours gain borrowers until the next ``full`` rebuild.
+"""
+import logging
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+from app.config import Config
+from app.utils.database import get_db_cursor
+
+# Each patron's distinct books, most recently borrowed first (the basket cap
+# keeps the head); {patrons} optionally narrows it to some patrons
+_BASKETS_SQL = """
+    SELECT array_agg(book_id ORDER BY last_borrowed DESC) AS books
+    FROM (
+        SELECT br.patron_id, i.book_id, MAX(br.borrowing_id) AS last_borrowed
+        FROM borrowings br
+        JOIN items i ON br.item_id = i.item_id
+        WHERE br.borrowing_id <= %s {patrons}
+        GROUP BY br.patron_id, i.book_id
+    ) loans
+    GROUP BY patron_id
+"""
+
+
+def _co_occurrence(baskets: Iterable[List[int]], index: Dict[int, int],
+                   targets: Optional[np.ndarray]):
+    """
+    Build the sparse co-occurrence matrix as COO arrays (rows, cols, counts).
+
+    Pairs are encoded as ``row * n_books + col`` int64 keys so the whole
+    accumulation is a single ``np.unique`` instead of a Python dict of dicts.
+    When ``targets`` is given only rows for those book indexes are produced.
+    """
+    n_books = len(index)
+    max_basket = Config.SIMILARITY_MAX_BASKET_SIZE
+    chunks = []
+
+    for basket in baskets:
+        idx = np.fromiter((index[b] for b in basket if b in index), dtype=np.int64)
+        if idx.size < 2:
+            continue
+        if idx.size > max_basket:
+            # Very heavy borrowers add little signal and quadratic cost; baskets
+            # come most recent loan first, so this keeps their recent reading
+            idx = idx[:max_basket]
+
+        rows = idx if targets is None else idx[np.isin(idx, targets)]
+        if rows.size == 0:
+            continue
+
+        keys = (rows[:, None] * n_books + idx[None, :]).ravel()
+        diagonal = (rows[:, None] == idx[None, :]).ravel()
+        chunks.append(keys[~diagonal])
+
+    if not chunks:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, empty
+
+    keys, counts = np.unique(np.concatenate(chunks), return_counts=True)
+    return keys // n_books, keys % n_books, counts
+
+
+def _normalise(rows, cols, counts, borrowers):
+    """Turn raw co-borrow counts into cosine or Jaccard similarities."""
+    n_i = borrowers[rows].astype(np.float64)
+    n_j = borrowers[cols].astype(np.float64)
+    c = counts.astype(np.float64)
+
+    if Config.SIMILARITY_METRIC == 'jaccard':
+        return c / np.maximum(n_i + n_j - c, 1.0)
+    return c / np.sqrt(np.maximum(n_i * n_j, 1.0))
+
+
+def parse_embedding(value):
+    """Convert a pgvector value (ndarray or text literal) to a float32 array."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        # pgvector adapter not registered - value comes back as '[0.1,0.2,...]'
+        return np.array([float(v) for v in value.strip('[]').split(',')], dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def load_embedding_matrix(cur, index: Dict[int, int]):
+    """Return an (n_books x dim) unit-norm matrix and a mask of books that have one."""
+    cur.execute("SAVEPOINT load_embeddings")
+    try:
+        cur.execute("SELECT book_id, embedding FROM book_embeddings")
+        rows = cur.fetchall() or []
+    except Exception as exc:
+        # book_embeddings / pgvector missing - callers fall back to other signals
+        logging.warning("Book embeddings unavailable: %s", exc)
+        cur.execute("ROLLBACK TO SAVEPOINT load_embeddings")
+        return None, None
+
+    vectors = {}
+    for row in rows:
+        if row['book_id'] in index:
+            vec = parse_embedding(row['embedding'])
+            if vec is not None:
+                vectors[index[row['book_id']]] = vec
+
+    if not vectors:
+        return None, None
+
+    dim = len(next(iter(vectors.values())))
+    matrix = np.zeros((len(index), dim), dtype=np.float32)
+    mask = np.zeros(len(index), dtype=bool)
+    for i, vec in vectors.items():
+        matrix[i] = vec
+        mask[i] = True
+
+    norms = np.linalg.norm(matrix, axis=1)
+    matrix[mask] /= norms[mask, None]
+    return matrix, mask
+
+
+def _top_neighbours(target, rows, cols, co_scores, co_counts, embeddings, emb_mask, top_k):
+    """Blend co-borrow and embedding scores for one book and keep the top-k."""
+    weight = Config.SIMILARITY_EMBEDDING_WEIGHT
+    start, end = np.searchsorted(rows, [target, target + 1])
+    candidates = {
+        int(c): [float(s), 0.0, int(n)]
+        for c, s, n in zip(cols[start:end], co_scores[start:end], co_counts[start:end])
+    }
+
+    if embeddings is not None and emb_mask[target]:
+        sims = embeddings @ embeddings[target]
+        sims[~emb_mask] = -1.0
+        sims[target] = -1.0
+        pool = min(top_k * 2, sims.size - 1)
+        if pool > 0:
+            nearest = np.argpartition(-sims, pool)[:pool]
+            for c in nearest:
+                if sims[c] > 0:
+                    candidates.setdefault(int(c), [0.0, 0.0, 0])
+        for c, values in candidates.items():
+            values[1] = max(float(sims[c]), 0.0)
+    else:
+        weight = 0.0
+
+    if not candidates:
+        return []
+
+    ids = np.fromiter(candidates.keys(), dtype=np.int64)
+    values = np.array(list(candidates.values()), dtype=np.float64)
+    blended = (1.0 - weight) * values[:, 0] + weight * values[:, 1]
+
+    if ids.size > top_k:
+        keep = np.argpartition(-blended, top_k)[:top_k]
+    else:
+        keep = np.arange(ids.size)
+    keep = keep[np.argsort(-blended[keep])]
+
+    return [(int(ids[k]), float(blended[k]), float(values[k, 0]), float(values[k, 1]), int(values[k, 2]))
+            for k in keep if blended[k] > 0]
+
+
+def rebuild_similarity_index(full: bool = False) -> dict:
+    """
+    Fold new borrowings into ``book_similarity``.
+
+    With ``full=True`` (or on the first run) every active book is recomputed;
+    otherwise only books affected by borrowings after the stored watermark.
+    Returns a small stats dict for logging by the caller.
+    """
+    top_k = Config.SIMILARITY_TOP_K
+
+    with get_db_cursor() as cur:
+        cur.execute("SELECT last_borrowing_id FROM book_similarity_state WHERE state_id = 1 FOR UPDATE")
+        state = cur.fetchone()
+        last_id = state['last_borrowing_id'] if state else 0
+
+        cur.execute("SELECT COALESCE(MAX(borrowing_id), 0) AS max_id FROM borrowings")
+        max_id = cur.fetchone()['max_id']
+
+        full = full or last_id == 0
+        if not full and max_id <= last_id:
+            cur.execute("UPDATE book_similarity_state SET last_run_at = CURRENT_TIMESTAMP WHERE state_id = 1")
+            return {'mode': 'incremental', 'books': 0, 'rows': 0}
+
+        # Global borrower counts per book (the n_i of the normalisation)
+        cur.execute("""
+            SELECT b.book_id, COUNT(DISTINCT br.patron_id) AS borrowers
+            FROM books b
+            LEFT JOIN items i ON i.book_id = b.book_id
+            LEFT JOIN borrowings br ON br.item_id = i.item_id AND br.borrowing_id <= %s
+            WHERE b.is_active = TRUE
+            GROUP BY b.book_id
+            ORDER BY b.book_id
+        """, (max_id,))
+        count_rows = cur.fetchall() or []
+        book_ids = np.array([r['book_id'] for r in count_rows], dtype=np.int64)
+        borrowers = np.array([r['borrowers'] for r in count_rows], dtype=np.int64)
+        index = {int(b): i for i, b in enumerate(book_ids)}
+
+        if full:
+            cur.execute(_BASKETS_SQL.format(patrons=''), (max_id,))
+            baskets = [r['books'] for r in (cur.fetchall() or []) if r['books']]
+            target_idx = np.arange(len(index), dtype=np.int64)
+        else:
+            # Books borrowed since the watermark plus everything co-borrowed with them
+            cur.execute("""
+                SELECT DISTINCT i.book_id
+                FROM borrowings br
+                JOIN items i ON br.item_id = i.item_id
+                WHERE br.patron_id IN (
+                    SELECT patron_id FROM borrowings
+                    WHERE borrowing_id > %s AND borrowing_id <= %s
+                )
+                  AND br.borrowing_id <= %s
+            """, (last_id, max_id, max_id))
+            touched = sorted(index[r['book_id']] for r in (cur.fetchall() or []) if r['book_id'] in index)
+            target_idx = np.array(touched, dtype=np.int64)
+            touched_ids = [int(book_ids[t]) for t in target_idx]
+
+            baskets = []
+            if touched_ids:
+                # Their rows are replaced, so count them over every basket they are in,
+                # not just the baskets of patrons who borrowed since the watermark
+                cur.execute(_BASKETS_SQL.format(patrons="""
+                    AND br.patron_id IN (
+                        SELECT tb.patron_id
+                        FROM borrowings tb
+                        JOIN items ti ON tb.item_id = ti.item_id
+                        WHERE ti.book_id = ANY(%s) AND tb.borrowing_id <= %s
+                    )"""), (max_id, touched_ids, max_id))
+                baskets = [r['books'] for r in (cur.fetchall() or []) if r['books']]
+
+        rows, cols, counts = _co_occurrence(baskets, index, None if full else target_idx)
+        co_scores = _normalise(rows, cols, counts, borrowers)
+        embeddings, emb_mask = load_embedding_matrix(cur, index)
+
+        payload = []
+        for t in target_idx:
+            for c, score, co_score, emb_score, co_count in _top_neighbours(
+                    int(t), rows, cols, co_scores, counts, embeddings, emb_mask, top_k):
+                payload.append((int(book_ids[t]), int(book_ids[c]), score, co_score, emb_score, co_count))
+
+        target_book_ids = [int(book_ids[t]) for t in target_idx]
+        if full:
+            cur.execute("DELETE FROM book_similarity")
+        elif target_book_ids:
+            cur.execute("DELETE FROM book_similarity WHERE book_id = ANY(%s)", (target_book_ids,))
+
+        if payload:
+            execute_values(cur, """
+                INSERT INTO book_similarity
+                (book_id, similar_book_id, score, co_borrow_score, embedding_score, co_borrow_count)
+                VALUES %s
+            """, payload, page_size=1000)
+
+        cur.execute("""
+            UPDATE book_similarity_state
+            SET last_borrowing_id = %s,
+                last_run_at = CURRENT_TIMESTAMP,
+                last_full_rebuild_at = CASE WHEN %s THEN CURRENT_TIMESTAMP ELSE last_full_rebuild_at END
+            WHERE state_id = 1
+        """, (max_id, full))
+
+    return {'mode': 'full' if full else 'incremental', 'books': len(target_book_ids), 'rows': len(payload)}
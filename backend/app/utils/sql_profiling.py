@@ -0,0 +1,176 @@
+"""
+Per-request SQL instrumentation.
+
+Every connection handed out by ``app.utils.database`` creates profiling
+cursors. For a sampled request (``SQL_PROFILE_SAMPLE_RATE``) they record
+each statement's wall time against a ``RequestProfile`` stored in ``g``;
+otherwise they cost one context lookup per ``execute``. Statements run
+outside a request (scheduler, thread pools) are not recorded.
+
+At the end of a sampled request the totals go out as a ``Server-Timing``
+header (visible in the browser's network panel) and one JSON log line on
+the ``app.sql_profile`` logger with the slowest statement and any
+statement repeated ``SQL_PROFILE_REPEAT_THRESHOLD`` or more times - the
+usual sign of a query issued inside a loop (N+1).
+"""
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from functools import lru_cache
+
+import psycopg2.extensions
+from flask import g, has_app_context, request
+from psycopg2.extras import RealDictCursor
+
+from app.config import Config
+
+logger = logging.getLogger('app.sql_profile')
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """Statement text with literals replaced by ? and whitespace collapsed"""
+    return _WHITESPACE.sub(' ', _LITERALS.sub('?', sql)).strip()
+
+
+def _short(sql_fingerprint, width=160):
+    """Log-friendly fingerprint: truncated text plus a stable hash"""
+    digest = hashlib.md5(sql_fingerprint.encode()).hexdigest()[:8]
+    text = sql_fingerprint if len(sql_fingerprint) <= width else sql_fingerprint[:width] + '...'
+    return f"{text} #{digest}"
+
+
+class RequestProfile:
+    """SQL counters for one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.acquires = 0
+        self.acquire_time = 0.0
+        self.counts = Counter()
+        self.slowest = (0.0, None)
+
+    def record(self, sql, elapsed):
+        self.queries += 1
+        self.db_time += elapsed
+        sql_fingerprint = fingerprint(sql)
+        self.counts[sql_fingerprint] += 1
+        if elapsed > self.slowest[0]:
+            self.slowest = (elapsed, sql_fingerprint)
+
+    def record_acquire(self, elapsed):
+        self.acquires += 1
+        self.acquire_time += elapsed
+
+    def repeated(self, threshold):
+        return [(sql_fingerprint, n) for sql_fingerprint, n in self.counts.most_common()
+                if n >= threshold]
+
+    def server_timing(self, total):
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'db-acquire;dur={self.acquire_time * 1000:.1f};desc="{self.acquires} connections"',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+def current_profile():
+    """The sampled request's profile, or None"""
+    if not has_app_context():
+        return None
+    return g.get('sql_profile')
+
+
+def _sql_text(cursor, query):
+    if isinstance(query, str):
+        return query
+    if isinstance(query, bytes):
+        return query.decode(errors='replace')
+    return query.as_string(cursor.connection)  # psycopg2.sql.Composed
+
+
+class _ProfilingMixin:
+    def execute(self, query, vars=None):
+        profile = current_profile()
+        if profile is None:
+            return super().execute(query, vars)
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            profile.record(_sql_text(self, query), time.perf_counter() - started)
+
+    def executemany(self, query, vars_list):
+        profile = current_profile()
+        if profile is None:
+            return super().executemany(query, vars_list)
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            profile.record(_sql_text(self, query), time.perf_counter() - started)
+
+
+class ProfilingCursor(_ProfilingMixin, psycopg2.extensions.cursor):
+    """Tuple rows, as returned by a plain ``conn.cursor()``"""
+
+
+class ProfilingDictCursor(_ProfilingMixin, RealDictCursor):
+    """Dict rows, as returned by ``get_db_cursor()``"""
+
+
+def record_acquire(elapsed):
+    profile = current_profile()
+    if profile is not None:
+        profile.record_acquire(elapsed)
+
+
+def init_sql_profiling(app):
+    """Register the request hooks (no-op unless SQL_PROFILE_SAMPLE_RATE > 0)"""
+    if Config.SQL_PROFILE_SAMPLE_RATE <= 0:
+        return
+
+    if not logger.handlers and not logging.getLogger().handlers:
+        logger.addHandler(logging.StreamHandler())
+    logger.setLevel(logging.INFO)
+
+    @app.before_request
+    def start_sql_profile():
+        if random.random() < Config.SQL_PROFILE_SAMPLE_RATE:
+            g.sql_profile = RequestProfile()
+
+    @app.after_request
+    def finish_sql_profile(response):
+        profile = g.pop('sql_profile', None)
+        if profile is None:
+            return response
+
+        total = time.perf_counter() - profile.started
+        response.headers['Server-Timing'] = profile.server_timing(total)
+
+        slowest_time, slowest_sql = profile.slowest
+        repeated = profile.repeated(Config.SQL_PROFILE_REPEAT_THRESHOLD)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'queries': profile.queries,
+            'db_ms': round(profile.db_time * 1000, 1),
+            'acquire_ms': round(profile.acquire_time * 1000, 1),
+            'slowest_ms': round(slowest_time * 1000, 1),
+            'slowest_sql': _short(slowest_sql) if slowest_sql else None,
+            'repeated': [{'sql': _short(sql_fingerprint), 'count': n}
+                         for sql_fingerprint, n in repeated],
+        }))
+        return response
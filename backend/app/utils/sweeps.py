@@ -0,0 +1,116 @@
+"""
+Set-based maintenance sweeps run by the scheduler.
+
+Each sweep works in batches of ``SWEEP_BATCH_SIZE`` rows, one short
+transaction per batch, claiming rows with ``FOR UPDATE SKIP LOCKED`` so it
+never waits on the circulation desk. Sweeps are idempotent: rows are only
+touched when their stored state is out of date, and notifications are
+queued in the same statement that flips the state, so each event notifies
+exactly once.
+"""
+from app.config import Config
+from app.utils.database import get_db_cursor
+
+
+def _run_batches(query, params=None):
+    """Run a flag-and-notify statement until a batch comes back short."""
+    totals = {'flagged': 0, 'notified': 0}
+    batch_size = Config.SWEEP_BATCH_SIZE
+    while True:
+        with get_db_cursor() as cursor:
+            cursor.execute(query, dict(params or {}, batch_size=batch_size))
+            row = cursor.fetchone()
+        totals['flagged'] += row['flagged']
+        totals['notified'] += row['notified']
+        if row['flagged'] < batch_size:
+            return totals
+
+
+def sweep_overdue_borrowings():
+    """Flag newly overdue loans, notify their patrons, unflag renewed ones."""
+    with get_db_cursor() as cursor:
+        # A renewal may have pushed the due date back out
+        cursor.execute("""
+            UPDATE borrowings
+            SET overdue_since = NULL
+            WHERE status = 'active' AND overdue_since IS NOT NULL AND due_date >= CURRENT_DATE
+        """)
+        cleared = cursor.rowcount
+
+    totals = _run_batches("""
+        WITH due AS (
+            SELECT borrowing_id
+            FROM borrowings
+            WHERE status = 'active' AND overdue_since IS NULL AND due_date < CURRENT_DATE
+            ORDER BY due_date
+            LIMIT %(batch_size)s
+            FOR UPDATE SKIP LOCKED
+        ),
+        flagged AS (
+            UPDATE borrowings br
+            SET overdue_since = br.due_date + 1
+            FROM due
+            WHERE br.borrowing_id = due.borrowing_id
+            RETURNING br.borrowing_id, br.patron_id, br.item_id, br.due_date
+        ),
+        notified AS (
+            INSERT INTO notifications (user_id, notification_type, title, message)
+            SELECT p.user_id, 'overdue',
+                   'Overdue: ' || LEFT(b.title, 200),
+                   'Your loan of "' || b.title || '" was due on '
+                       || TO_CHAR(f.due_date, 'DD Mon YYYY') || '. Please return or renew it.'
+            FROM flagged f
+            JOIN patrons p ON f.patron_id = p.patron_id
+            JOIN items i ON f.item_id = i.item_id
+            JOIN books b ON i.book_id = b.book_id
+            RETURNING 1
+        )
+        SELECT (SELECT COUNT(*) FROM flagged) AS flagged,
+               (SELECT COUNT(*) FROM notified) AS notified
+    """)
+    totals['cleared'] = cleared
+    return totals
+
+
+def sweep_expired_memberships():
+    """Flag patrons whose membership has ended and notify them once."""
+    with get_db_cursor() as cursor:
+        cursor.execute("""
+            UPDATE patrons
+            SET membership_expired_at = NULL
+            WHERE membership_expired_at IS NOT NULL
+              AND (membership_end_date IS NULL OR membership_end_date >= CURRENT_DATE)
+        """)
+        cleared = cursor.rowcount
+
+    totals = _run_batches("""
+        WITH due AS (
+            SELECT patron_id
+            FROM patrons
+            WHERE membership_expired_at IS NULL AND membership_end_date < CURRENT_DATE
+            ORDER BY patron_id
+            LIMIT %(batch_size)s
+            FOR UPDATE SKIP LOCKED
+        ),
+        flagged AS (
+            UPDATE patrons p
+            SET membership_expired_at = CURRENT_TIMESTAMP
+            FROM due
+            WHERE p.patron_id = due.patron_id
+            RETURNING p.user_id, p.membership_end_date
+        ),
+        notified AS (
+            INSERT INTO notifications (user_id, notification_type, title, message)
+            SELECT f.user_id, 'membership_expired', 'Your membership has expired',
+                   'Your library membership ended on ' || TO_CHAR(f.membership_end_date, 'DD Mon YYYY')
+                       || '. Please renew it to keep borrowing.'
+            FROM flagged f
+            JOIN users u ON f.user_id = u.user_id
+            WHERE u.status = 'active'
+            RETURNING 1
+        )
+        SELECT (SELECT COUNT(*) FROM flagged) AS flagged,
+               (SELECT COUNT(*) FROM notified) AS notified
+    """)
+    totals['cleared'] = cleared
+    return totals
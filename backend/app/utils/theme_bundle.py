@@ -0,0 +1,126 @@
+"""
+Website theme bundles.
+
+Theme settings become a minified stylesheet of CSS custom properties
+(``primary_color`` -> ``--primary-color``), and theme plus global settings
+a JSON file. Both are compiled when an admin changes them and stored in
+``website_bundles`` (migration 017) under a hash of their content. The
+public site gets the current URLs from ``/api/website/theme`` and fetches
+``/api/website/assets/theme.<hash>.css`` / ``site.<hash>.json``, which
+never change and are served with ``Cache-Control: immutable`` - so once a
+browser has them, a visit costs no theme query at all.
+
+Bundles are kept in the database rather than on disk so every worker and
+instance serves the same files. The last ``KEEP_BUNDLES`` of each kind are
+kept for pages still referencing an older hash.
+"""
+import hashlib
+import re
+
+from flask import current_app
+
+from app.config import Config
+from app.utils.cache import TTLCache
+from app.utils.database import get_db_cursor
+
+KEEP_BUNDLES = 10
+
+MIMETYPES = {'css': 'text/css', 'json': 'application/json'}
+
+# Global settings that are not site content
+_PRIVATE_FIELDS = {'setting_id', 'created_at', 'updated_at'}
+
+# Characters that would let a setting value escape its declaration
+_UNSAFE_CSS = re.compile(r'[;{}<>\\]')
+
+_bodies = TTLCache(Config.WEBSITE_BUNDLE_CACHE_TTL, name='website_bundles')
+
+
+def _bundles_table_exists(cursor):
+    cursor.execute("SELECT to_regclass('website_bundles') IS NOT NULL AS present")
+    return cursor.fetchone()['present']
+
+
+def compile_bundles(cursor):
+    """{kind: body bytes} for the current theme and global settings"""
+    cursor.execute("SELECT setting_key, setting_value FROM website_theme_settings ORDER BY setting_key")
+    theme = {row['setting_key']: row['setting_value'] for row in cursor.fetchall()
+             if row['setting_value'] is not None}
+    cursor.execute("SELECT * FROM website_global_settings ORDER BY setting_id LIMIT 1")
+    site = cursor.fetchone() or {}
+
+    declarations = ';'.join(f"--{key.replace('_', '-')}:{_UNSAFE_CSS.sub('', str(value)).strip()}"
+                            for key, value in theme.items())
+    settings = {'theme': theme,
+                'site': {key: value for key, value in site.items() if key not in _PRIVATE_FIELDS}}
+    return {
+        'css': f":root{{{declarations}}}\n".encode(),
+        'json': current_app.json.dumps(settings, separators=(',', ':')).encode(),
+    }
+
+
+def content_hash(body):
+    return hashlib.blake2b(body, digest_size=10).hexdigest()
+
+
+def publish_bundles(cursor):
+    """
+    Compile and store the bundles in the caller's transaction; call after
+    every theme or global settings write. No-op before migration 017
+    """
+    if not _bundles_table_exists(cursor):
+        return None
+    published = {}
+    for kind, body in compile_bundles(cursor).items():
+        digest = content_hash(body)
+        cursor.execute("""
+            INSERT INTO website_bundles (content_hash, kind, body, published_at)
+            VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (content_hash) DO UPDATE SET published_at = CURRENT_TIMESTAMP
+        """, (digest, kind, body))
+        cursor.execute("""
+            DELETE FROM website_bundles
+            WHERE kind = %s AND content_hash NOT IN (
+                SELECT content_hash FROM website_bundles
+                WHERE kind = %s ORDER BY published_at DESC LIMIT %s
+            )
+        """, (kind, kind, KEEP_BUNDLES))
+        published[kind] = digest
+    return published
+
+
+def current_hashes():
+    """{kind: content hash} of the bundles to load now"""
+    with get_db_cursor() as cur:
+        if _bundles_table_exists(cur):
+            cur.execute("""
+                SELECT DISTINCT ON (kind) kind, content_hash
+                FROM website_bundles
+                ORDER BY kind, published_at DESC
+            """)
+            hashes = {row['kind']: row['content_hash'] for row in cur.fetchall()}
+            if len(hashes) == len(MIMETYPES):
+                return hashes
+        # Nothing published yet (or no table): the hashes of what would be
+        return {kind: content_hash(body) for kind, body in compile_bundles(cur).items()}
+
+
+def _load(kind, digest):
+    with get_db_cursor() as cur:
+        if _bundles_table_exists(cur):
+            cur.execute("SELECT body FROM website_bundles WHERE content_hash = %s AND kind = %s",
+                        (digest, kind))
+            row = cur.fetchone()
+            if row:
+                return bytes(row['body'])
+        # Not stored: still servable if it is what the settings compile to now
+        body = compile_bundles(cur)[kind]
+        return body if content_hash(body) == digest else None
+
+
+def bundle_body(kind, digest):
+    """Body of a bundle by hash, or None. Bodies never change, so are cached per process"""
+    body = _bodies.get_or_compute((kind, digest), lambda: _load(kind, digest))
+    if body is None:
+        _bodies.invalidate((kind, digest))
+    return body
@@ -0,0 +1,97 @@
+"""
+Website CMS page trees.
+
+A page, its sections and each section's content blocks and cards are
+assembled by Postgres in one statement (nested ``json_agg``), however many
+sections the page has.
+
+Published pages are also kept rendered - encoded JSON, ready to send - per
+slug, tagged with the ``website`` content version (migration 016). Every
+write to a website table bumps that version, so a cached body is reused
+until something on the site changes, and public page loads only read
+``content_versions``.
+"""
+from flask import current_app
+
+from app.config import Config
+from app.utils.cache import TTLCache
+from app.utils.database import get_db_cursor
+from app.utils.http_cache import content_versions
+
+# Nested rows are serialized by Postgres, not the JSON provider: stamp their
+# naive timestamps as UTC the way the provider does for the page's own
+_STAMPS = ("'created_at', to_char({t}.created_at, 'YYYY-MM-DD\"T\"HH24:MI:SS.US\"+00:00\"'), "
+           "'updated_at', to_char({t}.updated_at, 'YYYY-MM-DD\"T\"HH24:MI:SS.US\"+00:00\"')")
+
+# The visible_* slots limit sections, blocks and cards to visible ones on the public site
+_PAGE_TREE_SQL = """
+    SELECT p.*, u.name AS creator_name,
+           COALESCE((
+               SELECT json_agg(to_jsonb(s) || jsonb_build_object(
+                          {stamps_s},
+                          'content_blocks', COALESCE((
+                              SELECT json_agg(to_jsonb(b) || jsonb_build_object({stamps_b})
+                                              ORDER BY b.display_order)
+                              FROM website_content_blocks b
+                              WHERE b.section_id = s.section_id {visible_b}
+                          ), '[]'::json),
+                          'cards', COALESCE((
+                              SELECT json_agg(to_jsonb(c) || jsonb_build_object({stamps_c})
+                                              ORDER BY c.display_order)
+                              FROM website_cards c
+                              WHERE c.section_id = s.section_id {visible_c}
+                          ), '[]'::json)
+                      ) ORDER BY s.display_order)
+               FROM website_sections s
+               WHERE s.page_id = p.page_id {visible_s}
+           ), '[]'::json) AS sections
+    FROM website_pages p
+    LEFT JOIN users u ON p.created_by = u.user_id
+    WHERE {where}
+"""
+_STAMP_SLOTS = {f'stamps_{t}': _STAMPS.format(t=t) for t in 'sbc'}
+
+_ADMIN_PAGE_SQL = _PAGE_TREE_SQL.format(**_STAMP_SLOTS, visible_b='', visible_c='', visible_s='',
+                                        where='p.page_id = %s')
+_PUBLISHED_PAGE_SQL = _PAGE_TREE_SQL.format(**_STAMP_SLOTS, visible_b='AND b.is_visible',
+                                            visible_c='AND c.is_visible', visible_s='AND s.is_visible',
+                                            where='p.page_slug = %s AND p.is_published')
+
+_rendered = TTLCache(Config.WEBSITE_PAGE_CACHE_TTL, name='website_pages')
+
+
+def load_page(cursor, page_id):
+    """Page with all its sections, content blocks and cards (for the editor), or None"""
+    cursor.execute(_ADMIN_PAGE_SQL, (page_id,))
+    return cursor.fetchone()
+
+
+def _render(slug):
+    with get_db_cursor() as cur:
+        cur.execute(_PUBLISHED_PAGE_SQL, (slug,))
+        page = cur.fetchone()
+    if page is None:
+        return None
+    page.pop('created_by', None)
+    page.pop('creator_name', None)
+    return current_app.json.dumps({'success': True, 'page': page})
+
+
+def rendered_page(slug, versions=None):
+    """
+    JSON body for a published page, or None; cached until the site changes.
+    ``versions`` is the content_versions snapshot when the caller has one
+    """
+    if versions is None:
+        versions = content_versions()
+    if versions is None:  # migration 016 not applied: nothing to key on
+        return _render(slug)
+
+    version = versions.get('website', 0)
+    cached = _rendered.get_or_compute(slug, lambda: (version, _render(slug)))
+    if cached[0] != version:
+        _rendered.invalidate(slug)
+        cached = _rendered.get_or_compute(slug, lambda: (version, _render(slug)))
+    if cached[1] is None:
+        _rendered.invalidate(slug)  # don't hold an entry for every slug ever requested
+    return cached[1]
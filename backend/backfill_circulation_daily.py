@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""Backfill the daily circulation rollup (circulation_daily)
+
+The borrowing routes keep the rollup current; run this once after applying
+migration 011, and daily (e.g. Railway cron) with --overdue-only to record
+borrowings that became overdue:
+
+    python backfill_circulation_daily.py                        # all history
+    python backfill_circulation_daily.py --start 2024-01-01 --end 2024-12-31
+    python backfill_circulation_daily.py --overdue-only --days 7
+"""
+import argparse
+import os
+import sys
+from datetime import date, datetime
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.utils.database import execute_query
+from app.utils.circulation_stats import rebuild_circulation_daily, refresh_overdue_transitions
+
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--start', type=parse_date, help='First day to rebuild (default: first checkout)')
+    parser.add_argument('--end', type=parse_date, help='Last day to rebuild (default: today)')
+    parser.add_argument('--overdue-only', action='store_true', help='Only recount overdue transitions')
+    parser.add_argument('--days', type=int, default=7, help='Days to recount with --overdue-only')
+    args = parser.parse_args()
+
+    if args.overdue_only:
+        refresh_overdue_transitions(args.days)
+        print(f"✓ Overdue transitions recounted for the last {args.days} days")
+        return
+
+    start = args.start
+    if start is None:
+        first = execute_query("SELECT MIN(checkout_date) AS first_day FROM borrowings", fetch_one=True)
+        start = first['first_day'] if first and first['first_day'] else date.today()
+    end = args.end or date.today()
+
+    rows = rebuild_circulation_daily(start, end)
+    print(f"✓ Rebuilt circulation_daily for {start} to {end} ({rows} rows)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""Backfill time-decayed popularity scores (book_popularity)
+
+Checkouts keep the scores current on their own; run this once after applying
+migration 010, and again whenever POPULARITY_HALF_LIFE_DAYS is changed:
+
+    python backfill_popularity.py
+"""
+import argparse
+import os
+import sys
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.config import Config
+from app.utils.popularity import rebuild_popularity
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.parse_args()
+
+    rows = rebuild_popularity()
+    print(f"✓ Rebuilt {rows} popularity rows "
+          f"(half-life {Config.POPULARITY_HALF_LIFE_DAYS:g} days, windows 7/30/365)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""Concurrent checkout stress test for the atomic checkout_item() function
+
+Creates a throwaway set of patrons, a book and items (ids prefixed BENCH),
+hammers them from many threads - half the attempts aim at a handful of "hot"
+items - with random returns mixed in, then checks the invariants the desk
+relies on and removes the fixtures:
+
+  * no item has more than one active borrowing
+  * no patron has more active borrowings than their limit
+  * every item with an active borrowing is checked_out, every other is available
+
+With migration 012 applied, the unique index uq_borrowings_active_item
+turns the legacy flow's double issues into unique violations (reported as
+db_error:23505); run --legacy on a copy without that index to see the
+pre-012 behaviour. Run against a local/staging database, never production:
+
+    python benchmarks/checkout_stress.py --threads 32 --duration 20
+    python benchmarks/checkout_stress.py --legacy   # the old check-then-insert flow
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from app.config import Config
+from app.utils.circulation import checkout_item
+
+PREFIX = 'BENCH'
+DEFAULT_LIMIT = 3  # patrons are created without a plan
+
+
+def connect():
+    return psycopg2.connect(Config.DATABASE_URL, cursor_factory=RealDictCursor)
+
+
+def setup(n_patrons, n_items):
+    with connect() as conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO books (title, is_active) VALUES ('Checkout stress test', TRUE)
+            RETURNING book_id
+        """)
+        book_id = cur.fetchone()['book_id']
+
+        patron_ids = []
+        for n in range(n_patrons):
+            patron_id = f"{PREFIX}{os.getpid()}{n:04d}"
+            cur.execute("""
+                INSERT INTO users (email, password_hash, role, status, name)
+                VALUES (%s, 'x', 'patron', 'active', %s)
+                RETURNING user_id
+            """, (f"{patron_id.lower()}@bench.invalid", patron_id))
+            cur.execute("""
+                INSERT INTO patrons (patron_id, user_id, first_name, last_name)
+                VALUES (%s, %s, 'Bench', %s)
+            """, (patron_id, cur.fetchone()['user_id'], patron_id))
+            patron_ids.append(patron_id)
+
+        cur.execute("""
+            INSERT INTO items (book_id, barcode, circulation_status)
+            SELECT %s, %s || '-' || n, 'available'
+            FROM generate_series(1, %s) AS n
+            RETURNING item_id
+        """, (book_id, f"{PREFIX}{os.getpid()}", n_items))
+        item_ids = [r['item_id'] for r in cur.fetchall()]
+
+    return book_id, patron_ids, item_ids
+
+
+def teardown(book_id, patron_ids):
+    with connect() as conn, conn.cursor() as cur:
+        cur.execute("""
+            DELETE FROM borrowings
+            WHERE item_id IN (SELECT item_id FROM items WHERE book_id = %s)
+        """, (book_id,))
+        cur.execute("DELETE FROM items WHERE book_id = %s", (book_id,))
+        cur.execute("DELETE FROM books WHERE book_id = %s", (book_id,))
+        cur.execute("SELECT user_id FROM patrons WHERE patron_id = ANY(%s)", (patron_ids,))
+        user_ids = [r['user_id'] for r in cur.fetchall()]
+        cur.execute("DELETE FROM patrons WHERE patron_id = ANY(%s)", (patron_ids,))
+        cur.execute("DELETE FROM users WHERE user_id = ANY(%s)", (user_ids,))
+
+
+def legacy_checkout(cur, patron_id, item_id):
+    """The pre-012 issue flow: three unlocked reads, then an insert"""
+    cur.execute("SELECT circulation_status FROM items WHERE item_id = %s", (item_id,))
+    if cur.fetchone()['circulation_status'] != 'available':
+        return {'outcome': 'item_unavailable'}
+    cur.execute("""
+        SELECT u.status, mp.borrowing_limit
+        FROM patrons p
+        JOIN users u ON p.user_id = u.user_id
+        LEFT JOIN membership_plans mp ON p.membership_plan_id = mp.plan_id
+        WHERE p.patron_id = %s
+    """, (patron_id,))
+    limit = cur.fetchone()['borrowing_limit'] or DEFAULT_LIMIT
+    cur.execute("SELECT COUNT(*) AS n FROM borrowings WHERE patron_id = %s AND status = 'active'",
+                (patron_id,))
+    if cur.fetchone()['n'] >= limit:
+        return {'outcome': 'limit_reached'}
+    checkout_date = date.today()
+    cur.execute("""
+        INSERT INTO borrowings (patron_id, item_id, checkout_date, due_date, status)
+        VALUES (%s, %s, %s, %s, 'active')
+    """, (patron_id, item_id, checkout_date, checkout_date + timedelta(days=14)))
+    return {'outcome': 'issued'}
+
+
+def worker(args, patron_ids, item_ids, hot_items, deadline, stats, lock):
+    rng = random.Random()
+    outcomes, latencies = Counter(), []
+    conn = connect()
+    try:
+        while time.monotonic() < deadline:
+            patron_id = rng.choice(patron_ids)
+            item_id = rng.choice(hot_items if rng.random() < 0.5 else item_ids)
+
+            started = time.perf_counter()
+            try:
+                with conn.cursor() as cur:
+                    if rng.random() < args.return_rate:
+                        cur.execute("""
+                            UPDATE borrowings SET status = 'returned', return_date = CURRENT_DATE
+                            WHERE borrowing_id = (
+                                SELECT borrowing_id FROM borrowings
+                                WHERE patron_id = %s AND status = 'active'
+                                LIMIT 1 FOR UPDATE SKIP LOCKED
+                            )
+                        """, (patron_id,))
+                        outcome = 'returned' if cur.rowcount else 'nothing_to_return'
+                    elif args.legacy:
+                        outcome = legacy_checkout(cur, patron_id, item_id)['outcome']
+                    else:
+                        outcome = checkout_item(cur, patron_id, item_id)['outcome']
+                conn.commit()
+            except psycopg2.Error as e:
+                conn.rollback()
+                outcome = f"db_error:{e.pgcode}"
+            latencies.append(time.perf_counter() - started)
+            outcomes[outcome] += 1
+    finally:
+        conn.close()
+
+    with lock:
+        stats['outcomes'].update(outcomes)
+        stats['latencies'].extend(latencies)
+
+
+def check_invariants(book_id):
+    with connect() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT COUNT(*) AS n FROM (
+                SELECT br.item_id FROM borrowings br
+                JOIN items i ON br.item_id = i.item_id
+                WHERE i.book_id = %s AND br.status = 'active'
+                GROUP BY br.item_id HAVING COUNT(*) > 1
+            ) x
+        """, (book_id,))
+        double_issued = cur.fetchone()['n']
+
+        cur.execute("""
+            SELECT COUNT(*) AS n FROM (
+                SELECT br.patron_id FROM borrowings br
+                JOIN items i ON br.item_id = i.item_id
+                JOIN patrons p ON br.patron_id = p.patron_id
+                LEFT JOIN membership_plans mp ON p.membership_plan_id = mp.plan_id
+                WHERE i.book_id = %s AND br.status = 'active'
+                GROUP BY br.patron_id, mp.borrowing_limit
+                HAVING COUNT(*) > COALESCE(mp.borrowing_limit, %s)
+            ) x
+        """, (book_id, DEFAULT_LIMIT))
+        over_limit = cur.fetchone()['n']
+
+        cur.execute("""
+            SELECT COUNT(*) AS n
+            FROM items i
+            WHERE i.book_id = %s
+              AND (i.circulation_status = 'checked_out') <> EXISTS (
+                  SELECT 1 FROM borrowings br WHERE br.item_id = i.item_id AND br.status = 'active')
+        """, (book_id,))
+        status_mismatch = cur.fetchone()['n']
+
+    return {'double_issued_items': double_issued,
+            'patrons_over_limit': over_limit,
+            'item_status_mismatches': status_mismatch}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds to run')
+    parser.add_argument('--patrons', type=int, default=20)
+    parser.add_argument('--items', type=int, default=200)
+    parser.add_argument('--hot-items', type=int, default=5, help='Items half of all attempts target')
+    parser.add_argument('--return-rate', type=float, default=0.3, help='Share of operations that are returns')
+    parser.add_argument('--legacy', action='store_true', help='Use the old unlocked check-then-insert flow')
+    parser.add_argument('--keep', action='store_true', help='Leave the fixtures in place')
+    args = parser.parse_args()
+
+    book_id, patron_ids, item_ids = setup(args.patrons, args.items)
+    hot_items = item_ids[:args.hot_items]
+    stats, lock = {'outcomes': Counter(), 'latencies': []}, threading.Lock()
+
+    try:
+        deadline = time.monotonic() + args.duration
+        started = time.monotonic()
+        threads = [threading.Thread(target=worker,
+                                    args=(args, patron_ids, item_ids, hot_items, deadline, stats, lock))
+                   for _ in range(args.threads)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.monotonic() - started
+
+        anomalies = check_invariants(book_id)
+    finally:
+        if not args.keep:
+            teardown(book_id, patron_ids)
+
+    outcomes, latencies = stats['outcomes'], sorted(stats['latencies'])
+    total = sum(outcomes.values())
+    print(f"Mode: {'legacy check-then-insert' if args.legacy else 'checkout_item()'}, "
+          f"{args.threads} threads, {elapsed:.1f}s")
+    print(f"Operations: {total} ({total / elapsed:.0f}/s), "
+          f"issued: {outcomes['issued']} ({outcomes['issued'] / elapsed:.0f}/s)")
+    for outcome, count in outcomes.most_common():
+        print(f"  {outcome:<20} {count}")
+    if latencies:
+        print(f"Latency ms: p50 {statistics.median(latencies) * 1000:.1f}  "
+              f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}  "
+              f"max {latencies[-1] * 1000:.1f}")
+    for name, count in anomalies.items():
+        print(f"{'✓' if count == 0 else '✗'} {name}: {count}")
+
+    sys.exit(0 if not any(anomalies.values()) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""EXPLAIN (ANALYZE, BUFFERS) of the circulation queries before/after migration 015
+
+Seeds a synthetic dataset (ids and titles prefixed BENCH) - by default 1M
+borrowings over 50k items and 20k patrons, ~10% of items on loan - then
+runs the queries behind each circulation endpoint twice, each time inside
+a transaction that is rolled back afterwards:
+
+  * before: the 015 indexes dropped, the old single-column ones in place
+  * after:  the 015 indexes in place (built non-concurrently if missing)
+
+and reports the median execution time and buffers touched per query.
+Index changes take ACCESS EXCLUSIVE locks while a transaction is open, so
+run this against a local/staging database, never production:
+
+    python benchmarks/circulation_explain.py
+    python benchmarks/circulation_explain.py --borrowings 200000 --keep
+    python benchmarks/circulation_explain.py --no-seed --plans   # reuse kept data
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import time
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from app.config import Config
+from migrate import MIGRATIONS_DIR, split_statements
+
+PREFIX = 'BENCH'
+MIGRATION = '015_circulation_indexes.sql'
+
+# The borrowings/items indexes the hot paths used before 015
+LEGACY_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_borrowings_patron_id ON borrowings(patron_id)",
+    "CREATE INDEX IF NOT EXISTS idx_borrowings_item_id ON borrowings(item_id)",
+    "CREATE INDEX IF NOT EXISTS idx_borrowings_status ON borrowings(status)",
+    "CREATE INDEX IF NOT EXISTS idx_borrowings_due_date ON borrowings(due_date)",
+]
+
+# (endpoint, description, sql) - parameters come from sample_params()
+QUERIES = [
+    ('POST /borrowings/issue', 'borrowing limit check', """
+        SELECT COUNT(*) FROM borrowings
+        WHERE patron_id = %(patron_id)s AND status = 'active'
+    """),
+    ('POST /borrowings/return-batch', 'active loans for scanned items', """
+        SELECT borrowing_id, item_id, patron_id, due_date FROM borrowings
+        WHERE item_id = ANY(%(item_ids)s) AND status = 'active'
+    """),
+    ('GET /patron/my-borrowings', 'active loans of one patron', """
+        SELECT br.*, b.title, i.barcode
+        FROM borrowings br
+        JOIN items i ON br.item_id = i.item_id
+        JOIN books b ON i.book_id = b.book_id
+        WHERE br.patron_id = %(patron_id)s AND br.status = 'active'
+        ORDER BY br.checkout_date DESC
+    """),
+    ('GET /borrowings/overdue', 'flagged overdue loans', """
+        SELECT br.borrowing_id, br.due_date, i.barcode, p.patron_id
+        FROM borrowings br
+        JOIN items i ON br.item_id = i.item_id
+        JOIN patrons p ON br.patron_id = p.patron_id
+        WHERE br.status = 'active' AND br.overdue_since IS NOT NULL
+        ORDER BY br.due_date ASC
+    """),
+    ('GET /dashboard/overdue-books', 'active and past due', """
+        SELECT br.borrowing_id, br.due_date, br.patron_id, br.item_id
+        FROM borrowings br
+        WHERE br.status = 'active' AND br.due_date < CURRENT_DATE
+        ORDER BY br.due_date ASC
+    """),
+    ('GET /borrowings/history?patron_id', 'patron history', """
+        SELECT br.*, b.title, i.barcode
+        FROM borrowings br
+        JOIN items i ON br.item_id = i.item_id
+        JOIN books b ON i.book_id = b.book_id
+        WHERE br.patron_id = %(patron_id)s
+        ORDER BY br.checkout_date DESC
+        LIMIT 50
+    """),
+    ('GET /borrowings/history?item_id', 'item history', """
+        SELECT br.*, p.first_name, p.last_name
+        FROM borrowings br
+        JOIN patrons p ON br.patron_id = p.patron_id
+        WHERE br.item_id = %(item_id)s
+        ORDER BY br.checkout_date DESC
+        LIMIT 50
+    """),
+    ('GET /borrowings/history?book_id', 'title history', """
+        SELECT br.*, i.barcode
+        FROM borrowings br
+        JOIN items i ON br.item_id = i.item_id
+        WHERE i.book_id = %(book_id)s
+        ORDER BY br.checkout_date DESC
+        LIMIT 50
+    """),
+    ('GET /dashboard/recent-activity', 'latest loans', """
+        SELECT br.borrowing_id, br.checkout_date, b.title, i.barcode, p.patron_id
+        FROM borrowings br
+        JOIN items i ON br.item_id = i.item_id
+        JOIN books b ON i.book_id = b.book_id
+        JOIN patrons p ON br.patron_id = p.patron_id
+        ORDER BY br.checkout_date DESC
+        LIMIT 20
+    """),
+    ('POST /patron/books/<id>/hold', 'copy on the shelf?', """
+        SELECT EXISTS (SELECT 1 FROM items
+                       WHERE book_id = %(book_id)s AND circulation_status = 'available')
+    """),
+    ('GET /borrowings/stats', 'whole-table counts', """
+        SELECT COUNT(*) FILTER (WHERE status = 'active'),
+               COUNT(*) FILTER (WHERE status = 'active' AND overdue_since IS NOT NULL),
+               COUNT(*) FILTER (WHERE status = 'returned')
+        FROM borrowings
+    """),
+]
+
+
+def connect():
+    return psycopg2.connect(Config.DATABASE_URL, cursor_factory=RealDictCursor)
+
+
+def seed(conn, n_books, n_items, n_patrons, n_borrowings, active_share):
+    """Insert the synthetic catalogue, patrons and loan history"""
+    with conn.cursor() as cur:
+        started = time.time()
+        cur.execute("""
+            INSERT INTO books (title, is_active)
+            SELECT %s || ' book ' || n, TRUE FROM generate_series(1, %s) n
+        """, (PREFIX, n_books))
+        cur.execute("""
+            INSERT INTO items (book_id, barcode, circulation_status)
+            SELECT b.book_id, %s || '-' || b.book_id || '-' || c, 'available'
+            FROM books b, generate_series(1, CEIL(%s::numeric / %s)::int) c
+            WHERE b.title LIKE %s
+            LIMIT %s
+        """, (PREFIX, n_items, n_books, f"{PREFIX} book %", n_items))
+        cur.execute("""
+            WITH u AS (
+                INSERT INTO users (email, password_hash, role, status, name)
+                SELECT 'bench' || n || '@bench.invalid', 'x', 'patron', 'active', %s || n
+                FROM generate_series(1, %s) n
+                RETURNING user_id, name
+            )
+            INSERT INTO patrons (patron_id, user_id, first_name, last_name)
+            SELECT UPPER(name), user_id, 'Bench', name FROM u
+        """, (PREFIX, n_patrons))
+
+        # Loan history: all returned, spread over three years
+        cur.execute("""
+            CREATE TEMP TABLE bench_items AS
+                SELECT ROW_NUMBER() OVER (ORDER BY item_id) AS n, item_id
+                FROM items WHERE barcode LIKE %s;
+            CREATE TEMP TABLE bench_patrons AS
+                SELECT ROW_NUMBER() OVER (ORDER BY patron_id) AS n, patron_id
+                FROM patrons WHERE patron_id LIKE %s;
+        """, (f"{PREFIX}-%", f"{PREFIX}%"))
+        cur.execute("""
+            INSERT INTO borrowings (patron_id, item_id, checkout_date, due_date, return_date, status)
+            SELECT p.patron_id, i.item_id, d.checkout_date, d.checkout_date + 14,
+                   d.checkout_date + (random() * 20)::int, 'returned'
+            FROM (
+                SELECT CURRENT_DATE - 30 - (random() * 1095)::int AS checkout_date,
+                       1 + (random() * (%(items)s - 1))::int AS item_n,
+                       1 + (random() * (%(patrons)s - 1))::int AS patron_n
+                FROM generate_series(1, %(n)s)
+            ) d
+            JOIN bench_items i ON i.n = d.item_n
+            JOIN bench_patrons p ON p.n = d.patron_n
+        """, {'n': n_borrowings, 'items': n_items, 'patrons': n_patrons})
+
+        # Current loans: one per item for the first share of items, a
+        # fifth of them overdue (and flagged, as the scheduler would)
+        cur.execute("""
+            INSERT INTO borrowings (patron_id, item_id, checkout_date, due_date, status, overdue_since)
+            SELECT p.patron_id, d.item_id, d.checkout_date, d.checkout_date + 14, 'active',
+                   CASE WHEN d.checkout_date + 14 < CURRENT_DATE THEN d.checkout_date + 15 END
+            FROM (
+                SELECT n, item_id,
+                       CURRENT_DATE - (CASE WHEN random() < 0.2 THEN 15 + random() * 30
+                                            ELSE random() * 13 END)::int AS checkout_date
+                FROM bench_items
+                WHERE n <= %(active)s
+            ) d
+            JOIN bench_patrons p ON p.n = 1 + (d.n %% %(patrons)s)
+        """, {'patrons': n_patrons, 'active': int(n_items * active_share)})
+        cur.execute("ANALYZE borrowings; ANALYZE items; ANALYZE patrons; ANALYZE books")
+    conn.commit()
+    print(f"✓ Seeded {n_borrowings:,} returned + {int(n_items * active_share):,} active borrowings "
+          f"in {time.time() - started:.0f}s")
+
+
+def teardown(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            DELETE FROM borrowings WHERE item_id IN (SELECT item_id FROM items WHERE barcode LIKE %s)
+        """, (f"{PREFIX}-%",))
+        cur.execute("DELETE FROM items WHERE barcode LIKE %s", (f"{PREFIX}-%",))
+        cur.execute("DELETE FROM books WHERE title LIKE %s", (f"{PREFIX} book %",))
+        cur.execute("""
+            WITH p AS (DELETE FROM patrons WHERE patron_id LIKE %s RETURNING user_id)
+            DELETE FROM users WHERE user_id IN (SELECT user_id FROM p)
+        """, (f"{PREFIX}%",))
+    conn.commit()
+
+
+def sample_params(conn):
+    """Pick a busy patron, an on-loan item and its title from the fixtures"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT br.patron_id, br.item_id, i.book_id
+            FROM borrowings br
+            JOIN items i ON br.item_id = i.item_id
+            WHERE br.status = 'active' AND i.barcode LIKE %s
+            LIMIT 1
+        """, (f"{PREFIX}-%",))
+        row = cur.fetchone()
+        if not row:
+            sys.exit("No BENCH fixtures found - run without --no-seed")
+        cur.execute("""
+            SELECT ARRAY_AGG(item_id) AS item_ids FROM (
+                SELECT item_id FROM borrowings WHERE status = 'active' LIMIT 25
+            ) x
+        """)
+        return dict(row, item_ids=cur.fetchone()['item_ids'])
+
+
+def index_statements():
+    """015's index DDL, made transaction-safe"""
+    with open(os.path.join(MIGRATIONS_DIR, MIGRATION)) as f:
+        statements = split_statements(f.read())
+    ddl = [re.sub(r'\s+CONCURRENTLY\b', '', s) for s in statements if not s.upper().startswith('COMMENT')]
+    created = [re.search(r'EXISTS\s+(\w+)', s).group(1) for s in ddl if s.upper().startswith('CREATE')]
+    return ddl, created
+
+
+def measure(conn, setup, params, runs, show_plans=False):
+    """Run every query ``runs`` times under ``setup`` DDL, then roll back"""
+    results = {}
+    try:
+        with conn.cursor() as cur:
+            for statement in setup:
+                cur.execute(statement)
+            cur.execute("ANALYZE borrowings; ANALYZE items")
+
+            for endpoint, _, sql in QUERIES:
+                timings, buffers, node = [], 0, None
+                for _ in range(runs + 1):  # first run warms the cache
+                    cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, params)
+                    plan = cur.fetchone()['QUERY PLAN'][0]
+                    timings.append(plan['Execution Time'])
+                    root = plan['Plan']
+                    buffers = root.get('Shared Hit Blocks', 0) + root.get('Shared Read Blocks', 0)
+                    node = _access_paths(root)
+                results[endpoint] = (statistics.median(timings[1:]), buffers, node)
+
+                if show_plans:
+                    cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + sql, params)
+                    print(f"\n-- {endpoint}")
+                    print('\n'.join(r['QUERY PLAN'] for r in cur.fetchall()))
+    finally:
+        conn.rollback()
+    return results
+
+
+def _access_paths(node):
+    """How borrowings/items were read, e.g. 'Index Only Scan idx_borrowings_active_patron'"""
+    paths = []
+    if node.get('Relation Name') in ('borrowings', 'items'):
+        paths.append(f"{node['Node Type']} {node.get('Index Name', node['Relation Name'])}")
+    for child in node.get('Plans', []):
+        paths.extend(_access_paths(child))
+    return ', '.join(paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--borrowings', type=int, default=1_000_000)
+    parser.add_argument('--items', type=int, default=50_000)
+    parser.add_argument('--books', type=int, default=20_000)
+    parser.add_argument('--patrons', type=int, default=20_000)
+    parser.add_argument('--active-share', type=float, default=0.1, help='Share of items on loan')
+    parser.add_argument('--runs', type=int, default=5, help='Measured runs per query')
+    parser.add_argument('--no-seed', action='store_true', help='Reuse fixtures left by --keep')
+    parser.add_argument('--keep', action='store_true', help='Leave the fixtures in place')
+    parser.add_argument('--plans', action='store_true', help='Print the "after" plans')
+    args = parser.parse_args()
+
+    conn = connect()
+    try:
+        if not args.no_seed:
+            seed(conn, args.books, args.items, args.patrons, args.borrowings, args.active_share)
+        params = sample_params(conn)
+
+        ddl, created = index_statements()
+        before = measure(conn, [f"DROP INDEX IF EXISTS {name}" for name in created] + LEGACY_INDEXES,
+                         params, args.runs)
+        after = measure(conn, ddl, params, args.runs, show_plans=args.plans)
+    finally:
+        if not args.keep and not args.no_seed:
+            teardown(conn)
+        conn.close()
+
+    print(f"\n{'endpoint':<34} {'before ms':>10} {'after ms':>10} {'speedup':>8} "
+          f"{'buffers':>15}  access path (after)")
+    for endpoint, description, _ in QUERIES:
+        b_ms, b_buf, _ = before[endpoint]
+        a_ms, a_buf, path = after[endpoint]
+        speedup = b_ms / a_ms if a_ms else float('inf')
+        print(f"{endpoint:<34} {b_ms:>10.2f} {a_ms:>10.2f} {speedup:>7.1f}x "
+              f"{b_buf:>7}->{a_buf:<7}  {path}")
+    print(json.dumps({'params': {k: v for k, v in params.items() if k != 'item_ids'}}, default=str))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""Cover cache against a local stub image server
+
+Starts a stub cover provider on 127.0.0.1 - JPEG covers of about the size
+Open Library's -L covers come in, each served after --delay seconds like a
+slow provider - and puts one catalogue grid of --books covers through
+app/utils/cover_cache.py in a temporary COVER_CACHE_ROOT:
+
+  * remote:  every cover fetched from the provider (what clients did)
+  * cold:    first catalogue view, covers fetched and thumbnailed
+  * warm:    later views, thumbnails read from local disk
+
+then checks the LRU cap (a cache capped at half the grid keeps the most
+recently used covers), that redirects are followed only to allowed hosts
+- including a subdomain of an allowed ".domain", the way Open Library
+redirects to archive.org - and only MAX_REDIRECTS times, that a large JPEG still yields full-width
+thumbnails, and that a failing provider is not retried on every request.
+Exits non-zero if a check fails. No database is needed:
+
+    python benchmarks/cover_cache.py
+    python benchmarks/cover_cache.py --books 100 --delay 0.2
+"""
+import argparse
+import io
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Before app.config is imported: the stub is the only allowed cover host,
+# also reachable as any subdomain of archive.test
+os.environ['COVER_ALLOWED_HOSTS'] = '127.0.0.1,.archive.test'
+os.environ['COVER_CACHE_ROOT'] = tempfile.mkdtemp(prefix='cover-cache-')
+
+_getaddrinfo = socket.getaddrinfo
+
+
+def _stub_dns(host, *args, **kwargs):
+    """*.archive.test (and look-alikes) resolve to the stub"""
+    if isinstance(host, str) and host.endswith('archive.test'):
+        host = '127.0.0.1'
+    return _getaddrinfo(host, *args, **kwargs)
+
+
+socket.getaddrinfo = _stub_dns
+
+from PIL import Image
+
+from app.config import Config
+from app.utils import cover_cache
+
+
+def make_cover(number, width=600, height=900):
+    image = Image.new('RGB', (width, height), ((number * 37) % 256, (number * 91) % 256, 160))
+    for y in range(0, height, 40):
+        image.paste((255, 255, 255), (40, y, width - 40, y + 8))
+    body = io.BytesIO()
+    image.save(body, 'JPEG', quality=90)
+    return body.getvalue()
+
+
+def start_stub(delay):
+    covers = {}
+    state = {'requests': 0, 'failing': False}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            state['requests'] += 1
+            time.sleep(delay)
+            kind, name = self.path.strip('/').split('/')[0], self.path.rsplit('/', 1)[-1]
+            number = int(name.split('-')[0])
+            # /redirect/N -> the cover (relative), /archive/N -> a storage node
+            # under an allowed ".domain", /offsite/N -> a host that isn't allowed
+            # (localhost), /lookalike/N -> a host that only ends like one, /loop/N -> itself
+            port = self.server.server_port
+            redirects = {'redirect': f"/b/id/{number}-L.jpg",
+                         'archive': f"http://ia800204.us.archive.test:{port}/b/id/{number}-L.jpg",
+                         'offsite': f"http://localhost:{port}/b/id/{number}-L.jpg",
+                         'lookalike': f"http://notarchive.test:{port}/b/id/{number}-L.jpg",
+                         'loop': self.path}
+            if kind in redirects:
+                self.send_response(302)
+                self.send_header('Location', redirects[kind])
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            if state['failing']:
+                self.send_error(503)
+                return
+            if kind == 'big':
+                body = covers.setdefault(('big', number), make_cover(number, 2000, 3000))
+            else:
+                body = covers.setdefault(number, make_cover(number))
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", state
+
+
+def view_grid(urls, size='small'):
+    """Local bytes served for one catalogue grid, fetching what is not cached"""
+    total = 0
+    for url in urls:
+        key = cover_cache.cover_key(url)
+        path = cover_cache.cached_cover(key, size)
+        if path is None:
+            assert cover_cache.fetch_cover(url), f"fetch failed for {url}"
+            path = cover_cache.cached_cover(key, size)
+        with open(path, 'rb') as f:
+            total += len(f.read())
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--books', type=int, default=48)
+    parser.add_argument('--delay', type=float, default=0.05, help='stub provider latency per cover')
+    args = parser.parse_args()
+
+    base, state = start_stub(args.delay)
+    urls = [f"{base}/b/id/{n}-L.jpg" for n in range(args.books)]
+    failures = []
+
+    started = time.perf_counter()
+    import requests
+    remote_bytes = sum(len(requests.get(url, timeout=10).content) for url in urls)
+    remote = time.perf_counter() - started
+
+    started = time.perf_counter()
+    view_grid(urls)
+    cold = time.perf_counter() - started
+
+    fetched = state['requests']
+    started = time.perf_counter()
+    small_bytes = view_grid(urls)
+    warm = time.perf_counter() - started
+    large_bytes = view_grid(urls, 'large')
+    if state['requests'] != fetched:
+        failures.append("warm views went back to the provider")
+
+    print(f"{args.books} covers, provider latency {args.delay * 1000:.0f} ms, cache in {Config.COVER_CACHE_ROOT}")
+    print(f"  {'view':<8} {'ms':>9} {'KiB':>9}")
+    print(f"  {'remote':<8} {remote * 1000:>9.1f} {remote_bytes / 1024:>9.1f}")
+    print(f"  {'cold':<8} {cold * 1000:>9.1f} {small_bytes / 1024:>9.1f}  (small, {Config.COVER_SMALL_WIDTH}px)")
+    print(f"  {'warm':<8} {warm * 1000:>9.1f} {small_bytes / 1024:>9.1f}  (large {Config.COVER_LARGE_WIDTH}px: "
+          f"{large_bytes / 1024:.1f})")
+
+    # LRU: capped at about half the grid, the half not used lately goes first
+    half = args.books // 2
+    for url in urls[:half]:
+        for size in cover_cache.SIZES:
+            os.utime(cover_cache.cover_path(cover_cache.cover_key(url), size), (1, 1))
+    result = cover_cache.trim(max_bytes=(small_bytes + large_bytes) // 2)
+    kept = [url for url in urls if cover_cache.cached_cover(cover_cache.cover_key(url), 'small')]
+    print(f"  trim to half: {result['evicted']} files evicted, {len(kept)} covers kept")
+    if any(url in kept for url in urls[:half]) or not kept:
+        failures.append("trim did not evict least recently used covers first")
+
+    # Redirects: followed (relative Location) to an allowed host and to a
+    # subdomain of an allowed ".domain", refused off them, and given up on
+    # after MAX_REDIRECTS
+    def fetch_counted(url):
+        before = state['requests']
+        return cover_cache.fetch_cover(url), state['requests'] - before
+
+    followed, redirect_requests = fetch_counted(f"{base}/redirect/{args.books + 2}")
+    archived, archive_requests = fetch_counted(f"{base}/archive/{args.books + 6}")
+    offsite_fetched, offsite_requests = fetch_counted(f"{base}/offsite/{args.books + 3}")
+    lookalike_fetched, lookalike_requests = fetch_counted(f"{base}/lookalike/{args.books + 7}")
+    looped_fetched, loop_requests = fetch_counted(f"{base}/loop/{args.books + 4}")
+    refused, looped = not offsite_fetched and not lookalike_fetched, not looped_fetched
+    print(f"  redirects: allowed {'followed' if followed else 'FAILED'} ({redirect_requests} requests), "
+          f"to .archive.test {'followed' if archived else 'FAILED'} ({archive_requests}), "
+          f"off-host {'refused' if refused else 'FOLLOWED'} ({offsite_requests}, look-alike {lookalike_requests}), "
+          f"loop {'stopped' if looped else 'FOLLOWED'} ({loop_requests})")
+    if not followed or redirect_requests != 2:
+        failures.append("an allowed redirect was not followed")
+    if not archived or archive_requests != 2:
+        failures.append("a redirect to a subdomain of an allowed .domain was not followed")
+    if not refused or offsite_requests != 1 or lookalike_requests != 1:
+        failures.append("a redirect to a host that is not allowed was followed")
+    if not looped or loop_requests != cover_cache.MAX_REDIRECTS + 1:
+        failures.append("a redirect loop was not cut off at MAX_REDIRECTS")
+
+    # A 2000x3000 JPEG decodes at reduced scale, yet thumbnails keep their widths
+    big = f"{base}/big/{args.books + 5}"
+    cover_cache.fetch_cover(big)
+    widths = {}
+    for size in cover_cache.SIZES:
+        with Image.open(cover_cache.cached_cover(cover_cache.cover_key(big), size)) as thumbnail:
+            widths[size] = thumbnail.width
+    print(f"  2000px cover: thumbnails {widths}")
+    if widths != cover_cache.SIZES:
+        failures.append("thumbnails of a large cover are not full width")
+
+    # A failing provider: one fetch (with its retries), then none within COVER_RETRY_SECONDS
+    state['failing'] = True
+    before = state['requests']
+    missing = f"{base}/b/id/{args.books + 1}-L.jpg"
+    results = [cover_cache.fetch_cover(missing) for _ in range(5)]
+    print(f"  failing provider: {state['requests'] - before} request(s) for 5 lookups")
+    if any(results) or state['requests'] - before != 1 + Config.HTTP_MAX_RETRIES:
+        failures.append("failed covers were retried immediately")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""Outbound HTTP client against a local stub provider
+
+Starts a stub provider on 127.0.0.1 (HTTP/1.1 keep-alive, --delay seconds
+per response) and puts app/utils/http_client.py through it:
+
+  * reuse:    --requests GETs through one client vs a new connection each
+              (plain requests.get), with the connections the stub accepted
+  * retry:    a 503 followed by a 200 is retried once and succeeds
+  * timeout:  a read timeout is raised after one request, not retried
+  * breaker:  CIRCUIT_FAILURE_THRESHOLD failing calls open the circuit, the
+              next call fails without a request, and after
+              CIRCUIT_RESET_SECONDS one trial request closes it again
+  * trial:    a half-open trial that dies with a non-requests exception
+              does not leave the circuit stuck open
+  * spacing:  a client with min_interval sends no faster than that
+
+Exits non-zero if a check fails. No database is needed:
+
+    python benchmarks/http_client.py
+    python benchmarks/http_client.py --requests 200 --delay 0.005
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Before app.config is imported: short timeouts and backoff so the run is quick
+os.environ.setdefault('HTTP_READ_TIMEOUT', '0.3')
+os.environ.setdefault('HTTP_BACKOFF_BASE', '0.01')
+os.environ.setdefault('HTTP_MAX_RETRIES', '2')
+os.environ.setdefault('CIRCUIT_FAILURE_THRESHOLD', '3')
+os.environ.setdefault('CIRCUIT_RESET_SECONDS', '0.5')
+
+import requests
+
+from app.config import Config
+from app.utils.http_client import CircuitOpenError, HttpClient
+
+
+def start_stub(delay):
+    state = {'requests': 0, 'connections': 0, 'times': [], 'flaky': 0, 'down': False}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body go out in separate writes: without this, delayed
+        # ACKs add ~40 ms to every response on a kept-alive connection
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            super().setup()
+            with lock:
+                state['connections'] += 1
+
+        def do_GET(self):
+            with lock:
+                state['requests'] += 1
+                state['times'].append(time.monotonic())
+            time.sleep(delay)
+            status = 200
+            if self.path == '/flaky':
+                # 503 on every other request
+                with lock:
+                    state['flaky'] += 1
+                    status = 503 if state['flaky'] % 2 else 200
+            elif self.path == '/slow':
+                time.sleep(Config.HTTP_READ_TIMEOUT * 2)
+            elif self.path == '/health' and state['down']:
+                status = 503
+            body = b'{"ok": true}' if status == 200 else b'{"error": "unavailable"}'
+            try:
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # /slow: the client timed out and went away
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", state
+
+
+def counted(state, fn):
+    """(result or exception, requests the stub saw) for one call"""
+    before = state['requests']
+    try:
+        result = fn()
+    except Exception as e:
+        result = e
+    return result, state['requests'] - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--delay', type=float, default=0.002, help='stub provider latency per response')
+    args = parser.parse_args()
+
+    base, state = start_stub(args.delay)
+    failures = []
+
+    # Connection reuse
+    before = state['connections']
+    started = time.perf_counter()
+    for _ in range(args.requests):
+        requests.get(f"{base}/item", timeout=5).close()
+    fresh = time.perf_counter() - started
+    fresh_connections = state['connections'] - before
+
+    client = HttpClient('stub')
+    before = state['connections']
+    started = time.perf_counter()
+    for _ in range(args.requests):
+        client.get(f"{base}/item").close()
+    pooled = time.perf_counter() - started
+    pooled_connections = state['connections'] - before
+
+    print(f"{args.requests} GETs, stub latency {args.delay * 1000:.1f} ms")
+    print(f"  {'client':<14} {'ms':>9} {'ms/req':>8} {'connections':>12}")
+    print(f"  {'requests.get':<14} {fresh * 1000:>9.1f} {fresh * 1000 / args.requests:>8.2f} {fresh_connections:>12}")
+    print(f"  {'HttpClient':<14} {pooled * 1000:>9.1f} {pooled * 1000 / args.requests:>8.2f} {pooled_connections:>12}")
+    if pooled_connections != 1:
+        failures.append(f"pooled client opened {pooled_connections} connections")
+
+    # Retry: 503, then 200
+    response, sent = counted(state, lambda: client.get(f"{base}/flaky"))
+    print(f"  retry: {getattr(response, 'status_code', response)} after {sent} request(s)")
+    if getattr(response, 'status_code', None) != 200 or sent != 2:
+        failures.append("a 503 was not retried into a 200")
+
+    # Read timeout: raised at once, not retried
+    started = time.perf_counter()
+    error, sent = counted(state, lambda: client.get(f"{base}/slow"))
+    print(f"  read timeout: {type(error).__name__} after {sent} request(s), "
+          f"{(time.perf_counter() - started) * 1000:.0f} ms")
+    if not isinstance(error, requests.ReadTimeout) or sent != 1:
+        failures.append("a read timeout was retried")
+
+    # Breaker: open after the threshold, short-circuit, recover with one trial
+    breaker_client = HttpClient('stub-breaker')
+    state['down'] = True
+    for _ in range(Config.CIRCUIT_FAILURE_THRESHOLD):
+        breaker_client.get(f"{base}/health")
+    error, sent = counted(state, lambda: breaker_client.get(f"{base}/health"))
+    opened = isinstance(error, CircuitOpenError) and sent == 0
+    state['down'] = False
+    time.sleep(Config.CIRCUIT_RESET_SECONDS)
+    response, trial_sent = counted(state, lambda: breaker_client.get(f"{base}/health"))
+    recovered = getattr(response, 'status_code', None) == 200 and trial_sent == 1 \
+        and breaker_client.breaker.state == 'closed'
+    print(f"  breaker: {'opened' if opened else 'DID NOT OPEN'} after {Config.CIRCUIT_FAILURE_THRESHOLD} failures, "
+          f"{'closed' if recovered else 'DID NOT CLOSE'} after one trial ({trial_sent} request(s))")
+    if not opened:
+        failures.append("the circuit did not open (or still sent requests)")
+    if not recovered:
+        failures.append("the circuit did not close after a successful trial")
+
+    # A half-open trial that raises something requests doesn't
+    trial_client = HttpClient('stub-trial')
+    state['down'] = True
+    for _ in range(Config.CIRCUIT_FAILURE_THRESHOLD):
+        trial_client.get(f"{base}/health")
+    state['down'] = False
+    time.sleep(Config.CIRCUIT_RESET_SECONDS)
+
+    def broken_hook(response, **kwargs):
+        raise RuntimeError("hook failed")
+
+    error, _ = counted(state, lambda: trial_client.get(f"{base}/health", hooks={'response': broken_hook}))
+    response, _ = counted(state, lambda: trial_client.get(f"{base}/health"))
+    unstuck = isinstance(error, RuntimeError) and getattr(response, 'status_code', None) == 200
+    print(f"  failed trial: next request {'allowed' if unstuck else 'SHORT-CIRCUITED'}")
+    if not unstuck:
+        failures.append("a trial that raised left the circuit stuck")
+
+    # Spacing
+    interval = 0.1
+    spaced = HttpClient('stub-spaced', min_interval=interval)
+    first = len(state['times'])
+    for _ in range(5):
+        spaced.get(f"{base}/item").close()
+    times = state['times'][first:]
+    gap = min(b - a for a, b in zip(times, times[1:]))
+    print(f"  spacing: min_interval {interval * 1000:.0f} ms, smallest gap {gap * 1000:.0f} ms")
+    if gap < interval * 0.95:
+        failures.append("min_interval was not respected")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
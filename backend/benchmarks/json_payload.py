@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Encoding cost of the 50-book search payload, per JSON provider
+
+Builds a synthetic page of /api/patron/books/search results - 50 books
+with Decimal ratings, tag arrays and json_agg contributor lists, the
+shape the endpoint returns - and times building the rows the way each
+cursor does plus encoding one response, per strategy:
+
+  * flask default:  RealDictCursor rows, [dict(r) for r in rows], Flask's
+                    DefaultJSONProvider (the endpoint before this change)
+  * fast (stdlib):  RealDictCursor rows as-is, FastJSONProvider without orjson
+  * fast (orjson):  RealDictCursor rows as-is, FastJSONProvider with orjson
+  * fast + Rows:    plain cursor tuples + column names, with orjson
+
+No database is needed:
+
+    python benchmarks/json_payload.py
+    python benchmarks/json_payload.py --books 500 --repeat 2000
+"""
+import argparse
+import decimal
+import os
+import random
+import statistics
+import sys
+import time
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from psycopg2.extras import RealDictRow
+
+from app.utils import json_provider
+from app.utils.json_provider import FastJSONProvider, Rows
+
+COLUMNS = ('book_id', 'isbn', 'title', 'subtitle', 'publisher', 'publication_year',
+           'collection_id', 'collection_name', 'age_rating', 'cover_image_url', 'tags',
+           'available_items', 'total_items', 'contributors', 'avg_rating', 'review_count')
+
+
+def make_rows(count):
+    rows = []
+    for book_id in range(1, count + 1):
+        rows.append((
+            book_id, f"978{random.randint(10 ** 9, 10 ** 10 - 1)}", f"Book title number {book_id}",
+            random.choice([None, 'A subtitle for the book']), 'Some Publisher', random.randint(1950, 2025),
+            random.randint(1, 20), 'Fiction', random.choice(['3-5', '6-8', '9-12', 'Adult']),
+            f"https://covers.openlibrary.org/b/isbn/{book_id}-M.jpg",
+            random.sample(['adventure', 'friendship', 'history', 'science', 'mystery', 'poetry'], 3),
+            random.randint(0, 3), 3,
+            [{'name': f"Author {book_id}", 'role': 'author'}, {'name': 'Illustrator', 'role': 'illustrator'}],
+            decimal.Decimal(random.randint(100, 500)) / 100 if random.random() < 0.7 else None,
+            random.randint(0, 40),
+        ))
+    return rows
+
+
+def real_dict_rows(tuples):
+    """Rows built the way RealDictCursor builds them: one __setitem__ per column"""
+    rows = []
+    for values in tuples:
+        row = RealDictRow()
+        dict.__setitem__(row, RealDictRow, list(COLUMNS))
+        for index, value in enumerate(values):
+            row[index] = value
+        rows.append(row)
+    return rows
+
+
+def measure(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--books', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=1000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    tuples = make_rows(args.books)
+
+    def payload(books):
+        return {'books': books, 'total': args.books, 'page': 1, 'per_page': args.books}
+
+    default = DefaultJSONProvider(app)
+    fast = FastJSONProvider(app)
+    orjson = json_provider.orjson
+
+    def without_orjson(func):
+        def run():
+            json_provider.orjson = None
+            try:
+                return func()
+            finally:
+                json_provider.orjson = orjson
+        return run
+
+    cases = [
+        ('flask default', lambda: default.response(payload([dict(r) for r in real_dict_rows(tuples)]))),
+        ('fast (stdlib)', without_orjson(lambda: fast.response(payload(real_dict_rows(tuples))))),
+    ]
+    if orjson is not None:
+        cases += [
+            ('fast (orjson)', lambda: fast.response(payload(real_dict_rows(tuples)))),
+            ('fast + Rows', lambda: fast.response(payload(Rows(COLUMNS, tuples)))),
+        ]
+    else:
+        print("orjson is not installed; only the stdlib paths are measured")
+
+    with app.app_context():
+        baseline = None
+        print(f"{args.books} books, median of {args.repeat} responses")
+        print(f"  {'strategy':<15} {'us':>9} {'bytes':>8} {'speedup':>8}")
+        for name, func in cases:
+            size = len(func().get_data())
+            seconds = measure(func, args.repeat)
+            baseline = baseline or seconds
+            print(f"  {name:<15} {seconds * 1e6:>9.1f} {size:>8} {baseline / seconds:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
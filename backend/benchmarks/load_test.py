@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""Throughput of a mixed catalogue/search/import workload, per gunicorn worker class
+
+Drives the API with --concurrency client threads for --duration seconds.
+Each request is drawn from a weighted mix:
+
+  * catalogue (60%): public new arrivals and keyword search, book detail
+  * search    (30%): semantic search (embedding inference)
+  * import    (10%): admin ISBN lookup (external Google Books/OpenLibrary calls)
+
+By default it starts gunicorn (with gunicorn.conf.py) once per worker class
+in --compare, waits for /health, runs the workload and prints a table of
+requests/s and latency percentiles per class and per request kind. Use
+--url to drive an already running server instead. Needs a database with
+a catalogue and an admin account:
+
+    python benchmarks/load_test.py --email admin@example.com --password ...
+    python benchmarks/load_test.py --compare sync,gthread,gevent --concurrency 64
+    python benchmarks/load_test.py --url http://localhost:5001 --duration 60
+"""
+import argparse
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+# Add backend to path
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import requests
+
+SEARCH_TERMS = ['history', 'science', 'adventure', 'children', 'india', 'poetry', 'mystery', 'art']
+SEMANTIC_QUERIES = [
+    'a funny story about friendship for young readers',
+    'introduction to the history of science',
+    'detective novel set in a small town',
+    'picture book about animals and nature',
+]
+# Not in the catalogue, so each lookup goes out to the metadata providers
+IMPORT_ISBNS = ['9780140449136', '9780262033848', '9780131103627', '9780596007126', '9781491950357']
+
+MIX = [('catalogue', 0.6), ('search', 0.3), ('import', 0.1)]
+
+
+def login(base_url, email, password):
+    response = requests.post(f"{base_url}/api/auth/login", json={'email': email, 'password': password}, timeout=30)
+    response.raise_for_status()
+    return response.json()['access_token']
+
+
+def book_ids(base_url):
+    response = requests.get(f"{base_url}/api/patron/books/new-arrivals", timeout=30)
+    response.raise_for_status()
+    return [book['book_id'] for book in response.json()['books']] or [1]
+
+
+def make_request(session, base_url, kind, ids):
+    if kind == 'catalogue':
+        choice = random.random()
+        if choice < 0.3:
+            return session.get(f"{base_url}/api/patron/books/new-arrivals")
+        if choice < 0.7:
+            return session.get(f"{base_url}/api/patron/books/search",
+                               params={'search': random.choice(SEARCH_TERMS)})
+        return session.get(f"{base_url}/api/patron/books/{random.choice(ids)}")
+    if kind == 'search':
+        return session.post(f"{base_url}/api/patron/books/semantic-search",
+                            json={'query': random.choice(SEMANTIC_QUERIES), 'limit': 6})
+    return session.post(f"{base_url}/api/admin/books/fetch-by-isbn",
+                        json={'isbn': random.choice(IMPORT_ISBNS)})
+
+
+def run_workload(base_url, token, concurrency, duration):
+    """Returns ({kind: [latencies]}, {kind: errors}, {reason: errors}, elapsed seconds)"""
+    ids = book_ids(base_url)
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    reasons = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    kinds, weights = zip(*MIX)
+
+    def client():
+        session = requests.Session()
+        session.headers['Authorization'] = f"Bearer {token}"
+        while time.monotonic() < deadline:
+            kind = random.choices(kinds, weights)[0]
+            started = time.perf_counter()
+            reason = None
+            try:
+                # 4xx from the ISBN lookup (not found upstream) still exercised the path
+                status = make_request(session, base_url, kind, ids).status_code
+                if status >= 500:
+                    reason = f"HTTP {status}"
+            except requests.RequestException as e:
+                # The innermost cause, e.g. RemoteDisconnected rather than ConnectionError
+                cause = e
+                while cause.__context__ is not None:
+                    cause = cause.__context__
+                reason = f"{type(e).__name__} ({type(cause).__name__})"
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies[kind].append(elapsed)
+                if reason:
+                    errors[kind] += 1
+                    reasons[reason] += 1
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors, reasons, time.monotonic() - started
+
+
+def start_server(worker_class, port, workers):
+    env = dict(os.environ, PORT=str(port), GUNICORN_WORKER_CLASS=worker_class)
+    if workers:
+        env['GUNICORN_WORKERS'] = str(workers)
+    process = subprocess.Popen(['gunicorn', '--config', 'gunicorn.conf.py', '--access-logfile', '/dev/null'],
+                               cwd=BACKEND_DIR, env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(120):
+        if process.poll() is not None:
+            sys.exit(f"✗ gunicorn ({worker_class}) exited with {process.returncode}")
+        try:
+            if requests.get(f"{base_url}/health", timeout=1).ok:
+                return process, base_url
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    sys.exit(f"✗ gunicorn ({worker_class}) did not become healthy")
+
+
+def stop_server(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=40)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def percentile(values, share):
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+
+def report(label, latencies, errors, reasons, elapsed):
+    total = sum(len(values) for values in latencies.values())
+    print(f"\n{label}: {total} requests in {elapsed:.1f}s = {total / elapsed:.1f} req/s, "
+          f"{sum(errors.values())} errors")
+    print(f"  {'kind':<10} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for kind, _ in MIX:
+        values = sorted(latencies.get(kind, []))
+        if not values:
+            continue
+        print(f"  {kind:<10} {len(values) / elapsed:>8.1f} {statistics.median(values) * 1000:>9.1f} "
+              f"{percentile(values, 0.95) * 1000:>9.1f} {percentile(values, 0.99) * 1000:>9.1f} "
+              f"{errors.get(kind, 0):>7}")
+    for reason, count in sorted(reasons.items(), key=lambda item: -item[1]):
+        print(f"  error: {reason} x {count}")
+    return total / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='Drive a running server instead of starting gunicorn')
+    parser.add_argument('--compare', default='sync,gthread', help='Worker classes to start and compare')
+    parser.add_argument('--workers', type=int, help='GUNICORN_WORKERS for started servers')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--concurrency', type=int, default=32, help='Client threads')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds per run')
+    parser.add_argument('--warmup', type=float, default=5.0, help='Unmeasured seconds before each run')
+    parser.add_argument('--email', default=os.getenv('LOAD_TEST_EMAIL'), help='Admin account (LOAD_TEST_EMAIL)')
+    parser.add_argument('--password', default=os.getenv('LOAD_TEST_PASSWORD'), help='(LOAD_TEST_PASSWORD)')
+    args = parser.parse_args()
+
+    if not args.email or not args.password:
+        parser.error('--email and --password (or LOAD_TEST_EMAIL/LOAD_TEST_PASSWORD) are required')
+
+    if args.url:
+        token = login(args.url, args.email, args.password)
+        run_workload(args.url, token, args.concurrency, args.warmup)
+        report(args.url, *run_workload(args.url, token, args.concurrency, args.duration))
+        return
+
+    results = {}
+    for worker_class in args.compare.split(','):
+        process, base_url = start_server(worker_class, args.port, args.workers)
+        try:
+            token = login(base_url, args.email, args.password)
+            run_workload(base_url, token, args.concurrency, args.warmup)
+            results[worker_class] = report(worker_class, *run_workload(base_url, token, args.concurrency,
+                                                                       args.duration))
+        finally:
+            stop_server(process)
+
+    baseline = next(iter(results.values()))
+    print("\nThroughput:")
+    for worker_class, rate in results.items():
+        print(f"  {worker_class:<10} {rate:>8.1f} req/s  ({rate / baseline:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
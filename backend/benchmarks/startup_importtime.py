@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Worker boot budget: import time of create_app(), via python -X importtime
+
+Boots the app in a fresh interpreter (scheduler off, no database needed)
+several times and reports the median total import time, the wall time of
+create_app(), and the modules with the largest cumulative import time.
+Exits non-zero - so it can gate CI - when the median import time exceeds
+--budget or when any module in app.preload.HEAVY_MODULES (torch via
+sentence-transformers, reportlab, pgvector) is imported during boot:
+
+    python benchmarks/startup_importtime.py
+    python benchmarks/startup_importtime.py --budget 1.5 --runs 5 --top 30
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.preload import HEAVY_MODULES
+
+BOOT = (
+    "import time; started = time.perf_counter()\n"
+    "from app import create_app; create_app()\n"
+    "print('BOOT_SECONDS', time.perf_counter() - started)\n"
+)
+
+# "import time:       412 |       1830 |   flask.app"
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def boot_once():
+    """Returns (boot seconds, {module: cumulative us}, top-level total us)"""
+    env = dict(os.environ, SCHEDULER_ENABLED='false', SQL_PROFILE_SAMPLE_RATE='0',
+               PYTHONDONTWRITEBYTECODE='1')
+    # Only checked at boot, never written to
+    env.setdefault('MEDIA_ROOT', os.path.join(BACKEND_DIR, 'uploads', 'media'))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', BOOT],
+                            cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(f"✗ create_app() failed:\n{result.stderr[-2000:]}")
+
+    cumulative, total = {}, 0
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative_us, indent, module = match.groups()
+        cumulative[module] = max(cumulative.get(module, 0), int(cumulative_us))
+        if len(indent) == 1:  # top-level import; nested ones are inside its cumulative
+            total += int(cumulative_us)
+
+    boot = next(float(line.split()[1]) for line in result.stdout.splitlines()
+                if line.startswith('BOOT_SECONDS'))
+    return boot, cumulative, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget', type=float, default=float(os.getenv('STARTUP_IMPORT_BUDGET', 1.0)),
+                        help='Max median import time in seconds (default 1.0)')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=20, help='Slowest modules to list')
+    args = parser.parse_args()
+
+    runs = [boot_once() for _ in range(args.runs)]
+    boot = statistics.median(run[0] for run in runs)
+    total = statistics.median(run[2] for run in runs) / 1e6
+    cumulative = runs[-1][1]
+
+    print("Slowest imports (cumulative, last run):")
+    for module, us in sorted(cumulative.items(), key=lambda kv: -kv[1])[:args.top]:
+        print(f"  {us / 1000:>8.1f} ms  {module}")
+    print(f"create_app(): {boot:.2f}s wall, {total:.2f}s importing (median of {args.runs})")
+
+    heavy = sorted(name for name in HEAVY_MODULES
+                   if any(module == name or module.startswith(name + '.') for module in cumulative))
+    ok = total <= args.budget and not heavy
+    for name in heavy:
+        print(f"✗ {name} imported at boot ({HEAVY_MODULES[name]})")
+    print(f"{'✓' if total <= args.budget else '✗'} import time {total:.2f}s, budget {args.budget:.2f}s")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
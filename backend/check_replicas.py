@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""Check read-replica health and read routing (DATABASE_REPLICA_URLS)
+
+Reports each replica's health and replay lag, then runs a query through
+the app's own connection code in each routing case and checks which
+server answered:
+
+  * read_only() with a usable replica       -> a replica
+  * outside read_only()                     -> the primary
+  * replica refuses connections             -> the primary (fallback)
+  * replica drops its pooled connections    -> the primary (retried mid-query)
+  * every replica over REPLICA_MAX_LAG_SECONDS -> the primary
+  * client wrote in the last few seconds    -> the primary (read-your-writes,
+                                               signed header or cookie)
+
+Servers are told apart by address and port, so two local Postgres
+instances are enough - the second need not be a real standby:
+
+    DATABASE_URL=postgresql://localhost:5432/nuk_library \\
+    DATABASE_REPLICA_URLS=postgresql://localhost:5433/nuk_library \\
+        python check_replicas.py
+"""
+import argparse
+import os
+import sys
+import time
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import psycopg2
+
+from app import create_app
+from app.config import Config
+from app.utils import replicas
+from app.utils.database import execute_query
+
+SERVER_SQL = "SELECT COALESCE(host(inet_server_addr()), 'local') || ':' || current_setting('port') AS server"
+
+
+def server_of(url):
+    conn = psycopg2.connect(url, connect_timeout=Config.REPLICA_CONNECT_TIMEOUT)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SERVER_SQL)
+            return cur.fetchone()[0]
+    finally:
+        conn.close()
+
+
+def terminate_app_connections(url):
+    """End every other session on the server behind ``url`` (the app's pooled ones)"""
+    conn = psycopg2.connect(url, connect_timeout=Config.REPLICA_CONNECT_TIMEOUT)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT pg_terminate_backend(pid) FROM pg_stat_activity
+                WHERE pid <> pg_backend_pid() AND datname = current_database()
+            """)
+    finally:
+        conn.close()
+
+
+def routed_server(read_only):
+    if read_only:
+        with replicas.read_only():
+            return execute_query(SERVER_SQL, fetch_one=True)['server']
+    return execute_query(SERVER_SQL, fetch_one=True)['server']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--unreachable-url', default='postgresql://127.0.0.1:1/none',
+                        help='URL that refuses connections, used for the fallback check')
+    args = parser.parse_args()
+
+    if not replicas.replicas:
+        print("✗ DATABASE_REPLICA_URLS is not set; every query uses DATABASE_URL")
+        sys.exit(1)
+
+    # Check replicas here rather than in the background thread, so the
+    # cases below see exactly the state they set up
+    replicas._checker_pid = os.getpid()
+
+    primary = server_of(Config.DATABASE_URL)
+    print(f"Primary: {primary}")
+    replica_servers = set()
+    for replica in replicas.replicas:
+        replica.check()
+        if replica.healthy:
+            replica_servers.add(server_of(replica.url))
+        print(f"  {replica.name}: {'usable' if replica.usable else 'not usable'}, "
+              f"lag {replica.lag if replica.lag is not None else '-'}s"
+              f"{', ' + replica.error if replica.error else ''}")
+    if primary in replica_servers:
+        print("✗ A replica URL points at the primary server; routing can't be told apart")
+        sys.exit(1)
+
+    failures = 0
+
+    def expect(label, server, wanted):
+        nonlocal failures
+        ok = server in wanted
+        failures += not ok
+        print(f"{'✓' if ok else '✗'} {label}: {server}")
+
+    app = create_app(start_background=False)
+    with app.test_request_context('/'):
+        if any(replica.usable for replica in replicas.replicas):
+            expect("read_only() goes to a replica", routed_server(True), replica_servers)
+        else:
+            print("- no usable replica: skipping the replica case")
+        expect("Other reads go to the primary", routed_server(False), {primary})
+
+        # Every replica over the lag limit
+        max_lag = Config.REPLICA_MAX_LAG_SECONDS
+        Config.REPLICA_MAX_LAG_SECONDS = -1
+        try:
+            expect("Lagging replicas fall back to the primary", routed_server(True), {primary})
+        finally:
+            Config.REPLICA_MAX_LAG_SECONDS = max_lag
+
+    # A client that wrote a moment ago: the pin comes back in a header
+    # (cross-origin SPAs) or a cookie; a forged one is ignored
+    with app.app_context():
+        pin = replicas._signer().sign(f"{time.time() + Config.READ_YOUR_WRITES_SECONDS:.0f}").decode()
+    with app.test_request_context('/', headers={replicas.STICKY_HEADER: pin}):
+        expect("Recent writers (header) read from the primary", routed_server(True), {primary})
+    with app.test_request_context('/', headers={'Cookie': f"{replicas.STICKY_COOKIE}={pin}"}):
+        expect("Recent writers (cookie) read from the primary", routed_server(True), {primary})
+    if replica_servers:
+        forged = f"{time.time() + 3600:.0f}.forged"
+        with app.test_request_context('/', headers={replicas.STICKY_HEADER: forged}):
+            expect("A forged pin is ignored", routed_server(True), replica_servers)
+
+    # A usable replica whose pooled connections die (e.g. it restarted)
+    if replica_servers:
+        with app.test_request_context('/'):
+            routed_server(True)
+            for replica in replicas.replicas:
+                terminate_app_connections(replica.url)
+            expect("Replica failing mid-query falls back to the primary", routed_server(True), {primary})
+        for replica in replicas.replicas:
+            replica.check()
+
+    # A replica that looked healthy at its last check but now refuses connections
+    unreachable = replicas.Replica(args.unreachable_url, 'unreachable')
+    unreachable.healthy, unreachable.lag = True, 0.0
+    configured = replicas.replicas[:]
+    replicas.replicas[:] = [unreachable]
+    try:
+        with app.test_request_context('/'):
+            expect("Unreachable replica falls back to the primary", routed_server(True), {primary})
+        if unreachable.usable:
+            failures += 1
+            print("✗ Unreachable replica was not taken out of rotation")
+    finally:
+        replicas.replicas[:] = configured
+
+    if failures:
+        print(f"✗ {failures} routing check(s) failed")
+        sys.exit(1)
+    print("✓ Replica routing behaves as expected")
+
+
+if __name__ == '__main__':
+    main()
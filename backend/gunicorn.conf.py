@@ -0,0 +1,134 @@
+"""
+Gunicorn runtime configuration (picked up automatically from the backend
+directory, or pass -c gunicorn.conf.py). Every setting can be overridden
+from the environment:
+
+  PORT                        bind port (default 5001)
+  GUNICORN_WORKER_CLASS       gthread (default), sync or gevent
+  GUNICORN_WORKERS            default: 2 x cores + 1 (gevent: cores), capped
+                              at GUNICORN_MAX_WORKERS (default 4)
+  GUNICORN_THREADS            threads per gthread worker (default 4)
+  GUNICORN_WORKER_CONNECTIONS greenlets per gevent worker (default 100)
+  GUNICORN_TIMEOUT            worker timeout in seconds (default 120)
+  GUNICORN_MAX_REQUESTS       recycle workers after this many requests, +/-
+                              GUNICORN_MAX_REQUESTS_JITTER (default 100); default
+                              1000 for sync, 0 (never) for gthread and gevent
+  GUNICORN_PRELOAD            import the app in the master before forking (default true)
+  GUNICORN_PRELOAD_MODEL      also load the sentence-transformers model there
+                              (default true when sentence-transformers is installed)
+
+With preload the app, its lookup tables and the heavy optional modules
+(app.preload.HEAVY_MODULES) are imported once and shared copy-on-write by
+the workers; gc.freeze() keeps the garbage collector from touching - and
+so copying - those pages. The scheduler thread is started in each worker
+after the fork, never in the master. Each worker would otherwise load its
+own copy of the embedding model on the first semantic search, so the model
+is preloaded too whenever it is installed.
+
+Recycling a gthread or gevent worker closes the kept-alive connections it
+holds, and a client that has just sent a request on one gets a dropped
+connection (RemoteDisconnected in benchmarks/load_test.py; none with
+GUNICORN_MAX_REQUESTS=0). Sync workers close every connection after the
+response, so only they are recycled by default.
+
+gevent uses gevent and psycogreen (both in requirements.txt): the master
+is monkey-patched before the app is imported and psycopg2 is made
+cooperative, so a slow ISBN lookup or query yields instead of blocking the
+worker. CPU-bound
+work (embedding inference, PDF rendering) still blocks a gevent worker;
+prefer gthread when semantic search traffic is heavy.
+
+Which class is fastest depends on how much of the traffic waits on I/O
+(provider lookups, slow queries) rather than the CPU: with little waiting
+and few cores, sync workers avoid the thread and greenlet overhead. Compare
+on the target machine with benchmarks/load_test.py --compare sync,gthread,gevent.
+"""
+import gc
+import glob
+import importlib.util
+import os
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def _env_bool(name, default):
+    return os.getenv(name, default).lower() == 'true'
+
+
+def _cores():
+    try:
+        return len(os.sched_getaffinity(0))  # CPUs this container may use
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+
+if worker_class == 'gevent':
+    try:
+        from gevent import monkey
+        from psycogreen.gevent import patch_psycopg
+    except ImportError as e:
+        raise RuntimeError("GUNICORN_WORKER_CLASS=gevent requires: pip install gevent psycogreen") from e
+    # Before the app (and its locks, sockets and pool) is imported by preload
+    monkey.patch_all()
+    patch_psycopg()
+
+wsgi_app = 'app:create_app(start_background=False)'
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+
+_default_workers = _cores() if worker_class == 'gevent' else 2 * _cores() + 1
+workers = _env_int('GUNICORN_WORKERS', min(_default_workers, _env_int('GUNICORN_MAX_WORKERS', 4)))
+threads = _env_int('GUNICORN_THREADS', 4) if worker_class == 'gthread' else 1
+worker_connections = _env_int('GUNICORN_WORKER_CONNECTIONS', 100)
+
+timeout = _env_int('GUNICORN_TIMEOUT', 120)
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers so slow leaks (model caches, fragmentation) stay bounded;
+# the jitter keeps them from all restarting at once. Off for the classes that
+# keep connections alive, where a recycle drops them (see above)
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 1000 if worker_class == 'sync' else 0)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', 100)
+
+preload_app = _env_bool('GUNICORN_PRELOAD', 'true')
+
+accesslog = '-'
+errorlog = '-'
+
+
+def on_starting(server):
+    """Master, after the preloaded app is imported and before any fork"""
+    from app.utils.metrics import metrics_dir
+    for path in glob.glob(os.path.join(metrics_dir(), '*.json')):
+        os.remove(path)  # totals from a previous run of the server
+
+    if preload_app:
+        from app.preload import preload_heavy_modules
+        for name, seconds in preload_heavy_modules().items():
+            server.log.info("Preloaded %s in %.2fs", name, seconds)
+        model_installed = importlib.util.find_spec('sentence_transformers') is not None
+        if _env_bool('GUNICORN_PRELOAD_MODEL', str(model_installed)):
+            from app.utils.semantic_search import get_model
+            get_model()
+            server.log.info("Preloaded the embedding model")
+        # Everything loaded so far lives for the whole process: move it out of
+        # the collector's reach so collections in workers don't copy its pages
+        gc.freeze()
+
+    server.log.info("Workers: %s x %s (%s threads, max_requests %s +/- %s)",
+                    workers, worker_class, threads, max_requests, max_requests_jitter)
+
+
+def post_worker_init(worker):
+    # The pool and metrics reset themselves after a fork (see app.utils.database
+    # and app.utils.metrics); only the scheduler thread has to be started here
+    from app.utils.scheduler import start_scheduler
+    start_scheduler()
+
+
+def worker_exit(server, worker):
+    from app.utils.database import close_pool
+    close_pool()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""Apply pending SQL migrations from database/migrations
+
+Applied files are recorded in a schema_migrations table. A file is run in
+a single transaction, unless it uses CREATE/DROP INDEX CONCURRENTLY - then
+each statement runs on its own in autocommit mode, as Postgres requires.
+
+On a database that was set up by hand, first record what is already there:
+
+    python migrate.py --baseline 014     # mark 001..014 as applied
+    python migrate.py --list
+    python migrate.py                    # apply everything pending
+    python migrate.py --dry-run
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+import time
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import psycopg2
+
+from app.config import Config
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              'database', 'migrations')
+CONCURRENT_RE = re.compile(r'\b(CREATE|DROP)\s+(UNIQUE\s+)?INDEX\s+CONCURRENTLY\b', re.IGNORECASE)
+
+
+def migration_files():
+    """(filename, path) for every NNN_*.sql migration, in order"""
+    names = sorted(n for n in os.listdir(MIGRATIONS_DIR) if re.match(r'^\d{3}_.*\.sql$', n))
+    return [(n, os.path.join(MIGRATIONS_DIR, n)) for n in names]
+
+
+def split_statements(sql):
+    """Split a script on top-level semicolons (skips comments, quotes and $$ bodies)"""
+    statements, current, i = [], [], 0
+    while i < len(sql):
+        ch = sql[i]
+        if sql.startswith('--', i):
+            end = sql.find('\n', i)
+            i = len(sql) if end == -1 else end
+            continue
+        if ch == "'":
+            end = sql.find("'", i + 1)
+            while end != -1 and sql.startswith("''", end):
+                end = sql.find("'", end + 2)
+            end = len(sql) if end == -1 else end + 1
+            current.append(sql[i:end])
+            i = end
+            continue
+        if ch == '$':
+            tag = re.match(r'\$[A-Za-z_]*\$', sql[i:])
+            if tag:
+                end = sql.find(tag.group(), i + len(tag.group()))
+                end = len(sql) if end == -1 else end + len(tag.group())
+                current.append(sql[i:end])
+                i = end
+                continue
+        if ch == ';':
+            statement = ''.join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+        else:
+            current.append(ch)
+        i += 1
+
+    statement = ''.join(current).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+
+def ensure_table(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                filename VARCHAR(255) PRIMARY KEY,
+                checksum VARCHAR(64),
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                duration_ms INTEGER
+            )
+        """)
+    conn.commit()
+
+
+def applied_migrations(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT filename, checksum FROM schema_migrations")
+        return dict(cur.fetchall())
+
+
+def has_app_tables(conn):
+    """True if the schema was already created (by hand or an older setup)"""
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('public.books') IS NOT NULL OR to_regclass('public.patrons') IS NOT NULL")
+        return cur.fetchone()[0]
+
+
+def record(conn, filename, checksum, duration_ms=None):
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO schema_migrations (filename, checksum, duration_ms)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (filename) DO NOTHING
+        """, (filename, checksum, duration_ms))
+
+
+def apply(conn, filename, sql):
+    started = time.time()
+    checksum = hashlib.sha256(sql.encode()).hexdigest()
+
+    if CONCURRENT_RE.search(sql):
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                for statement in split_statements(sql):
+                    cur.execute(statement)
+        finally:
+            conn.autocommit = False
+        record(conn, filename, checksum, int((time.time() - started) * 1000))
+        conn.commit()
+    else:
+        with conn.cursor() as cur:
+            cur.execute(sql)
+        record(conn, filename, checksum, int((time.time() - started) * 1000))
+        conn.commit()
+
+    return time.time() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--list', action='store_true', help='Show applied and pending migrations')
+    parser.add_argument('--dry-run', action='store_true', help='Show what would be applied')
+    parser.add_argument('--baseline', metavar='NNN',
+                        help='Record migrations up to NNN as applied without running them')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(Config.DATABASE_URL)
+    try:
+        ensure_table(conn)
+        applied = applied_migrations(conn)
+        files = migration_files()
+
+        if args.baseline:
+            marked = 0
+            for filename, path in files:
+                if filename[:3] <= args.baseline and filename not in applied:
+                    with open(path) as f:
+                        record(conn, filename, hashlib.sha256(f.read().encode()).hexdigest())
+                    marked += 1
+            conn.commit()
+            print(f"✓ Recorded {marked} migrations up to {args.baseline} as applied")
+            return
+
+        pending = [(n, p) for n, p in files if n not in applied]
+
+        # Nothing recorded but the tables are there: running 001 onwards
+        # would replay migrations over a live schema
+        if not applied and not args.list and has_app_tables(conn):
+            print("✗ schema_migrations is empty but the database already has application tables")
+            print("  Record the migrations already applied first, e.g.: python migrate.py --baseline 014")
+            sys.exit(1)
+
+        if args.list:
+            for filename, path in files:
+                with open(path) as f:
+                    checksum = hashlib.sha256(f.read().encode()).hexdigest()
+                if filename not in applied:
+                    state = 'pending'
+                elif applied[filename] and applied[filename] != checksum:
+                    state = 'applied (file changed since)'
+                else:
+                    state = 'applied'
+                print(f"  {filename:<45} {state}")
+            print(f"{len(files) - len(pending)} applied, {len(pending)} pending")
+            return
+
+        if not pending:
+            print("✓ Database is up to date")
+            return
+
+        for filename, path in pending:
+            if args.dry_run:
+                print(f"  would apply {filename}")
+                continue
+            with open(path) as f:
+                sql = f.read()
+            print(f"Applying {filename}...")
+            elapsed = apply(conn, filename, sql)
+            print(f"✓ {filename} ({elapsed:.1f}s)")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
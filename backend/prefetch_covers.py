@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Fill the local cover cache for the current catalogue
+
+Covers of new imports are prefetched when they are added, and any other
+cover is cached after its first request. Run this once after enabling the
+cache (or after moving COVER_CACHE_ROOT) so the existing catalogue is served
+locally from the start. Covers already cached are skipped, so it is safe to
+re-run:
+
+    python prefetch_covers.py
+    python prefetch_covers.py --workers 4 --limit 500
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.config import Config
+from app.utils.cover_cache import SIZES, cover_key, cover_path, fetch_cover, is_cacheable
+from app.utils.database import execute_query
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=Config.COVER_PREFETCH_WORKERS,
+                        help='Covers fetched at a time')
+    parser.add_argument('--limit', type=int, help='Fetch at most this many covers')
+    args = parser.parse_args()
+
+    rows = execute_query("""
+        SELECT DISTINCT cover_image_url FROM books
+        WHERE is_active = TRUE AND cover_image_url IS NOT NULL
+    """, fetch_all=True) or []
+    urls = [row['cover_image_url'] for row in rows if is_cacheable(row['cover_image_url'])]
+    missing = [url for url in urls
+               if not all(os.path.exists(cover_path(cover_key(url), size)) for size in SIZES)]
+    if args.limit is not None:
+        missing = missing[:args.limit]
+
+    print(f"{len(urls)} remote covers, {len(urls) - len(missing)} already cached, fetching {len(missing)}...")
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        results = list(pool.map(fetch_cover, missing))
+
+    failed = results.count(False)
+    print(f"✓ Cached {len(results) - failed} covers in {Config.COVER_CACHE_ROOT}"
+          + (f", {failed} failed (retried on request after {Config.COVER_RETRY_SECONDS:g}s)" if failed else ""))
+
+
+if __name__ == '__main__':
+    main()
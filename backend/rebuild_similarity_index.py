@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""Rebuild the "similar books" index (book_similarity)
+
+Incremental by default: only books touched by borrowings since the last run
+are recomputed. Schedule it (e.g. hourly) with Railway cron or crontab:
+
+    python rebuild_similarity_index.py          # incremental
+    python rebuild_similarity_index.py --full   # recompute every book
+"""
+import argparse
+import os
+import sys
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.utils.similarity import rebuild_similarity_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--full', action='store_true', help='Recompute neighbours for every book')
+    args = parser.parse_args()
+
+    stats = rebuild_similarity_index(full=args.full)
+    print(f"✓ Similarity index {stats['mode']} rebuild: "
+          f"{stats['books']} books, {stats['rows']} neighbour rows")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""Recompute materialized patron recommendations (patron_recommendations)
+
+Run nightly for everyone, or for stale/missing lists only. Work is spread
+over one process per core unless --workers is given:
+
+    python recompute_recommendations.py               # every patron
+    python recompute_recommendations.py --stale       # stale or missing lists
+    python recompute_recommendations.py --patron NUKG0001000
+"""
+import argparse
+import os
+import sys
+import time
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.utils.recommendation_jobs import compute_and_store, recompute_all
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--stale', action='store_true', help='Only stale or missing lists')
+    parser.add_argument('--patron', help='Recompute a single patron')
+    parser.add_argument('--workers', type=int, default=None, help='Processes to use (default: all cores)')
+    parser.add_argument('--chunk-size', type=int, default=200, help='Patrons per task')
+    args = parser.parse_args()
+
+    started = time.time()
+    if args.patron:
+        count = compute_and_store([args.patron])
+    else:
+        count = recompute_all(stale_only=args.stale, workers=args.workers, chunk_size=args.chunk_size)
+
+    print(f"✓ Recomputed recommendations for {count} patrons in {time.time() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
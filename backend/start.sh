@@ -1,7 +1,5 @@
 #!/bin/bash
 # Railway startup script
-# Uses $PORT environment variable provided by Railway
+# Port, workers and worker class are read from the environment by gunicorn.conf.py
 
-PORT=${PORT:-5001}
-
-exec gunicorn --workers 4 --bind 0.0.0.0:$PORT --timeout 120 --access-logfile - --error-logfile - "app:create_app()"
+exec gunicorn --config gunicorn.conf.py
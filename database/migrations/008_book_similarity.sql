@@ -0,0 +1,42 @@
+-- =====================================================
+-- NUK LIBRARY - ITEM-TO-ITEM SIMILARITY INDEX
+-- Precomputed "similar books" built from borrowing
+-- co-occurrence blended with embedding similarity
+-- =====================================================
+
+-- =====================================================
+-- BOOK SIMILARITY (top-k neighbours per book)
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS book_similarity (
+    book_id INTEGER NOT NULL REFERENCES books(book_id) ON DELETE CASCADE,
+    similar_book_id INTEGER NOT NULL REFERENCES books(book_id) ON DELETE CASCADE,
+    score REAL NOT NULL,                  -- blended score used for ranking
+    co_borrow_score REAL NOT NULL DEFAULT 0,
+    embedding_score REAL NOT NULL DEFAULT 0,
+    co_borrow_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (book_id, similar_book_id)
+);
+
+-- "Similar books" is a single range scan on this index
+CREATE INDEX IF NOT EXISTS idx_book_similarity_lookup
+    ON book_similarity(book_id, score DESC);
+
+-- =====================================================
+-- REBUILD STATE (watermark for incremental rebuilds)
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS book_similarity_state (
+    state_id INTEGER PRIMARY KEY DEFAULT 1 CHECK (state_id = 1),
+    last_borrowing_id INTEGER NOT NULL DEFAULT 0,
+    last_full_rebuild_at TIMESTAMP,
+    last_run_at TIMESTAMP
+);
+
+INSERT INTO book_similarity_state (state_id, last_borrowing_id)
+VALUES (1, 0)
+ON CONFLICT (state_id) DO NOTHING;
+
+COMMENT ON TABLE book_similarity IS 'Top-k item-to-item neighbours per book (co-borrowing + embeddings)';
+COMMENT ON TABLE book_similarity_state IS 'Watermark of the last borrowing folded into book_similarity';
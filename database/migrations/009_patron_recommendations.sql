@@ -0,0 +1,20 @@
+-- =====================================================
+-- NUK LIBRARY - PRECOMPUTED PATRON RECOMMENDATIONS
+-- One row per patron, recomputed in the background when
+-- the patron borrows, returns or reviews (and nightly)
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS patron_recommendations (
+    patron_id VARCHAR(20) PRIMARY KEY
+        REFERENCES patrons(patron_id) ON DELETE CASCADE ON UPDATE CASCADE,
+    book_ids INTEGER[] NOT NULL DEFAULT '{}',   -- ranked, best first
+    scores REAL[] NOT NULL DEFAULT '{}',
+    generated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    is_stale BOOLEAN NOT NULL DEFAULT FALSE
+);
+
+-- Lets the nightly job pick up lists whose background refresh never ran
+CREATE INDEX IF NOT EXISTS idx_patron_recommendations_stale
+    ON patron_recommendations(generated_at) WHERE is_stale;
+
+COMMENT ON TABLE patron_recommendations IS 'Materialized per-patron recommendation lists served by /api/patron/recommendations';
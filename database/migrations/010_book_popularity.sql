@@ -0,0 +1,29 @@
+-- =====================================================
+-- NUK LIBRARY - TIME-DECAYED BOOK POPULARITY
+-- Exponentially decayed checkout scores maintained with
+-- O(1) work per checkout and decayed lazily on read
+-- =====================================================
+
+-- Scores are stored in log2 space relative to a fixed epoch:
+--
+--   log_score = log2(score at time t) + (t - epoch) / half_life
+--
+-- Every book decays at the same rate, so log_score is time-invariant and
+-- ranks books correctly at any moment without rewriting rows. The score
+-- "now" is 2 ^ (log_score - (now - epoch) / half_life).
+
+CREATE TABLE IF NOT EXISTS book_popularity (
+    book_id INTEGER NOT NULL REFERENCES books(book_id) ON DELETE CASCADE,
+    window_days SMALLINT NOT NULL,        -- 0 = main trending score, else 7/30/365 day windows
+    half_life_days DOUBLE PRECISION NOT NULL,
+    log_score DOUBLE PRECISION NOT NULL,
+    checkout_count INTEGER NOT NULL DEFAULT 0,
+    last_checkout_at TIMESTAMP,
+    PRIMARY KEY (book_id, window_days)
+);
+
+-- Trending / popular endpoints are a range scan on this index
+CREATE INDEX IF NOT EXISTS idx_book_popularity_rank
+    ON book_popularity(window_days, log_score DESC);
+
+COMMENT ON TABLE book_popularity IS 'Exponentially decayed checkout scores per book (log2 space, epoch 2024-01-01)';
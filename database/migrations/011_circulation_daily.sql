@@ -0,0 +1,28 @@
+-- =====================================================
+-- NUK LIBRARY - DAILY CIRCULATION ROLLUP
+-- Per day / collection circulation counts maintained by
+-- the borrowing routes, read by the dashboard trend charts
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS circulation_daily (
+    day DATE NOT NULL,
+    collection_id INTEGER NOT NULL DEFAULT 0,   -- 0 = book has no collection
+    checkouts INTEGER NOT NULL DEFAULT 0,
+    returns INTEGER NOT NULL DEFAULT 0,
+    renewals INTEGER NOT NULL DEFAULT 0,
+    overdue_transitions INTEGER NOT NULL DEFAULT 0,  -- borrowings that became overdue that day
+    unique_patrons INTEGER NOT NULL DEFAULT 0,       -- distinct patrons with a checkout/return/renewal
+    PRIMARY KEY (day, collection_id)
+);
+
+-- Patrons seen per day / collection; lets unique_patrons be maintained
+-- incrementally and distinct counts be taken over weeks and months
+CREATE TABLE IF NOT EXISTS circulation_daily_patrons (
+    day DATE NOT NULL,
+    collection_id INTEGER NOT NULL DEFAULT 0,
+    patron_id VARCHAR(20) NOT NULL,
+    PRIMARY KEY (day, collection_id, patron_id)
+);
+
+COMMENT ON TABLE circulation_daily IS 'Daily circulation rollup per collection (see app/utils/circulation_stats.py)';
+COMMENT ON TABLE circulation_daily_patrons IS 'Distinct patrons per day and collection for circulation_daily';
@@ -0,0 +1,106 @@
+-- =====================================================
+-- NUK LIBRARY - ATOMIC CHECKOUT
+-- checkout_item() validates and issues a loan under row
+-- locks so concurrent desks can't double-issue an item or
+-- push a patron past their borrowing limit
+-- =====================================================
+
+-- Lock order is always patron, then item(s) - the batch issue endpoint
+-- follows the same order, so the two paths can't deadlock each other.
+-- In READ COMMITTED every statement in a plpgsql function takes a fresh
+-- snapshot, so the active-loan count below sees every checkout committed
+-- by whoever held the patron lock before us.
+CREATE OR REPLACE FUNCTION checkout_item(
+    p_patron_id VARCHAR,
+    p_item_id INTEGER,
+    p_checkout_date DATE,
+    p_due_date DATE
+)
+RETURNS TABLE (
+    outcome TEXT,           -- issued | item_not_found | item_unavailable | patron_not_found
+                            -- | patron_inactive | limit_reached
+    detail TEXT,            -- item status, patron status or borrowing limit for errors
+    borrowing_id INTEGER,
+    book_id INTEGER,
+    barcode VARCHAR,
+    title VARCHAR
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_patron RECORD;
+    v_item RECORD;
+    v_limit INTEGER;
+    v_active INTEGER;
+    v_borrowing_id INTEGER;
+    v_patron_found BOOLEAN;
+    v_item_found BOOLEAN;
+BEGIN
+    SELECT u.status, mp.borrowing_limit
+    INTO v_patron
+    FROM patrons p
+    JOIN users u ON p.user_id = u.user_id
+    LEFT JOIN membership_plans mp ON p.membership_plan_id = mp.plan_id
+    WHERE p.patron_id = p_patron_id
+    FOR UPDATE OF p;
+    v_patron_found := FOUND;
+
+    SELECT i.item_id, i.circulation_status, i.barcode, b.book_id, b.title
+    INTO v_item
+    FROM items i
+    JOIN books b ON i.book_id = b.book_id
+    WHERE i.item_id = p_item_id
+    FOR UPDATE OF i;
+    v_item_found := FOUND;
+
+    -- Same check order (and so the same error) as the original issue route
+    IF NOT v_item_found THEN
+        RETURN QUERY SELECT 'item_not_found'::TEXT, NULL::TEXT, NULL::INTEGER, NULL::INTEGER, NULL::VARCHAR, NULL::VARCHAR;
+        RETURN;
+    END IF;
+
+    IF v_item.circulation_status <> 'available' THEN
+        RETURN QUERY SELECT 'item_unavailable'::TEXT, v_item.circulation_status::TEXT, NULL::INTEGER,
+                            v_item.book_id, v_item.barcode, v_item.title;
+        RETURN;
+    END IF;
+
+    IF NOT v_patron_found THEN
+        RETURN QUERY SELECT 'patron_not_found'::TEXT, NULL::TEXT, NULL::INTEGER,
+                            v_item.book_id, v_item.barcode, v_item.title;
+        RETURN;
+    END IF;
+
+    IF v_patron.status <> 'active' THEN
+        RETURN QUERY SELECT 'patron_inactive'::TEXT, v_patron.status::TEXT, NULL::INTEGER,
+                            v_item.book_id, v_item.barcode, v_item.title;
+        RETURN;
+    END IF;
+
+    v_limit := COALESCE(v_patron.borrowing_limit, 3);  -- Default to 3 if no plan
+
+    SELECT COUNT(*) INTO v_active
+    FROM borrowings br
+    WHERE br.patron_id = p_patron_id AND br.status = 'active';
+
+    IF v_active >= v_limit THEN
+        RETURN QUERY SELECT 'limit_reached'::TEXT, v_limit::TEXT, NULL::INTEGER,
+                            v_item.book_id, v_item.barcode, v_item.title;
+        RETURN;
+    END IF;
+
+    -- sync_item_status_trigger marks the item checked_out
+    INSERT INTO borrowings (patron_id, item_id, checkout_date, due_date, status)
+    VALUES (p_patron_id, p_item_id, p_checkout_date, p_due_date, 'active')
+    RETURNING borrowings.borrowing_id INTO v_borrowing_id;
+
+    RETURN QUERY SELECT 'issued'::TEXT, NULL::TEXT, v_borrowing_id,
+                        v_item.book_id, v_item.barcode, v_item.title;
+END;
+$$;
+
+COMMENT ON FUNCTION checkout_item(VARCHAR, INTEGER, DATE, DATE) IS 'Atomic, lock-aware checkout used by POST /api/admin/borrowings/issue';
+
+-- Last line of defence: at most one active loan per item
+CREATE UNIQUE INDEX IF NOT EXISTS uq_borrowings_active_item
+    ON borrowings(item_id) WHERE status = 'active';
@@ -0,0 +1,47 @@
+-- =====================================================
+-- NUK LIBRARY - SCHEDULED SWEEPS
+-- Stored overdue / membership-expiry state maintained by
+-- the in-app scheduler (see app/utils/scheduler.py)
+-- =====================================================
+
+-- Borrowings stay status = 'active' while overdue (limits, returns and the
+-- item status trigger all key on 'active'); the sweep stamps the day the
+-- loan became overdue and clears it again if a renewal moves the due date.
+ALTER TABLE borrowings ADD COLUMN IF NOT EXISTS overdue_since DATE;
+
+-- Sweep candidates: active loans not yet flagged
+CREATE INDEX IF NOT EXISTS idx_borrowings_overdue_pending
+    ON borrowings(due_date)
+    WHERE status = 'active' AND overdue_since IS NULL;
+
+-- Overdue lists: flagged active loans, oldest due date first
+CREATE INDEX IF NOT EXISTS idx_borrowings_overdue
+    ON borrowings(due_date)
+    WHERE status = 'active' AND overdue_since IS NOT NULL;
+
+-- Set when membership_end_date has passed; cleared on renewal
+ALTER TABLE patrons ADD COLUMN IF NOT EXISTS membership_expired_at TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS idx_patrons_membership_expired
+    ON patrons(patron_id)
+    WHERE membership_expired_at IS NOT NULL;
+
+-- The admin "inactive" list and the sweep both select by end date
+CREATE INDEX IF NOT EXISTS idx_patrons_membership_end_date
+    ON patrons(membership_end_date);
+
+-- Last run of every scheduled job; also lets a restarted leader skip
+-- jobs that ran recently
+CREATE TABLE IF NOT EXISTS scheduled_jobs (
+    job_name VARCHAR(100) PRIMARY KEY,
+    last_started_at TIMESTAMP,
+    last_finished_at TIMESTAMP,
+    last_status VARCHAR(20),          -- 'ok' or 'error'
+    last_error TEXT,
+    last_duration_ms INTEGER,
+    last_result JSONB
+);
+
+COMMENT ON COLUMN borrowings.overdue_since IS 'Day the loan became overdue (set by the overdue sweep)';
+COMMENT ON COLUMN patrons.membership_expired_at IS 'When the membership expiry sweep flagged this patron';
+COMMENT ON TABLE scheduled_jobs IS 'Run history of in-app scheduled jobs';
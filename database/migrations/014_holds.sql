@@ -0,0 +1,139 @@
+-- =====================================================
+-- NUK LIBRARY - HOLDS QUEUE
+-- Per-book FIFO hold queues on the reservations table.
+-- Returned items go straight to the next eligible hold
+-- inside the return transaction (app/utils/holds.py)
+-- =====================================================
+
+-- Item set aside for a 'ready' hold, and the pickup window
+ALTER TABLE reservations ADD COLUMN IF NOT EXISTS item_id INTEGER REFERENCES items(item_id) ON DELETE SET NULL;
+ALTER TABLE reservations ADD COLUMN IF NOT EXISTS ready_at TIMESTAMP;
+ALTER TABLE reservations ADD COLUMN IF NOT EXISTS pickup_expires_at TIMESTAMP;
+
+-- Queue head lookup: first pending hold for a book is one index probe,
+-- however long the queue is
+CREATE INDEX IF NOT EXISTS idx_reservations_queue
+    ON reservations(book_id, reservation_id)
+    WHERE status = 'pending';
+
+-- Pickup-expiry sweep
+CREATE INDEX IF NOT EXISTS idx_reservations_pickup_expiry
+    ON reservations(pickup_expires_at)
+    WHERE status = 'ready';
+
+-- One open hold per patron and title
+CREATE UNIQUE INDEX IF NOT EXISTS uq_reservations_open_hold
+    ON reservations(patron_id, book_id)
+    WHERE status IN ('pending', 'ready');
+
+-- checkout_item(): also lets the holder borrow an item waiting on the hold
+-- shelf for them, and marks their hold fulfilled
+CREATE OR REPLACE FUNCTION checkout_item(
+    p_patron_id VARCHAR,
+    p_item_id INTEGER,
+    p_checkout_date DATE,
+    p_due_date DATE
+)
+RETURNS TABLE (
+    outcome TEXT,           -- issued | item_not_found | item_unavailable | patron_not_found
+                            -- | patron_inactive | limit_reached
+    detail TEXT,            -- item status, patron status or borrowing limit for errors
+    borrowing_id INTEGER,
+    book_id INTEGER,
+    barcode VARCHAR,
+    title VARCHAR
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_patron RECORD;
+    v_item RECORD;
+    v_limit INTEGER;
+    v_active INTEGER;
+    v_borrowing_id INTEGER;
+    v_patron_found BOOLEAN;
+    v_item_found BOOLEAN;
+    v_held_for_patron BOOLEAN;
+BEGIN
+    SELECT u.status, mp.borrowing_limit
+    INTO v_patron
+    FROM patrons p
+    JOIN users u ON p.user_id = u.user_id
+    LEFT JOIN membership_plans mp ON p.membership_plan_id = mp.plan_id
+    WHERE p.patron_id = p_patron_id
+    FOR UPDATE OF p;
+    v_patron_found := FOUND;
+
+    SELECT i.item_id, i.circulation_status, i.barcode, b.book_id, b.title
+    INTO v_item
+    FROM items i
+    JOIN books b ON i.book_id = b.book_id
+    WHERE i.item_id = p_item_id
+    FOR UPDATE OF i;
+    v_item_found := FOUND;
+
+    -- Same check order (and so the same error) as the original issue route
+    IF NOT v_item_found THEN
+        RETURN QUERY SELECT 'item_not_found'::TEXT, NULL::TEXT, NULL::INTEGER, NULL::INTEGER, NULL::VARCHAR, NULL::VARCHAR;
+        RETURN;
+    END IF;
+
+    -- An item waiting on the hold shelf can only go to the patron it's held for
+    v_held_for_patron := v_item.circulation_status = 'on_hold' AND EXISTS (
+        SELECT 1 FROM reservations r
+        WHERE r.item_id = p_item_id AND r.patron_id = p_patron_id AND r.status = 'ready'
+    );
+
+    IF v_item.circulation_status <> 'available' AND NOT v_held_for_patron THEN
+        RETURN QUERY SELECT 'item_unavailable'::TEXT, v_item.circulation_status::TEXT, NULL::INTEGER,
+                            v_item.book_id, v_item.barcode, v_item.title;
+        RETURN;
+    END IF;
+
+    IF NOT v_patron_found THEN
+        RETURN QUERY SELECT 'patron_not_found'::TEXT, NULL::TEXT, NULL::INTEGER,
+                            v_item.book_id, v_item.barcode, v_item.title;
+        RETURN;
+    END IF;
+
+    IF v_patron.status <> 'active' THEN
+        RETURN QUERY SELECT 'patron_inactive'::TEXT, v_patron.status::TEXT, NULL::INTEGER,
+                            v_item.book_id, v_item.barcode, v_item.title;
+        RETURN;
+    END IF;
+
+    v_limit := COALESCE(v_patron.borrowing_limit, 3);  -- Default to 3 if no plan
+
+    SELECT COUNT(*) INTO v_active
+    FROM borrowings br
+    WHERE br.patron_id = p_patron_id AND br.status = 'active';
+
+    IF v_active >= v_limit THEN
+        RETURN QUERY SELECT 'limit_reached'::TEXT, v_limit::TEXT, NULL::INTEGER,
+                            v_item.book_id, v_item.barcode, v_item.title;
+        RETURN;
+    END IF;
+
+    -- sync_item_status_trigger marks the item checked_out
+    INSERT INTO borrowings (patron_id, item_id, checkout_date, due_date, status)
+    VALUES (p_patron_id, p_item_id, p_checkout_date, p_due_date, 'active')
+    RETURNING borrowings.borrowing_id INTO v_borrowing_id;
+
+    -- The patron's hold on this title (if any) is now satisfied
+    UPDATE reservations r
+    SET status = 'fulfilled',
+        fulfilled_date = p_checkout_date,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE r.patron_id = p_patron_id
+      AND r.book_id = v_item.book_id
+      AND (r.status = 'pending' OR (r.status = 'ready' AND r.item_id = p_item_id));
+
+    RETURN QUERY SELECT 'issued'::TEXT, NULL::TEXT, v_borrowing_id,
+                        v_item.book_id, v_item.barcode, v_item.title;
+END;
+$$;
+
+COMMENT ON FUNCTION checkout_item(VARCHAR, INTEGER, DATE, DATE) IS 'Atomic, lock-aware checkout used by POST /api/admin/borrowings/issue';
+
+COMMENT ON COLUMN reservations.item_id IS 'Item set aside for this hold once it is ready for pickup';
+COMMENT ON COLUMN reservations.pickup_expires_at IS 'Ready holds not collected by this time are expired by the scheduler';
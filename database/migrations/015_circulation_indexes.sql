@@ -0,0 +1,56 @@
+-- =====================================================
+-- NUK LIBRARY - CIRCULATION INDEXES
+-- Partial / covering indexes for the circulation hot paths
+-- =====================================================
+--
+-- Built CONCURRENTLY so the desk keeps issuing and returning while they
+-- build; that cannot run inside a transaction block, so apply this file
+-- with backend/migrate.py (which runs it statement by statement in
+-- autocommit mode) or plain `psql -f`, never wrapped in BEGIN/COMMIT.
+--
+-- A failed concurrent build leaves an INVALID index behind; drop it and
+-- re-run (IF NOT EXISTS would otherwise skip it):
+--   SELECT indexrelid::regclass FROM pg_index WHERE NOT indisvalid;
+--
+-- Benchmark: backend/benchmarks/circulation_explain.py
+
+-- Borrowing-limit check in checkout_item() and "my active loans":
+-- status = 'active' AND patron_id = ?. Only a few rows per patron are
+-- active, so the partial index stays tiny; due_date and item_id are
+-- carried for index-only scans.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_borrowings_active_patron
+    ON borrowings(patron_id) INCLUDE (item_id, due_date)
+    WHERE status = 'active';
+
+-- status = 'active' AND due_date < today (overdue reports, late-return
+-- checks on the desk); the overdue_since indexes from 013 cover the
+-- scheduler's flagged / unflagged split.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_borrowings_active_due
+    ON borrowings(due_date) INCLUDE (patron_id, item_id)
+    WHERE status = 'active';
+
+-- Joins and history lookups through item_id
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_borrowings_item_checkout
+    ON borrowings(item_id, checkout_date DESC);
+
+-- Patron history, newest first
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_borrowings_patron_checkout
+    ON borrowings(patron_id, checkout_date DESC);
+
+-- Recent activity / "all borrowings" listings
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_borrowings_checkout_date
+    ON borrowings(checkout_date DESC);
+
+-- "Is a copy on the shelf?" (holds, availability)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_items_book_available
+    ON items(book_id)
+    WHERE circulation_status = 'available';
+
+-- Superseded by the composite indexes above (same leading column)
+DROP INDEX CONCURRENTLY IF EXISTS idx_borrowings_patron_id;
+DROP INDEX CONCURRENTLY IF EXISTS idx_borrowings_item_id;
+
+COMMENT ON INDEX idx_borrowings_active_patron IS 'Active loans per patron (borrowing limit, my borrowings)';
+COMMENT ON INDEX idx_borrowings_active_due IS 'Active loans by due date (overdue reports)';
+COMMENT ON INDEX idx_borrowings_item_checkout IS 'Borrowing history per item, newest first';
+COMMENT ON INDEX idx_borrowings_patron_checkout IS 'Borrowing history per patron, newest first';
@@ -0,0 +1,79 @@
+-- =====================================================
+-- NUK LIBRARY - CONTENT VERSIONS
+-- A version counter per content scope, bumped by statement-level
+-- triggers whenever the scope's tables change. Cacheable GET endpoints
+-- derive their ETag from these counters and answer If-None-Match with
+-- 304 before querying anything (see app/utils/http_cache.py)
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS content_versions (
+    scope VARCHAR(50) PRIMARY KEY,     -- 'catalogue', 'website', 'rda'
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO content_versions (scope) VALUES ('catalogue'), ('website'), ('rda')
+ON CONFLICT (scope) DO NOTHING;
+
+-- TG_ARGV[0] is the scope. The counter row stays locked until the writing
+-- transaction commits, so readers never see a new version before the data
+CREATE OR REPLACE FUNCTION bump_content_version() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO content_versions (scope, version, updated_at)
+    VALUES (TG_ARGV[0], 1, CURRENT_TIMESTAMP)
+    ON CONFLICT (scope) DO UPDATE
+        SET version = content_versions.version + 1,
+            updated_at = CURRENT_TIMESTAMP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- =====================================================
+-- Triggers: one bump per statement, not per row
+-- =====================================================
+
+DO $$
+DECLARE
+    target RECORD;
+BEGIN
+    FOR target IN
+        SELECT * FROM (VALUES
+            ('books', 'catalogue'),
+            ('book_contributors', 'catalogue'),
+            ('contributors', 'catalogue'),
+            ('collections', 'catalogue'),
+            ('age_ratings', 'catalogue'),
+            ('reviews', 'catalogue'),
+            ('website_theme_settings', 'website'),
+            ('website_pages', 'website'),
+            ('website_sections', 'website'),
+            ('website_content_blocks', 'website'),
+            ('website_cards', 'website'),
+            ('website_menu_items', 'website'),
+            ('website_media', 'website'),
+            ('website_global_settings', 'website'),
+            ('rda_content_types', 'rda'),
+            ('rda_media_types', 'rda'),
+            ('rda_carrier_types', 'rda')
+        ) AS t(table_name, scope)
+    LOOP
+        IF to_regclass(target.table_name) IS NOT NULL THEN
+            EXECUTE format('DROP TRIGGER IF EXISTS trg_%s_content_version ON %I',
+                           target.table_name, target.table_name);
+            EXECUTE format('CREATE TRIGGER trg_%s_content_version
+                                AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I
+                                FOR EACH STATEMENT EXECUTE FUNCTION bump_content_version(%L)',
+                           target.table_name, target.table_name, target.scope);
+        END IF;
+    END LOOP;
+END;
+$$;
+
+-- Items and mv_book_availability are not covered by triggers: checkouts and
+-- returns update items constantly and would all queue on the 'catalogue'
+-- row, and the catalogue lists read availability from the materialized
+-- view, which only changes when an admin edit refreshes it. Those refresh
+-- sites bump 'catalogue' themselves (app.utils.http_cache.bump_content_version)
+
+COMMENT ON TABLE content_versions IS 'Change counter per content scope; source of ETags for cacheable GET endpoints';
+COMMENT ON FUNCTION bump_content_version() IS 'Statement trigger: increments content_versions for the scope in TG_ARGV[0]';
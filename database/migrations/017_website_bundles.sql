@@ -0,0 +1,21 @@
+-- =====================================================
+-- NUK LIBRARY - WEBSITE THEME BUNDLES
+-- Theme and global settings compiled into a minified stylesheet and a
+-- JSON settings file whenever an admin changes them, addressed by a hash
+-- of their content. Served with immutable caching from
+-- /api/website/assets/<name>.<hash>.<ext> (see app/utils/theme_bundle.py)
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS website_bundles (
+    content_hash VARCHAR(32) PRIMARY KEY,
+    kind VARCHAR(20) NOT NULL,          -- 'css', 'json'
+    body BYTEA NOT NULL,
+    published_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Current bundle of each kind = the most recently published one
+CREATE INDEX IF NOT EXISTS idx_website_bundles_kind_published
+    ON website_bundles (kind, published_at DESC);
+
+COMMENT ON TABLE website_bundles IS 'Compiled theme stylesheet / site settings, by content hash; older ones kept for cached HTML';
+COMMENT ON COLUMN website_bundles.published_at IS 'Last time this content became current (re-publishing identical settings refreshes it)';
@@ -0,0 +1,57 @@
+-- =====================================================
+-- NUK LIBRARY - MEDIA ASSETS
+-- Uploaded files stored once per SHA-256 under MEDIA_ROOT, with resized
+-- WebP/JPEG variants generated in the background (app/utils/media.py).
+-- Website media, book covers and patron photos reference assets by hash
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS media_assets (
+    sha256 CHAR(64) PRIMARY KEY,
+    mime_type VARCHAR(100) NOT NULL,
+    file_size BIGINT NOT NULL,
+    width INT,                                   -- NULL for non-images
+    height INT,
+    variants JSONB NOT NULL DEFAULT '[]',        -- [{width, height, format, url, bytes}]
+    variant_status VARCHAR(20) NOT NULL DEFAULT 'pending'
+        CHECK (variant_status IN ('pending', 'ready', 'failed', 'none')),
+    variant_attempts INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- The sweep only looks at assets still waiting for variants
+CREATE INDEX IF NOT EXISTS idx_media_assets_pending
+    ON media_assets (created_at) WHERE variant_status = 'pending';
+
+-- =====================================================
+-- srcset metadata on website media (copied from media_assets when the
+-- variants are ready, so the 'website' content version changes with it)
+-- =====================================================
+
+ALTER TABLE website_media ADD COLUMN IF NOT EXISTS content_hash CHAR(64) REFERENCES media_assets(sha256);
+ALTER TABLE website_media ADD COLUMN IF NOT EXISTS width INT;
+ALTER TABLE website_media ADD COLUMN IF NOT EXISTS height INT;
+ALTER TABLE website_media ADD COLUMN IF NOT EXISTS variants JSONB NOT NULL DEFAULT '[]';
+
+CREATE INDEX IF NOT EXISTS idx_website_media_content_hash ON website_media (content_hash);
+
+-- =====================================================
+-- Patron photos: the BYTEA column stays for existing clients
+-- =====================================================
+
+ALTER TABLE patrons ADD COLUMN IF NOT EXISTS photo_hash CHAR(64) REFERENCES media_assets(sha256);
+
+-- Private assets are refused by /api/media; patron photos are served only
+-- to admins (GET /api/admin/patrons/<id>/photo)
+ALTER TABLE media_assets ADD COLUMN IF NOT EXISTS is_private BOOLEAN NOT NULL DEFAULT FALSE;
+
+UPDATE media_assets ma SET is_private = TRUE
+WHERE ma.sha256 IN (SELECT photo_hash FROM patrons)
+  AND NOT EXISTS (SELECT 1 FROM website_media wm WHERE wm.content_hash = ma.sha256)
+  AND NOT EXISTS (SELECT 1 FROM books b WHERE b.cover_image_url LIKE '/api/media/' || ma.sha256 || '%');
+
+COMMENT ON TABLE media_assets IS 'Content-addressed uploads (originals under MEDIA_ROOT by SHA-256) and their resized variants';
+COMMENT ON COLUMN media_assets.variant_status IS 'pending: variants not generated yet; none: not an image; failed: gave up after retries';
+COMMENT ON COLUMN website_media.variants IS 'Resized variants of content_hash for srcset; [] until generated';
+COMMENT ON COLUMN media_assets.is_private IS 'Not served by /api/media (patron photos)';
+COMMENT ON COLUMN patrons.photo_hash IS 'Private media_assets entry for patron_photo (served resized to admins only)';
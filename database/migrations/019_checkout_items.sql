@@ -0,0 +1,119 @@
+-- =====================================================
+-- NUK LIBRARY - BATCH CHECKOUT
+-- checkout_items() issues several items to one patron with
+-- the same rules as checkout_item() (migrations 012, 014) -
+-- availability, the hold shelf, the borrowing limit, and the
+-- patron's holds fulfilled - in one statement for the batch
+-- =====================================================
+
+-- Same lock order as checkout_item(): patron, then items by item_id.
+-- Items are issued in the order given until the limit is reached; one
+-- result row per requested item, in that order.
+CREATE OR REPLACE FUNCTION checkout_items(
+    p_patron_id VARCHAR,
+    p_item_ids INTEGER[],
+    p_checkout_date DATE,
+    p_due_date DATE
+)
+RETURNS TABLE (
+    item_id INTEGER,
+    outcome TEXT,           -- as checkout_item()
+    detail TEXT,
+    borrowing_id INTEGER,
+    book_id INTEGER,
+    barcode VARCHAR,
+    title VARCHAR
+)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+DECLARE
+    v_status TEXT;
+    v_limit INTEGER;
+    v_active INTEGER := 0;
+    v_patron_found BOOLEAN;
+BEGIN
+    SELECT u.status, COALESCE(mp.borrowing_limit, 3)  -- Default to 3 if no plan
+    INTO v_status, v_limit
+    FROM patrons p
+    JOIN users u ON p.user_id = u.user_id
+    LEFT JOIN membership_plans mp ON p.membership_plan_id = mp.plan_id
+    WHERE p.patron_id = p_patron_id
+    FOR UPDATE OF p;
+    v_patron_found := FOUND;
+
+    PERFORM 1 FROM items i WHERE i.item_id = ANY(p_item_ids) ORDER BY i.item_id FOR UPDATE;
+
+    IF v_patron_found THEN
+        SELECT COUNT(*) INTO v_active
+        FROM borrowings br
+        WHERE br.patron_id = p_patron_id AND br.status = 'active';
+    END IF;
+
+    RETURN QUERY
+    WITH requested AS (
+        SELECT r.req_item_id, r.ord
+        FROM unnest(p_item_ids) WITH ORDINALITY AS r(req_item_id, ord)
+    ),
+    checked AS (
+        SELECT q.req_item_id, q.ord, i.circulation_status, i.barcode, b.book_id, b.title,
+               i.item_id IS NOT NULL AS found,
+               -- An item on the hold shelf only goes to the patron it's held for
+               COALESCE(i.circulation_status = 'available' OR (i.circulation_status = 'on_hold' AND EXISTS (
+                   SELECT 1 FROM reservations r
+                   WHERE r.item_id = q.req_item_id AND r.patron_id = p_patron_id AND r.status = 'ready'
+               )), FALSE) AS eligible
+        FROM requested q
+        LEFT JOIN items i ON i.item_id = q.req_item_id
+        LEFT JOIN books b ON b.book_id = i.book_id
+    ),
+    decided AS (
+        SELECT c.*,
+               CASE
+                   WHEN NOT c.found THEN 'item_not_found'
+                   WHEN NOT c.eligible THEN 'item_unavailable'
+                   WHEN NOT v_patron_found THEN 'patron_not_found'
+                   WHEN v_status <> 'active' THEN 'patron_inactive'
+                   -- Eligible items take the free slots in the order given
+                   WHEN COUNT(*) FILTER (WHERE c.eligible) OVER (ORDER BY c.ord) > v_limit - v_active
+                       THEN 'limit_reached'
+                   ELSE 'issued'
+               END AS result
+        FROM checked c
+    ),
+    -- sync_item_status_trigger marks the items checked_out
+    inserted AS (
+        INSERT INTO borrowings (patron_id, item_id, checkout_date, due_date, status)
+        SELECT p_patron_id, d.req_item_id, p_checkout_date, p_due_date, 'active'
+        FROM decided d
+        WHERE d.result = 'issued'
+        ORDER BY d.ord
+        RETURNING borrowings.item_id AS issued_item_id, borrowings.borrowing_id AS new_borrowing_id
+    ),
+    -- The patron's holds on these titles are now satisfied
+    fulfilled AS (
+        UPDATE reservations r
+        SET status = 'fulfilled',
+            fulfilled_date = p_checkout_date,
+            updated_at = CURRENT_TIMESTAMP
+        FROM decided d
+        WHERE d.result = 'issued'
+          AND r.patron_id = p_patron_id
+          AND r.book_id = d.book_id
+          AND (r.status = 'pending' OR (r.status = 'ready' AND r.item_id = d.req_item_id))
+        RETURNING r.reservation_id
+    )
+    SELECT d.req_item_id, d.result::TEXT,
+           CASE d.result
+               WHEN 'item_unavailable' THEN d.circulation_status::TEXT
+               WHEN 'patron_inactive' THEN v_status::TEXT
+               WHEN 'limit_reached' THEN v_limit::TEXT
+           END,
+           ins.new_borrowing_id, d.book_id, d.barcode, d.title
+    FROM decided d
+    LEFT JOIN inserted ins ON ins.issued_item_id = d.req_item_id
+    ORDER BY d.ord;
+END;
+$$;
+
+COMMENT ON FUNCTION checkout_items(VARCHAR, INTEGER[], DATE, DATE) IS 'Set-based checkout_item() for POST /api/admin/borrowings/issue-batch';
@@ -44,34 +44,16 @@ function Dashboard() {
   const loadDashboardData = async () => {
     try {
       setLoading(true);
-      const [
-        statsRes,
-        trendsRes,
-        popularRes,
-        collectionRes,
-        membershipRes,
-        overdueRes,
-        activityRes,
-        patronRes
-      ] = await Promise.all([
-        adminDashboardAPI.getStats(),
-        adminDashboardAPI.getBorrowingTrends(30),
-        adminDashboardAPI.getPopularBooks(10),
-        adminDashboardAPI.getCollectionDistribution(),
-        adminDashboardAPI.getMembershipDistribution(),
-        adminDashboardAPI.getOverdueBooks(),
-        adminDashboardAPI.getRecentActivity(15),
-        adminDashboardAPI.getPatronActivity()
-      ]);
+      const { data } = await adminDashboardAPI.getSnapshot(30);
 
-      setStats(statsRes.data);
-      setBorrowingTrends(trendsRes.data);
-      setPopularBooks(popularRes.data);
-      setCollectionDist(collectionRes.data);
-      setMembershipDist(membershipRes.data);
-      setOverdueBooks(overdueRes.data);
-      setRecentActivity(activityRes.data);
-      setPatronActivity(patronRes.data);
+      setStats(data.stats);
+      setBorrowingTrends(data.borrowing_trends);
+      setPopularBooks(data.popular_books);
+      setCollectionDist(data.collection_distribution);
+      setMembershipDist(data.membership_distribution);
+      setOverdueBooks(data.overdue_books);
+      setRecentActivity(data.recent_activity);
+      setPatronActivity(data.patron_activity);
     } catch (err) {
       console.error('Failed to load dashboard data:', err);
     } finally {
@@ -9,6 +9,12 @@ const api = axios.create({
   },
 });
 
+// Read-your-writes: after a write the API answers with X-DB-Primary-Until;
+// echoing it keeps this client's reads on the primary database (not a
+// lagging replica) until it expires. The API is on another origin, so its
+// cookie of the same name is not sent.
+let primaryUntil = null;
+
 // Add auth token to requests
 api.interceptors.request.use(
   (config) => {
@@ -16,6 +22,9 @@ api.interceptors.request.use(
     if (token) {
       config.headers.Authorization = `Bearer ${token}`;
     }
+    if (primaryUntil && Number(primaryUntil.split('.')[0]) * 1000 > Date.now()) {
+      config.headers['X-DB-Primary-Until'] = primaryUntil;
+    }
     return config;
   },
   (error) => {
@@ -25,7 +34,13 @@ api.interceptors.request.use(
 
 // Handle responses and errors
 api.interceptors.response.use(
-  (response) => response,
+  (response) => {
+    const pin = response.headers['x-db-primary-until'];
+    if (pin) {
+      primaryUntil = pin;
+    }
+    return response;
+  },
   (error) => {
     if (error.response?.status === 401) {
       localStorage.removeItem('token');
@@ -150,6 +165,7 @@ export const adminCollectionsAPI = {
 
 // Admin - Dashboard API
 export const adminDashboardAPI = {
+  getSnapshot: (days = 30) => api.get('/admin/dashboard/snapshot', { params: { days } }),
   getStats: () => api.get('/admin/dashboard/stats'),
   getBorrowingTrends: (days = 30) => api.get('/admin/dashboard/borrowing-trends', { params: { days } }),
   getPopularBooks: (limit = 10) => api.get('/admin/dashboard/popular-books', { params: { limit } }),
@@ -168,16 +184,26 @@ export const adminBorrowingsAPI = {
     api.post(`/admin/borrowings/${borrowingId}/renew`),
   returnBook: (borrowingId) =>
     api.post(`/admin/borrowings/${borrowingId}/return`),
+  issueBatch: (patronId, barcodes) =>
+    api.post('/admin/borrowings/issue-batch', { patron_id: patronId, barcodes }),
+  returnBatch: (barcodes) =>
+    api.post('/admin/borrowings/return-batch', { barcodes }),
   searchBorrowings: (type, value, status = 'active') =>
     api.get('/admin/borrowings/search', { params: { type, value, status } }),
   getAllBorrowings: (patronFilter = '', bookFilter = '') =>
     api.get('/admin/borrowings/all', { params: { patron: patronFilter, book: bookFilter } }),
-  getBorrowingHistory: (patronId, itemId, bookId) =>
-    api.get('/admin/borrowings/history', { params: { patron_id: patronId, item_id: itemId, book_id: bookId } }),
+  getBorrowingHistory: (patronId, itemId, bookId, cursor = null, limit = 50) =>
+    api.get('/admin/borrowings/history', { params: { patron_id: patronId, item_id: itemId, book_id: bookId, cursor, limit } }),
+  exportBorrowingHistory: (params, format = 'csv') =>
+    api.get('/admin/borrowings/history/export', { params: { ...params, format }, responseType: 'blob' }),
   getOverdue: () => api.get('/admin/borrowings/overdue'),
   searchPatrons: (query) => api.get('/admin/patrons/search', { params: { q: query } }),
   searchItems: (query) => api.get('/admin/items/search', { params: { q: query } }),
   getStats: () => api.get('/admin/borrowings/stats'),
+  getHolds: (params = {}) => api.get('/admin/holds', { params }),
+  placeHold: (patronId, bookId) =>
+    api.post('/admin/holds', { patron_id: patronId, book_id: bookId }),
+  cancelHold: (reservationId) => api.delete(`/admin/holds/${reservationId}`),
 };
 
 // Patron API
@@ -189,6 +215,9 @@ export const patronAPI = {
     api.post(`/patron/books/${bookId}/review`, { rating, comment }),
   getMyBorrowings: (status = 'active') =>
     api.get('/patron/my-borrowings', { params: { status } }),
+  placeHold: (bookId) => api.post(`/patron/books/${bookId}/hold`),
+  getMyHolds: () => api.get('/patron/my-holds'),
+  cancelHold: (reservationId) => api.delete(`/patron/my-holds/${reservationId}`),
   getRecommendations: () => api.get('/patron/recommendations'),
   requestCoworkBooking: (bookingData) =>
     api.post('/patron/cowork-booking', bookingData),
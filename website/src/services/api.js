@@ -11,6 +11,12 @@ const apiClient = axios.create({
   },
 });
 
+// Read-your-writes: after a write the API answers with X-DB-Primary-Until;
+// echoing it keeps this client's reads on the primary database (not a
+// lagging replica) until it expires. The API is on another origin, so its
+// cookie of the same name is not sent.
+let primaryUntil = null;
+
 // Request interceptor to add auth token if available
 apiClient.interceptors.request.use(
   (config) => {
@@ -18,6 +24,9 @@ apiClient.interceptors.request.use(
     if (token) {
       config.headers.Authorization = `Bearer ${token}`;
     }
+    if (primaryUntil && Number(primaryUntil.split('.')[0]) * 1000 > Date.now()) {
+      config.headers['X-DB-Primary-Until'] = primaryUntil;
+    }
     return config;
   },
   (error) => {
@@ -27,7 +36,13 @@ apiClient.interceptors.request.use(
 
 // Response interceptor for error handling
 apiClient.interceptors.response.use(
-  (response) => response,
+  (response) => {
+    const pin = response.headers['x-db-primary-until'];
+    if (pin) {
+      primaryUntil = pin;
+    }
+    return response;
+  },
   (error) => {
     if (error.response?.status === 401) {
       // Handle unauthorized access